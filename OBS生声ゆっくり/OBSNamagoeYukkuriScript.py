@@ -2,62 +2,705 @@ import numpy as np
 import pyaudio
 import customtkinter as ctk
 import tkinter.messagebox as messagebox
-from obswebsocket import obsws, requests
+from obswebsocket import obsws, requests, events
 import threading
 import string
 import re
+import bisect
 import json
 import os
 import queue
+import copy
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import math
+import atexit
+import collections
+import itertools
+import random
+import mmap
+import struct
 import time
 import sys
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # ====== 設定ファイルとフォルダ ======
 PRESET_FOLDER = "presets"
 OBS_PRESET_FOLDER = "obs_presets"
 THEME_SETTINGS_FILE = "theme_settings.json"
 AUTO_LOAD_SETTINGS_FILE = "auto_load_settings.json"
+LOG_FOLDER = "logs"
+PROFILE_FOLDER = "profiles"
 
 # ====== 定数定義 ======
 MAX_RMS_VALUE = 2000
 COOLING_TIME = 0.05 # 安定化期間（秒）
-MAX_IMAGE_COUNT = 1000 # 検索する画像の最大数
+DEFAULT_IDLE_AFTER = 10.0 # 省電力待機に入るまでの無音時間（秒, 0で無効）
+DEFAULT_ATTACK_MS = 5.0 # 音量の包絡線が上がるときの時定数（ミリ秒）
+DEFAULT_RELEASE_MS = 250.0 # 音量の包絡線が下がるときの時定数（ミリ秒）
+DEFAULT_NAME_PATTERN = "{n}|{n}.png" # 画像ソース名の形式（{n} が画像番号。| で区切って複数指定できる）
 
 # PyAudio設定
 CHUNK = 1024
 FORMAT = pyaudio.paInt16
-CHANNELS = 1
 RATE = 44500
 
 # グローバル変数
 run_audio_thread = False
+audio_standby = False # 停止中もオーディオループを動かしたまま待機しているか（ウォームスタンバイ）
 audio_thread = None
-obs_client = None
-current_scene_name = ""
-current_group_name = "" 
-current_image_ids = {} # 画像名とIDを格納する辞書
-current_threshold_min = 0
-current_threshold_max = 0
-audio_data_queue = queue.Queue() # 音量データ伝達用のキュー
-selected_mic_index = None
+engine_process = None # 別プロセスで動かしているときの EngineProcess
+obs_targets = None # 動作中の ObsTargets（口パクを送るOBSの一覧）
+current_frames = None # 選択中のグループの FrameTable（画像番号とIDの対応表）
+
+# ====== ログ（リングバッファ） ======
+LOG_FILE_NAME = "OBSNamagoeYukkuri.log"
+LOG_MAX_BYTES = 1024 * 1024 # ログファイルを切り替える大きさ
+LOG_BACKUP_COUNT = 3 # 残しておく古いログファイルの数（.1 〜 .3）
+LOG_RING_SIZE = 4096 # 書き出し前にためておける記録の数（書き出しが追いつかなければ古いものから捨てる）
+LOG_HISTORY_SIZE = 2000 # ログビューアで見られる記録の数
+LOG_FLUSH_INTERVAL = 0.5 # 書き出しスレッドがリングを空にする間隔（秒）
+LOG_VIEWER_INTERVAL_MS = 500 # ログビューアに新しい記録を追加する間隔
+LOG_STOP_TIMEOUT = 2.0
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL_NAMES = {level: name for name, level in LOG_LEVELS.items()}
+
+def format_log_record(record):
+    _, created, level, thread_name, message = record
+    stamp = time.strftime("%H:%M:%S", time.localtime(created))
+    return f"{stamp}.{int(created % 1 * 1000):03d} [{LOG_LEVEL_NAMES.get(level, level)}] ({thread_name}) {message}"
+
+class RingLog:
+    """ログの記録をメモリ上のリングにため、ファイル・コンソールへの書き出しは専用のスレッドでまとめて行う
+
+    record() は (番号, 時刻, レベル, スレッド名, メッセージ) を deque に追加するだけなので、
+    オーディオスレッドから呼んでもコンソールやファイルへの書き込みで待たされることはない
+    （deque の append と popleft はスレッドセーフ）。書き出しが追いつかずにあふれた記録は、
+    番号の飛びから数えて警告として残す。書き出したものはログビューア用の履歴にも残る。
+    """
+    def __init__(self, size=LOG_RING_SIZE, history_size=LOG_HISTORY_SIZE):
+        self.pending = collections.deque(maxlen=size)
+        self.seq = itertools.count()
+        self.next_seq = 0 # 次に取り出すはずの番号（書き出しスレッドだけが使う）
+        self.history = collections.deque(maxlen=history_size)
+        self.history_lock = threading.Lock()
+        self.sinks = ()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def record(self, level, message):
+        self.pending.append((next(self.seq), time.time(), level, threading.current_thread().name, message))
+
+    def debug(self, message):
+        self.record(LOG_LEVELS["DEBUG"], message)
+
+    def info(self, message):
+        self.record(LOG_LEVELS["INFO"], message)
+
+    def warning(self, message):
+        self.record(LOG_LEVELS["WARNING"], message)
+
+    def error(self, message):
+        self.record(LOG_LEVELS["ERROR"], message)
+
+    def add(self, records):
+        """別プロセスから届いた記録を、このプロセスの番号を振り直して追加する"""
+        for record in records:
+            self.pending.append((next(self.seq),) + tuple(record[1:]))
+
+    def start(self, *sinks):
+        """書き出しを始める。sinks は記録のリストを受け取る関数（書き出しスレッドから呼ばれる）"""
+        self.sinks = sinks
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """書き出しスレッドを止め、残っている記録を書き出す"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(LOG_STOP_TIMEOUT)
+        self.thread = None
+        self._flush()
+
+    def _drain(self):
+        records = []
+        while True:
+            try:
+                record = self.pending.popleft()
+            except IndexError:
+                break
+            if record[0] > self.next_seq:
+                dropped = record[0] - self.next_seq
+                records.append((record[0], record[1], LOG_LEVELS["WARNING"], "log-writer", f"⚠ ログの書き出しが追いつかず、{dropped}件の記録を捨てました"))
+            self.next_seq = record[0] + 1
+            records.append(record)
+        return records
+
+    def _flush(self):
+        records = self._drain()
+        if not records:
+            return
+        with self.history_lock:
+            self.history.extend(records)
+        for sink in self.sinks:
+            try:
+                sink(records)
+            except Exception:
+                pass # ログの書き出しの失敗で他の処理を止めない
+
+    def _run(self):
+        while not self.stop_event.wait(LOG_FLUSH_INTERVAL):
+            self._flush()
+
+    def recent(self, after_seq=-1, min_level=0):
+        """履歴のうち、番号が after_seq より後で min_level 以上の記録"""
+        with self.history_lock:
+            return [record for record in self.history if record[0] > after_seq and record[2] >= min_level]
+
+class RotatingLogFile:
+    """記録をファイルに追記し、大きくなったら .1, .2 ... に送って新しいファイルにする（書き出しスレッドで使う）"""
+    def __init__(self, folder=LOG_FOLDER, file_name=LOG_FILE_NAME, level=LOG_LEVELS["INFO"]):
+        self.path = os.path.join(folder, file_name)
+        self.level = level
+
+    def _rotate(self):
+        for number in range(LOG_BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def __call__(self, records):
+        lines = [format_log_record(record) + "\n" for record in records if record[2] >= self.level]
+        if not lines:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            size = f.tell()
+        if size >= LOG_MAX_BYTES:
+            self._rotate()
+
+def console_log_sink(records):
+    # 起動用のvbsから起動した場合などコンソールが無いときは書かない
+    if sys.stdout is not None:
+        for record in records:
+            if record[2] >= LOG_LEVELS["INFO"]:
+                print(record[4])
+
+log = RingLog()
+atexit.register(log.stop)
+
+# ====== 停止の検出（ウォッチドッグ） ======
+WATCHDOG_INTERVAL = 0.1 # 心拍を確認する間隔（秒）
+STALL_THRESHOLDS = {"capture": 0.5, "send": 0.5, "gui": 1.0} # 段階の種類ごとの、停止とみなす遅れ（秒）
+STALL_MAX_SAMPLES = 4 # 1回の停止でスタックを記録する回数（遅れが閾値の1, 2, 4, 8倍になった時点）
+PROFILE_INTERVAL = 0.005 # プロファイル中にスタックを数える間隔（秒）
+STAGE_LABELS = {"capture": "マイクの読み取り・解析", "send": "OBSへの送信", "gui": "GUIの更新"}
+
+def stage_label(stage):
+    kind, _, name = stage.partition(":")
+    return f"{STAGE_LABELS.get(kind, kind)}（{name}）" if name else STAGE_LABELS.get(kind, kind)
+
+class StallWatchdog:
+    """処理の段階ごとの心拍を見張り、遅れた段階のスレッドのスタックをログに残す
+
+    各段階は自分のスレッドで watch() してから、処理のたびに beat() を呼ぶ（時刻を1つ書くだけ）。
+    送信のように待つのが正常な段階は、処理の前に beat()、後に rest() を呼んで処理中だけ見張る。
+    見張りのスレッドは時刻を比べるだけで、遅れがあったときだけ sys._current_frames() で
+    そのスレッドのスタックを取り、他の段階の最後の心拍からの経過時間と一緒に記録する。
+    プロファイル中は、見張っている全スレッドのスタックを PROFILE_INTERVAL ごとに数える。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {} # 段階 → (スレッドID, 閾値)
+        self.beats = {} # 段階 → 最後の心拍の時刻（None なら休止中）
+        self.reported = {} # 段階 → 今回の停止でスタックを記録した回数
+        self.stalled_since = {}
+        self.profile = None # プロファイル中のスタックごとの回数（collections.Counter）
+        self.profile_started = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def watch(self, stage, threshold):
+        """呼び出したスレッドを段階 stage として見張り始める"""
+        with self.lock:
+            self.stages[stage] = (threading.get_ident(), threshold)
+            self.beats[stage] = time.perf_counter()
+            self.reported[stage] = 0
+
+    def unwatch(self, stage):
+        with self.lock:
+            if self.stages.get(stage, (None,))[0] != threading.get_ident():
+                return # 同じ名前で見張り始めた別のスレッドの分は残す
+            self.stages.pop(stage, None)
+            self.beats.pop(stage, None)
+            self.reported.pop(stage, None)
+
+    def beat(self, stage):
+        self.beats[stage] = time.perf_counter()
+
+    def rest(self, stage):
+        self.beats[stage] = None
+
+    def _check(self, now):
+        with self.lock:
+            stages = list(self.stages.items())
+        for stage, (ident, threshold) in stages:
+            last = self.beats.get(stage)
+            reported = self.reported.get(stage, 0)
+            if reported and (last is None or last > self.stalled_since[stage]):
+                log.info(f"✅ {stage_label(stage)}が再開しました（停止 {(last or now) - self.stalled_since[stage]:.2f}秒）")
+                self.reported[stage] = reported = 0
+            if last is None or reported >= STALL_MAX_SAMPLES or now - last < threshold * 2 ** reported:
+                continue
+            if not reported:
+                self.stalled_since[stage] = last
+                engine_metrics["stalls"] += 1
+            self.reported[stage] = reported + 1
+            frame = sys._current_frames().get(ident)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "（スレッドが終了しています）\n"
+            del frame
+            others = ", ".join(f"{stage_label(other)} {now - beat:.2f}秒前" if beat is not None else f"{stage_label(other)} 待機中"
+                               for other, beat in list(self.beats.items()) if other != stage and other in self.stages)
+            log.warning(f"⚠ {stage_label(stage)}が {now - last:.2f}秒 止まっています（他の段階の最後の心拍: {others or 'なし'}）\n{stack.rstrip()}")
+
+    def _sample_profile(self, profile):
+        frames = sys._current_frames()
+        with self.lock:
+            stages = list(self.stages.items())
+        for stage, (ident, _) in stages:
+            if self.beats.get(stage) is None:
+                continue # 要求を待っているだけの送信スレッドは数えない
+            frame = frames.get(ident)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                profile[";".join([stage] + names[::-1])] += 1
+        del frames
+
+    def _run(self):
+        next_check = 0.0
+        while True:
+            profile = self.profile
+            if self.stop_event.wait(PROFILE_INTERVAL if profile is not None else WATCHDOG_INTERVAL):
+                return
+            now = time.perf_counter()
+            if now >= next_check:
+                next_check = now + WATCHDOG_INTERVAL
+                self._check(now)
+            if profile is not None:
+                self._sample_profile(profile)
+
+    def start_profile(self):
+        if self.profile is None:
+            self.profile_started = time.time()
+            self.profile = collections.Counter()
+
+    def stop_profile(self):
+        """プロファイルを終えて profiles フォルダに書き出し、そのパスを返す（数えたものが無ければNone）
+
+        1行が「段階;関数;関数;... 回数」の形式で、flamegraph.pl や speedscope でそのまま表示できる。
+        """
+        profile, self.profile = self.profile, None
+        if not profile:
+            return None
+        os.makedirs(PROFILE_FOLDER, exist_ok=True)
+        path = os.path.join(PROFILE_FOLDER, time.strftime("profile_%Y%m%d_%H%M%S.txt", time.localtime(self.profile_started)))
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in profile.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+watchdog = StallWatchdog()
+
+# ====== ワーカースレッドからのGUI更新 ======
+UI_BUS_INTERVAL_MS = 50 # GUIスレッドが更新要求をまとめて適用する間隔
+
+class UiBus:
+    """ワーカースレッドからのGUI更新要求を受け付け、GUIスレッドで一定間隔ごとにまとめて適用する
+
+    Tkのウィジェットはスレッドセーフではないため、ワーカースレッドはウィジェットに直接触れず、
+    ここに更新内容を投稿する。同じウィジェット（キー）への要求は最新のものだけが残るので、
+    検索中に何百回投稿されてもGUIスレッドの処理は一定間隔ごとに1回で済む。
+    要求は最後に投稿された順に適用される。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def _post(self, key, update):
+        with self.lock:
+            self.pending.pop(key, None)
+            self.pending[key] = update
+
+    def configure(self, widget_name, **options):
+        """ウィジェットの configure(**options)。未適用の同じウィジェットへの要求とはオプション単位でまとめる"""
+        key = ("configure", widget_name)
+        with self.lock:
+            previous = self.pending.pop(key, None)
+            if previous is not None:
+                options = {**previous[2], **options}
+            self.pending[key] = ("configure", widget_name, options)
+
+    def set(self, widget_name, value):
+        """ウィジェットの set(value)"""
+        self._post(("set", widget_name), ("set", widget_name, value))
+
+    def call(self, key, func, *args):
+        """任意の関数呼び出し。同じキーの未適用の呼び出しは最新の引数のものだけが残る"""
+        self._post(("call", key), ("call", func, args))
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return list(pending.values())
+
+ui_bus = UiBus()
+
+# ====== オーディオスレッドの設定（動作中の差し替え） ======
+class EngineConfig:
+    """オーディオスレッドが参照する設定一式
+
+    一度作った設定は書き換えず、変更するときは replace() で新しい設定を作って
+    swap_engine_config() で差し替える。オーディオスレッドはチャンクごとに現在の設定を
+    確認し、差し替えられていれば変わった部分（OBS接続・描画方式・マイクなど）だけを
+    用意し直すので、動作を止めずにプリセットを切り替えられる。
+    """
+    DEFAULTS = {
+        "obs_settings": ("localhost", "4455", ""), # OBS接続情報（ホスト, ポート, パスワード）
+        "mirror_obs": (), # 同じ口パクを送る他のOBS ((OBS接続プリセット名, 接続情報), ...)
+        "scene_name": "",
+        "group_name": "",
+        "frames": None, # 画像番号とIDの対応表（FrameTable）
+        "name_pattern": DEFAULT_NAME_PATTERN, # 画像ソース名の形式（他のOBSで画像IDを引き直すときに使う）
+        "namespace": "", # このグループで使う名前空間
+        "image_range": (0, sys.maxsize), # 使用する画像番号の範囲（開始, 終了）
+        "mic_device": None, # マイクデバイスのキー（名前, ホストAPI）
+        "threshold_min": 0,
+        "threshold_max": 0,
+        "selection_mode": "volume", # 口形選択モード（"volume": 音量のみ, "vowel": 母音＋音量）
+        "vowel_table": {}, # 母音クラス → 画像番号リストの対応表
+        "auto_calibration": False, # 閾値の常時自動調整
+        "mapping_curve": "linear", # 音量→画像のマッピングカーブ（"linear", "db", "custom"）
+        "mapping_points": [], # カスタムカーブの制御点 [[入力, 出力], ...]（いずれも0〜1）
+        "hysteresis": 0.0, # コマ境界のヒステリシス幅（コマ幅に対する割合）
+        "level_detector": "envelope", # 音量の検出方式（"envelope": 包絡線, "rms": チャンク平均）
+        "attack_ms": DEFAULT_ATTACK_MS, # 包絡線のアタック時定数（ミリ秒）
+        "release_ms": DEFAULT_RELEASE_MS, # 包絡線のリリース時定数（ミリ秒）
+        "render_mode": "visibility", # 描画方式（"visibility": 画像の表示切替, "spritesheet": スプライトシート）
+        "sprite_source": "", # スプライトシート画像ソース名
+        "sprite_columns": None, # 情報ファイルが読めない場合に使う列数・コマ数（プリセットで指定）
+        "sprite_count": None,
+        "idle_after": DEFAULT_IDLE_AFTER, # 省電力待機に入るまでの無音時間（秒, 0で無効）
+        "trace_enabled": False, # セッショントレースを記録するか（プリセットには保存しない）
+        "profile_enabled": False, # 見張っているスレッドのプロファイルを記録するか（プリセットには保存しない）
+        "input_channel": 1, # 口パクに使う入力チャンネル（1始まり）
+        "channel_routes": [], # 他のチャンネルの振り分け先 [{"channel", "group_name", "namespace", "frames", "image_range"}, ...]
+        "animation_layers": [], # タイマーで動かすレイヤー [{"kind", "group_name", "namespace", "frames", "image_range", "interval"}, ...]
+        "live_only": True, # 番組・プレビューのシーンに出ているグループにだけ表示の変更を送る
+        "dispatch": True, # OBSへ口パクを送るか（False: マイクとOBS接続を用意したまま待機する）
+        "requested_at": 0.0, # 開始・再起動が押された時刻（time.time()。最初のコマまでの時間の計測用）
+    }
+
+    def __init__(self, **values):
+        unknown = set(values) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError(f"不明な設定項目です: {', '.join(sorted(unknown))}")
+        for key, default in self.DEFAULTS.items():
+            setattr(self, key, values.get(key, default))
+
+    def replace(self, **changes):
+        values = {key: getattr(self, key) for key in self.DEFAULTS}
+        values.update(changes)
+        return EngineConfig(**values)
+
+    def channel_count(self):
+        """デバイスから取り込むチャンネル数（使うチャンネルのうち最大の番号）"""
+        return max([self.input_channel] + [route["channel"] for route in self.channel_routes])
+
+    def group_config(self, entry):
+        """振り分け先やアニメーションレイヤーのグループ用の設定（音量モード・画像の表示切替で、閾値などは共通）"""
+        return self.replace(group_name=entry["group_name"], namespace=entry.get("namespace", ""), frames=entry["frames"], image_range=entry["image_range"],
+                            render_mode="visibility", selection_mode="volume", channel_routes=[], animation_layers=[])
+
+    def changed(self, other, *keys):
+        """other（直前の設定）と比べて、keys のいずれかが変わっていればTrue"""
+        return other is None or any(getattr(self, key) != getattr(other, key) for key in keys)
+
+engine_config_lock = threading.Lock()
+current_engine_config = EngineConfig()
+
+def swap_engine_config(config):
+    """オーディオスレッドの設定を差し替える（動作中なら次のチャンクから反映される）"""
+    global current_engine_config
+    with engine_config_lock:
+        current_engine_config = config
+        if engine_process is not None:
+            engine_process.send(config)
+
+def update_engine_config(**changes):
+    """現在の設定の一部だけを変更して差し替える"""
+    global current_engine_config
+    with engine_config_lock:
+        current_engine_config = current_engine_config.replace(**changes)
+        if engine_process is not None:
+            engine_process.send(current_engine_config)
+        return current_engine_config
+
+
+# ====== プリセットの読み込み ======
+PRESET_WATCH_INTERVAL_MS = 1000 # プリセットフォルダの変更を確認する間隔
+
+class PresetStore:
+    """フォルダ内のプリセット（*.json）をまとめて読み込み、メモリ上に保持する
+
+    refresh() はファイルの更新時刻とサイズだけを確認し、変わったファイルだけを読み直す。
+    GUIスレッドからのみ使う。
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.presets = {}
+        self.stamps = {} # プリセット名 → (更新時刻, サイズ)
+
+    def path(self, name):
+        return os.path.join(self.folder, f"{name}.json")
+
+    def refresh(self):
+        """フォルダを確認し、追加・変更・削除されたプリセット名の集合を返す"""
+        changed = set()
+        seen = set()
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+            name = entry.name[:-len(".json")]
+            seen.add(name)
+            stat = entry.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self.stamps.get(name) == stamp:
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                # 書き込み途中の可能性もあるので、前回の内容を残して次の確認で読み直す
+                log.warning(f"⚠ プリセット '{name}' を読み込めませんでした: {e}")
+                continue
+            self.presets[name] = data
+            self.stamps[name] = stamp
+            changed.add(name)
+        for name in list(self.presets):
+            if name not in seen:
+                del self.presets[name]
+                del self.stamps[name]
+                changed.add(name)
+        return changed
+
+    def names(self):
+        return sorted(self.presets)
+
+    def exists(self, name):
+        return name in self.presets or os.path.exists(self.path(name))
+
+    def get(self, name):
+        """プリセットの内容（コピー）を返す。無ければNone"""
+        data = self.presets.get(name)
+        return copy.deepcopy(data) if data is not None else None
+
+    def save(self, name, data):
+        file_path = self.path(name)
+        with open(file_path, "w") as f:
+            json.dump(data, f, indent=4)
+        stat = os.stat(file_path)
+        self.presets[name] = copy.deepcopy(data)
+        self.stamps[name] = (stat.st_mtime_ns, stat.st_size)
+
+    def delete(self, name):
+        os.remove(self.path(name))
+        self.presets.pop(name, None)
+        self.stamps.pop(name, None)
+
+
+OBS_BATCH_SERIAL_REALTIME = 0 # バッチ要求の実行方式（要求を順番に、すぐ実行する）
+
+class _BatchResponseFilter(logging.Filter):
+    """obs-websocket-py はバッチ要求の応答（op 9）を扱えず警告を出すので、その警告だけを出さないようにする"""
+    def filter(self, record):
+        message = record.getMessage()
+        return not (message.startswith("Unknown message:") and "'op': 9" in message[:40])
+
+logging.getLogger("obswebsocket.core").addFilter(_BatchResponseFilter())
+
+# ====== OBSへの要求の予算（優先度つき） ======
+OBS_REQUEST_BUDGET = 200 # 1つのOBSへ送る要求の上限（毎秒）
+OBS_REQUEST_BURST = 1.0 # 使わなかった予算をためておける長さ（秒分）
+REQUEST_CLASSES = ("animation", "repair", "discovery") # 優先度の高い順
+REQUEST_CLASS_LABELS = {"animation": "口パク", "repair": "復旧", "discovery": "画像検索"}
+# 下位の種類が使わずに残しておく予算の割合（口パクの分を空けておき、裏の処理で待たされないようにする）
+REQUEST_CLASS_RESERVE = {"animation": 0.0, "repair": 0.25, "discovery": 0.5}
+OBS_REQUEST_MAX_DEBT = 1.0 # 予算より大きいバッチ要求で借りにできる量（予算の何秒分まで）
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1") # 同じPCのOBSを指すホスト名（予算は1つにまとめる）
+
+class RequestScheduler:
+    """1つのOBSへの要求を、毎秒の予算（トークンバケット）と優先度で順番に通す
+
+    種類ごとに待ち行列を持ち、上位の種類が待っている間は下位の種類は通さない。
+    さらに下位の種類は予算の一部（REQUEST_CLASS_RESERVE）を残した範囲でしか使えないので、
+    画像検索が予算を使い切って口パクの送信が待たされることはない。
+    """
+    def __init__(self, rate=OBS_REQUEST_BUDGET, burst=OBS_REQUEST_BURST):
+        self.rate = rate
+        self.capacity = rate * burst
+        self.max_debt = rate * OBS_REQUEST_MAX_DEBT
+        self.tokens = self.capacity
+        self.updated = time.perf_counter()
+        self.cond = threading.Condition()
+        self.queues = {request_class: collections.deque() for request_class in REQUEST_CLASSES}
+        self.stats = {request_class: {"requests": 0, "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0} for request_class in REQUEST_CLASSES}
+
+    def _refill(self):
+        now = time.perf_counter()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _shortage(self, request_class, count, ticket):
+        """今すぐ通せるなら0、予算が足りなければ足りない量、上位の種類や先客を待つならNone"""
+        if self.queues[request_class][0] is not ticket:
+            return None
+        for higher in REQUEST_CLASSES[:REQUEST_CLASSES.index(request_class)]:
+            if self.queues[higher]:
+                return None
+        return max(0.0, self._needed(request_class, count) - self.tokens)
+
+    def _needed(self, request_class, count):
+        # 予算より大きいバッチ要求も、予算いっぱいまでたまれば通す（残りは借りにする）
+        return min(count + self.capacity * REQUEST_CLASS_RESERVE[request_class], self.capacity)
+
+    def acquire(self, request_class, count=1):
+        """count 件の要求を送ってよくなるまで待つ"""
+        start = time.perf_counter()
+        ticket = object()
+        with self.cond:
+            waiting = self.queues[request_class]
+            waiting.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    shortage = self._shortage(request_class, count, ticket)
+                    if shortage == 0:
+                        break
+                    # 予算がたまるまで、または他の要求が通って順番が変わるまで待つ
+                    self.cond.wait(shortage / self.rate if shortage else None)
+                self._charge(request_class, count, (time.perf_counter() - start) * 1000)
+            finally:
+                waiting.remove(ticket)
+                self.cond.notify_all()
+
+    def try_acquire(self, request_class, count=1):
+        """待たずに count 件を通せるならTrueを返して予算を使う（待っている要求があれば通さない）"""
+        with self.cond:
+            self._refill()
+            if any(self.queues.values()):
+                return False
+            if self.tokens < self._needed(request_class, count):
+                return False
+            self._charge(request_class, count, 0.0)
+            return True
+
+    def _charge(self, request_class, count, waited_ms):
+        # 予算より大きいバッチ要求の借りは OBS_REQUEST_MAX_DEBT までにして、次の口パクが何秒も待たされないようにする
+        self.tokens = max(-self.max_debt, self.tokens - count)
+        stats = self.stats[request_class]
+        stats["requests"] += count
+        if waited_ms >= 1.0:
+            stats["waits"] += 1
+            stats["wait_ms"] += waited_ms
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], waited_ms)
+
+    def metrics(self):
+        with self.cond:
+            return {request_class: dict(self.stats[request_class], queued=len(self.queues[request_class])) for request_class in REQUEST_CLASSES}
+
+request_schedulers = {} # request_budget_key() → RequestScheduler（同じOBSへの接続はすべて同じ予算を使う）
+request_schedulers_lock = threading.Lock()
+
+def request_budget_key(host, port):
+    """予算を分ける単位（同じPCを指す "localhost" と "127.0.0.1" などは同じOBSとして扱う）"""
+    host = str(host).strip().lower()
+    if host in LOCAL_HOSTS:
+        host = LOCAL_HOSTS[1]
+    return (host, str(port).strip())
+
+def get_request_scheduler(host, port):
+    with request_schedulers_lock:
+        key = request_budget_key(host, port)
+        if key not in request_schedulers:
+            request_schedulers[key] = RequestScheduler()
+        return request_schedulers[key]
+
+def format_request_metrics(host, port):
+    """OBSへの要求の種類ごとの送信数と待ち時間（まだ要求を送っていなければ空文字）"""
+    with request_schedulers_lock:
+        scheduler = request_schedulers.get(request_budget_key(host, port))
+    if scheduler is None:
+        return ""
+    parts = []
+    for request_class, row in scheduler.metrics().items():
+        if row["requests"] or row["queued"]:
+            average = row["wait_ms"] / row["waits"] if row["waits"] else 0.0
+            parts.append(f"{REQUEST_CLASS_LABELS[request_class]} {row['requests']}件（待ち {row['waits']}回 平均{average:.1f}ms, 待機中 {row['queued']}）")
+    return f"OBSへの要求（毎秒{scheduler.rate}件まで）: " + ", ".join(parts) if parts else ""
 
 # OBS 非同期接続用ラッパー
 class AsyncOBS:
-    def __init__(self, host, port, password):
+    """request_class は情報の取得などの要求の優先度の種類（バッチ要求での表示の変更は口パクとして送る）"""
+    def __init__(self, host, port, password, request_class="discovery"):
         self.ws = obsws(host, port, password)
+        self.batch_count = 0
+        self.request_class = request_class
+        self.scheduler = get_request_scheduler(host, port)
+
+    def _call(self, request):
+        self.scheduler.acquire(self.request_class)
+        return self.ws.call(request)
 
     def connect(self):
         try:
             self.ws.connect()
-            print("✅ OBSに接続成功")
+            log.info("✅ OBSに接続成功")
             return True
         except Exception as e:
-            print(f"❌ OBSへの接続に失敗しました: {e}")
+            log.error(f"❌ OBSへの接続に失敗しました: {e}")
+            # 認証などで失敗したときも、開いたソケットは閉じておく
+            if self.ws.ws is not None:
+                self.ws.ws.close()
             return False
             
     def get_scene_list(self):
         try:
-            response = self.ws.call(requests.GetSceneList())
+            response = self._call(requests.GetSceneList())
             if response.status:
                 scene_names = [scene['sceneName'] for scene in response.datain['scenes']]
                 return scene_names
@@ -68,179 +711,2513 @@ class AsyncOBS:
             
     def get_group_list_in_scene(self, scene_name):
         try:
-            response = self.ws.call(requests.GetSceneItemList(sceneName=scene_name))
+            response = self._call(requests.GetSceneItemList(sceneName=scene_name))
             if response.status:
                 # 修正部分: sourceKindとisGroupの両方を確認する
                 group_names = [item['sourceName'] for item in response.datain['sceneItems'] if item.get('sourceKind') == 'group' or item.get('isGroup') == True]
                 return group_names
             else:
-                return []
-        except Exception:
-            return []
+                return []
+        except Exception:
+            return []
+
+    def get_scene_items(self, scene_name):
+        """シーン内のアイテムの一覧（取得できない場合はNone）"""
+        try:
+            response = self._call(requests.GetSceneItemList(sceneName=scene_name))
+            if response.status:
+                return response.datain['sceneItems']
+            return None
+        except Exception:
+            return None
+
+    def get_current_scenes(self):
+        """(番組のシーン名, プレビューのシーン名)。スタジオモードでなければプレビューはNone"""
+        try:
+            response = self._call(requests.GetCurrentProgramScene())
+            program = response.datain.get('currentProgramSceneName') if response.status else None
+            response = self._call(requests.GetCurrentPreviewScene())
+            preview = response.datain.get('currentPreviewSceneName') if response.status else None
+            return program, preview
+        except Exception:
+            return None, None
+
+    def register_events(self, handlers):
+        """(関数, イベントの種類) の組を登録する（関数は受信スレッドで呼ばれる）"""
+        for func, event in handlers:
+            self.ws.register(func, event)
+
+    def unregister_events(self, handlers):
+        for func, event in handlers:
+            self.ws.unregister(func, event)
+
+    def get_group_items(self, group_name):
+        """グループ内のすべてのソースを {ソース名: sceneItemId} で返す（1回の要求で取得する）"""
+        try:
+            response = self._call(requests.GetGroupSceneItemList(sceneName=group_name))
+            if response.status:
+                return {item['sourceName']: item['sceneItemId'] for item in response.datain['sceneItems']}
+            return {}
+        except Exception:
+            return {}
+
+    def get_scene_item_id(self, scene_name, source_name):
+        try:
+            response = self._call(
+                requests.GetSceneItemId(sceneName=scene_name, sourceName=source_name)
+            )
+            if response.status and 'sceneItemId' in response.datain:
+                return response.datain['sceneItemId']
+            return None
+        except Exception:
+            return None
+
+    def set_visible(self, scene_name, item_id, visible):
+        try:
+            self._call(
+                requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=visible)
+            )
+        except Exception:
+            pass
+
+    def get_input_settings(self, input_name):
+        try:
+            response = self._call(requests.GetInputSettings(inputName=input_name))
+            if response.status:
+                return response.datain.get('inputSettings', {})
+            return {}
+        except Exception:
+            return {}
+
+    def get_scene_item_transform(self, scene_name, item_id):
+        try:
+            response = self._call(requests.GetSceneItemTransform(sceneName=scene_name, sceneItemId=item_id))
+            if response.status:
+                return response.datain.get('sceneItemTransform', {})
+            return {}
+        except Exception:
+            return {}
+
+    def set_scene_item_transform(self, scene_name, item_id, transform):
+        try:
+            self._call(
+                requests.SetSceneItemTransform(sceneName=scene_name, sceneItemId=item_id, sceneItemTransform=transform)
+            )
+        except Exception:
+            pass
+
+    def send_batch(self, batch_requests, request_class="animation", block=True):
+        """複数の要求を1回のバッチ要求（op 8）で送る。応答は待たない
+
+        obs-websocket-py はバッチ要求に対応していないので、接続済みのソケットに直接送る。
+        block=False なら予算が空くのを待たず、今すぐ送れない場合は送らずにFalseを返す。
+        """
+        if not batch_requests:
+            return True
+        if block:
+            self.scheduler.acquire(request_class, len(batch_requests))
+        elif not self.scheduler.try_acquire(request_class, len(batch_requests)):
+            return False
+        self.batch_count += 1
+        payload = {
+            "op": 8,
+            "d": {
+                "requestId": f"batch-{self.batch_count}",
+                "haltOnFailure": False,
+                "executionType": OBS_BATCH_SERIAL_REALTIME,
+                "requests": batch_requests
+            }
+        }
+        try:
+            self.ws.ws.send(json.dumps(payload))
+        except Exception:
+            pass
+        return True
+
+    def ping(self):
+        """1回の要求の往復時間（秒）を測る。応答が無ければNone"""
+        try:
+            start = time.perf_counter()
+            response = self._call(requests.GetVersion())
+            return time.perf_counter() - start if response.status else None
+        except Exception:
+            return None
+
+    def disconnect(self):
+        self.ws.disconnect()
+
+# ====== 画像ソースの検索（ジョブ） ======
+DISCOVERY_WORKERS = 4 # 同時にOBSへ問い合わせるグループ数（それぞれ専用の接続を使う）
+
+class DiscoveryJob:
+    """シーン内のグループを一覧し、各グループの画像ソースを並行数を制限して取得する検索ジョブ
+
+    obs-websocket-py の接続は複数スレッドから同時に使えないので、ワーカーはそれぞれ専用の接続を持つ
+    （接続数は workers 個まで）。グループの一覧を作りながら取得を始め、1グループ取得するたびに
+    on_group(job, scene_name, group_name, items) を呼ぶので、呼び出し側は全体の完了を待たずに使い始められる。
+    priority に (シーン, グループ) を渡すと、そのグループを最初に取得する。
+    count_items(items) で数えた画像数を found に合計していく（進捗表示用）。
+    cancel() すると、実行中の要求が終わった時点で残りを取得せずに on_finish(job) を呼んで終わる。
+    接続に失敗したときも、エラーを1回だけ記録して同じように取りやめる（残りのグループごとに接続を待たない）。
+    コールバックはジョブのスレッドから呼ばれる。
+    """
+    def __init__(self, obs_settings, on_group, on_finish, scene_name=None, group_name=None, priority=None, count_items=len, workers=DISCOVERY_WORKERS):
+        self.obs_settings = obs_settings
+        self.on_group = on_group
+        self.on_finish = on_finish
+        self.count_items = count_items
+        self.scene_name = scene_name # None なら全シーン
+        self.group_name = group_name # 指定するとこのグループだけ
+        self.priority = priority
+        self.workers = workers
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.total = 0 # 一覧できたグループ数（一覧の途中は増えていく）
+        self.done = 0
+        self.found = 0
+        self.finished_groups = set()
+        self.listing = True
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _fail(self, message):
+        """最初のエラーだけを残して、ジョブを取りやめる"""
+        with self.lock:
+            if self.error is None:
+                self.error = message
+        self.cancelled.set()
+
+    def progress(self):
+        """(取得済みのグループ数, 一覧できたグループ数, 見つかった画像数)"""
+        with self.lock:
+            return self.done, self.total, self.found
+
+    def is_finished(self, scene_name, group_name):
+        with self.lock:
+            return (scene_name, group_name) in self.finished_groups
+
+    def _connect(self):
+        client = AsyncOBS(self.obs_settings[0], int(self.obs_settings[1]), self.obs_settings[2])
+        return client if client.connect() else None
+
+    def _enqueue(self, scene_name, group_names):
+        if self.priority is not None and self.priority[0] == scene_name and self.priority[1] in group_names:
+            group_names = [self.priority[1]] + [name for name in group_names if name != self.priority[1]]
+        with self.lock:
+            self.total += len(group_names)
+        for group_name in group_names:
+            self.pending.put((scene_name, group_name))
+
+    def _list_groups(self):
+        """検索するグループを一覧してキューに入れる（シーンを1つ一覧するたびに取得が始まる）"""
+        if self.group_name is not None:
+            self._enqueue(self.scene_name, [self.group_name])
+            return
+        client = self._connect()
+        if client is None:
+            self._fail("OBSに接続できませんでした。")
+            return
+        try:
+            scene_names = [self.scene_name] if self.scene_name is not None else client.get_scene_list()
+            if self.priority is not None and self.priority[0] in scene_names:
+                scene_names = [self.priority[0]] + [name for name in scene_names if name != self.priority[0]]
+            for scene_name in scene_names:
+                if self.cancelled.is_set():
+                    break
+                self._enqueue(scene_name, client.get_group_list_in_scene(scene_name))
+        finally:
+            client.disconnect()
+
+    def _work(self):
+        client = None
+        try:
+            while True:
+                target = self.pending.get()
+                if target is None:
+                    return
+                if self.cancelled.is_set():
+                    continue # 残りは取得せずに読み捨てる
+                if client is None:
+                    client = self._connect()
+                    if client is None:
+                        self._fail("OBSに接続できませんでした。")
+                        continue
+                scene_name, group_name = target
+                items = client.get_group_items(group_name)
+                count = self.count_items(items)
+                with self.lock:
+                    self.done += 1
+                    self.found += count
+                    self.finished_groups.add(target)
+                self.on_group(self, scene_name, group_name, items)
+        finally:
+            if client is not None:
+                client.disconnect()
+
+    def _run(self):
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            self._list_groups()
+        except Exception as e:
+            self._fail(f"検索中にエラーが発生しました: {e}")
+        finally:
+            self.listing = False
+            for _ in workers:
+                self.pending.put(None)
+            for worker in workers:
+                worker.join()
+            self.on_finish(self)
+
+# ====== マイクデバイス（抜き差しの検出） ======
+DEVICE_WATCH_INTERVAL_MS = 2000 # デバイス一覧を確認する間隔
+MIC_RETRY_INTERVAL = 0.5 # マイクが抜かれたときに開き直しを試みる間隔（秒）
+STANDBY_DEVICE_REFRESH = DEVICE_WATCH_INTERVAL_MS / 1000 # 待機中に PyAudio を開き直してデバイス一覧を更新させる間隔（秒）
+
+def _list_input_devices(p):
+    info = p.get_host_api_info_by_index(0)
+    num_devices = info.get('deviceCount')
+    
+    devices = []
+    for i in range(0, num_devices):
+        device_info = p.get_device_info_by_host_api_device_index(0, i)
+        if device_info.get('maxInputChannels') > 0:
+            devices.append({
+                "name": device_info.get('name'),
+                "host_api": info.get('name'),
+                "index": device_info.get('index', i),
+                "channels": int(device_info.get('maxInputChannels'))
+            })
+    return devices
+
+def get_mic_devices():
+    p = pyaudio.PyAudio()
+    try:
+        return _list_input_devices(p)
+    finally:
+        p.terminate()
+
+def device_key(device):
+    """抜き差しで変わる番号の代わりに使う、デバイスを識別するキー（名前, ホストAPI）"""
+    return (device["name"], device["host_api"])
+
+def find_input_device(p, key):
+    """キーに一致する入力デバイスの現在の番号を返す（見つからなければNone）"""
+    return next((device["index"] for device in _list_input_devices(p) if device_key(device) == tuple(key)), None)
+
+class DeviceWatcher:
+    """入力デバイスの一覧を (名前, ホストAPI) をキーにして保持し、抜き差しを検出する
+
+    PortAudio はすべての PyAudio が終了するまで一覧を更新しないため、オーディオスレッドが
+    マイクを開いている間は古い一覧のままになる（マイクが抜かれるとオーディオスレッドが閉じるので更新される）。
+    停止中の待機では、オーディオスレッドが STANDBY_DEVICE_REFRESH ごとに PyAudio を開き直すので、
+    新しく挿したマイクもその間隔の遅れで一覧に出る。
+    """
+    def __init__(self):
+        self.devices = {}
+
+    def scan(self):
+        """一覧を取り直し、(接続されたデバイス, 取り外されたデバイス) のリストを返す"""
+        table = {device_key(device): device for device in get_mic_devices()}
+        arrived = [device for key, device in table.items() if key not in self.devices]
+        removed = [device for key, device in self.devices.items() if key not in table]
+        self.devices = table
+        return arrived, removed
+
+    def list(self):
+        return list(self.devices.values())
+
+# ====== 画像ソース名の命名規則 ======
+class FrameTable:
+    """画像番号（昇順）と sceneItemId を並べた対応表
+
+    オーディオスレッドはこの2つの配列だけを使い、ソース名を解析し直すことはない。
+    """
+    __slots__ = ("ordinals", "item_ids")
+
+    def __init__(self, ordinals=(), item_ids=()):
+        self.ordinals = tuple(ordinals)
+        self.item_ids = tuple(item_ids)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __eq__(self, other):
+        return isinstance(other, FrameTable) and self.ordinals == other.ordinals and self.item_ids == other.item_ids
+
+    def __hash__(self):
+        return hash((self.ordinals, self.item_ids))
+
+    def select(self, start, end):
+        """画像番号が start〜end の部分だけの対応表"""
+        low = bisect.bisect_left(self.ordinals, start)
+        high = bisect.bisect_right(self.ordinals, end)
+        return FrameTable(self.ordinals[low:high], self.item_ids[low:high])
+
+class NamingScheme:
+    """画像ソース名の形式（接頭辞{n}接尾辞）を正規表現にまとめ、ソース名から画像番号を求める
+
+    形式は一度だけ組み立て、名前空間（同じグループに口と目を入れる場合の「目」など。接頭辞の前に付く）
+    ごとの正規表現も最初に使うときに一度だけ作る。
+    """
+    def __init__(self, pattern=DEFAULT_NAME_PATTERN):
+        alternatives = []
+        for part in pattern.split("|"):
+            part = part.strip()
+            if part.count("{n}") != 1:
+                raise ValueError(f"画像名の形式には {{n}} を1つだけ含めてください: {part or '（空）'}")
+            prefix, suffix = part.split("{n}")
+            alternatives.append(f"{re.escape(prefix)}([0-9]+){re.escape(suffix)}")
+        self.pattern = pattern
+        self.body = "|".join(alternatives)
+        self.regexes = {}
+
+    def _regex(self, namespace):
+        regex = self.regexes.get(namespace)
+        if regex is None:
+            regex = self.regexes[namespace] = re.compile(f"{re.escape(namespace)}(?:{self.body})")
+        return regex
+
+    def ordinal(self, name, namespace=""):
+        """ソース名の画像番号（形式に合わなければNone）"""
+        match = self._regex(namespace).fullmatch(name)
+        return int(match.group(match.lastindex)) if match else None
+
+    def resolve(self, items, namespace=""):
+        """{ソース名: sceneItemId} から、形式に合うソースを画像番号の順に並べた FrameTable を作る（1回の走査）"""
+        regex = self._regex(namespace)
+        pairs = []
+        for name, item_id in items.items():
+            match = regex.fullmatch(name)
+            if match:
+                pairs.append((int(match.group(match.lastindex)), item_id))
+        pairs.sort()
+        # 「1」と「1.png」のように同じ番号が複数ある場合は最初の1つだけを使う
+        ordinals, item_ids = [], []
+        for ordinal, item_id in pairs:
+            if not ordinals or ordinals[-1] != ordinal:
+                ordinals.append(ordinal)
+                item_ids.append(item_id)
+        return FrameTable(ordinals, item_ids)
+
+def split_group_namespace(text):
+    """「グループ名/名前空間」を (グループ名, 名前空間) に分ける"""
+    group_name, _, namespace = text.partition("/")
+    return group_name.strip(), namespace.strip()
+
+def format_group_namespace(entry):
+    return f"{entry['group_name']}/{entry['namespace']}" if entry.get("namespace") else entry["group_name"]
+
+# ====== マルチチャンネル入力 ======
+def parse_channel_routes(text):
+    """「2:グループ名, 3:グループ名/名前空間:1-10」形式の文字列をチャンネル振り分けのリストに変換する
+
+    チャンネル番号は1始まり。画像範囲を省略したルートはグループ内の全画像を使う。
+    """
+    routes = []
+    for part in str(text).replace("、", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        fields = [field.strip() for field in part.split(":")]
+        if len(fields) not in (2, 3) or not fields[1]:
+            raise ValueError(f"「チャンネル:グループ名」の形式ではありません: {part}")
+        channel = int(fields[0])
+        if channel < 1:
+            raise ValueError(f"チャンネルは1以上で指定してください: {part}")
+        image_range = None
+        if len(fields) == 3:
+            start, _, end = fields[2].partition("-")
+            image_range = [int(start), int(end or start)]
+            if image_range[0] > image_range[1]:
+                raise ValueError(f"画像範囲の開始番号が終了番号より大きくなっています: {part}")
+        group_name, namespace = split_group_namespace(fields[1])
+        routes.append({"channel": channel, "group_name": group_name, "namespace": namespace, "image_range": image_range})
+    return routes
+
+def format_channel_routes(routes):
+    parts = []
+    for route in routes:
+        text = f"{route['channel']}:{format_group_namespace(route)}"
+        if route.get("image_range"):
+            start, end = route["image_range"]
+            text += f":{start}-{end}"
+        parts.append(text)
+    return ", ".join(parts)
+
+def split_channels(data, channels):
+    """インターリーブされたバッファを (サンプル数, チャンネル数) のビューにする（コピーしない）"""
+    return data.reshape(-1, channels)
+
+def channel_levels(frames):
+    """(サンプル数, チャンネル数) のint16配列から、全チャンネルのRMSを一度に計算する"""
+    if frames.shape[0] == 0:
+        return np.zeros(frames.shape[1])
+    return np.sqrt(np.einsum("ij,ij->j", frames, frames, dtype=np.float64) / frames.shape[0])
+
+class LevelAnalyzer:
+    """全チャンネルのRMSを、最初に確保した作業用配列だけで計算する（channel_levels と同じ結果）
+
+    int16 のサンプルを float64 の作業用配列へ写し、二乗和・平均・平方根はすべて out= で同じ配列に書き込む。
+    チャンクごとの一時配列を作らないので、長時間動かしてもGCやメモリ確保による遅れが出ない。
+    返す配列は次のチャンクで上書きされるため、値は呼び出し側ですぐに float にして使う。
+    """
+    def __init__(self, channels, frames_per_chunk=CHUNK):
+        self._allocate(frames_per_chunk, channels)
+
+    def _allocate(self, frames_per_chunk, channels):
+        self.samples = np.zeros((frames_per_chunk, channels))
+        self.levels = np.zeros(channels)
+
+    def measure(self, frames):
+        if frames.shape != self.samples.shape:
+            # 読み取れたサンプル数が違う場合（通常は起きない）だけ作業用配列を作り直す
+            self._allocate(*frames.shape)
+        if frames.shape[0] == 0:
+            self.levels.fill(0.0)
+            return self.levels
+        np.copyto(self.samples, frames)
+        np.einsum("ij,ij->j", self.samples, self.samples, out=self.levels)
+        np.multiply(self.levels, 1.0 / frames.shape[0], out=self.levels)
+        np.sqrt(self.levels, out=self.levels)
+        return self.levels
+
+# ====== 音量の包絡線（アタック・リリース） ======
+LEVEL_DETECTOR_LABELS = {"envelope": "包絡線", "rms": "チャンク平均"}
+ENVELOPE_BLOCK = 64 # 包絡線を更新するブロックのサンプル数（約1.4ms）
+
+def envelope_coefficient(time_ms, block=ENVELOPE_BLOCK):
+    """時定数（ミリ秒）を、1ブロックごとに目標へ近づく割合に変換する（0以下なら即座に追従）"""
+    if time_ms <= 0:
+        return 1.0
+    return 1.0 - math.exp(-block / RATE / (time_ms / 1000.0))
+
+class EnvelopeAnalyzer(LevelAnalyzer):
+    """小さなブロックごとのRMSを、アタックとリリースで別の時定数を持つ包絡線で追いかける
+
+    チャンク（1024サンプル）をまるごと平均すると、音の立ち上がりが最大1チャンク遅れ、
+    その前の無音で薄められてしまう。ここではブロック（ENVELOPE_BLOCK サンプル）ごとのRMSを
+    作業用配列の上でまとめて計算し、包絡線の値だけをチャンクをまたいで持ち越す。
+    返すのはチャンクの最後のブロックでの包絡線の値で、これまでのRMSと同じ尺度なので
+    閾値やマッピングはそのまま使える。
+    """
+    def __init__(self, channels, attack_ms=DEFAULT_ATTACK_MS, release_ms=DEFAULT_RELEASE_MS, frames_per_chunk=CHUNK, block=ENVELOPE_BLOCK):
+        self.block = block
+        self.attack = envelope_coefficient(attack_ms, block)
+        self.release = envelope_coefficient(release_ms, block)
+        self.envelope = [0.0] * channels
+        super().__init__(channels, frames_per_chunk)
+
+    def _allocate(self, frames_per_chunk, channels):
+        super()._allocate(frames_per_chunk, channels)
+        # 端数のサンプルは最後のブロックに含めず、次のブロックの計算には使わない（通常は割り切れる）
+        self.block_count = max(1, frames_per_chunk // self.block)
+        self.block_levels = np.zeros((self.block_count, channels))
+        if len(self.envelope) != channels:
+            self.envelope = [0.0] * channels
+
+    def measure(self, frames):
+        if frames.shape != self.samples.shape:
+            self._allocate(*frames.shape)
+        if frames.shape[0] == 0:
+            self.levels[:] = self.envelope
+            return self.levels
+        np.copyto(self.samples, frames)
+        np.multiply(self.samples, self.samples, out=self.samples)
+        used = min(frames.shape[0], self.block_count * self.block)
+        blocks = self.samples[:used].reshape(self.block_count, -1, frames.shape[1])
+        np.mean(blocks, axis=1, out=self.block_levels)
+        np.sqrt(self.block_levels, out=self.block_levels)
+
+        # 漸化式はブロック数（チャンクあたり16回）しか回らないので、Pythonのfloatで計算する
+        attack, release = self.attack, self.release
+        for channel, levels in enumerate(self.block_levels.T.tolist()):
+            value = self.envelope[channel]
+            for level in levels:
+                value += (level - value) * (attack if level > value else release)
+            self.envelope[channel] = value
+        self.levels[:] = self.envelope
+        return self.levels
+
+def make_level_analyzer(config, channels):
+    """設定の検出方式に合わせて、チャンネル数ぶんの音量解析器を作る"""
+    if config.level_detector == "envelope":
+        return EnvelopeAnalyzer(channels, config.attack_ms, config.release_ms)
+    return LevelAnalyzer(channels)
+
+# ====== 音量から画像インデックスへの対応付け（マッピングカーブ） ======
+MAPPING_CURVE_LABELS = {"linear": "リニア", "db": "dB", "custom": "カスタム"}
+MAX_HYSTERESIS = 0.5 # ヒステリシス幅の上限（隣接するコマの幅に対する割合）
+
+def parse_mapping_points(text):
+    """"0:0, 0.3:0.6, 1:1" 形式の文字列をカスタムカーブの制御点リストに変換する"""
+    points = []
+    for part in str(text).replace("、", ",").split(","):
+        part = part.strip()
+        if part:
+            x, y = part.split(":", 1)
+            points.append([float(x), float(y)])
+    return points
+
+def format_mapping_points(points):
+    return ", ".join(f"{x:g}:{y:g}" for x, y in points)
+
+def normalize_mapping_points(points):
+    """制御点を入力値順に並べ、両端(0,0)(1,1)を補い、単調増加でなければValueErrorにする"""
+    points = sorted((min(1.0, max(0.0, float(x))), min(1.0, max(0.0, float(y)))) for x, y in points)
+    if not points or points[0][0] > 0.0:
+        points.insert(0, (0.0, 0.0))
+    if points[-1][0] < 1.0:
+        points.append((1.0, 1.0))
+    ys = [y for x, y in points]
+    if any(b < a for a, b in zip(ys, ys[1:])):
+        raise ValueError("カスタムカーブの出力値は入力値に対して単調増加にしてください。")
+    return points
+
+def build_level_edges(threshold_min, threshold_max, n_images, curve="linear", points=None):
+    """各コマの境界となるRMS値（n_images + 1 個、両端は下限・上限閾値）を求める"""
+    steps = np.arange(n_images + 1) / n_images
+    if curve == "db":
+        # dB領域で等間隔（静かな声の変化も口の動きに反映されやすい）
+        low = max(1.0, threshold_min)
+        high = max(low + 1.0, threshold_max)
+        return low * (high / low) ** steps
+    if curve == "custom" and points:
+        xs, ys = zip(*normalize_mapping_points(points))
+        steps = np.interp(steps, ys, xs)
+    return threshold_min + (threshold_max - threshold_min) * steps
+
+class LevelMapper:
+    """RMSから画像インデックスを求める
+
+    コマの境界は設定変更時に一度だけ計算しておき、チャンクごとの処理はsearchsorted一回で済ませる。
+    リニアカーブでは従来の int(volume * n_images) と同じ結果になる。
+    ヒステリシスを設定すると、表示中のコマから隣のコマへ移るには境界を各コマ幅に比例した分だけ
+    余分に越える必要があり、境界付近でのコマのばたつき（とOBSへの送信）を抑える。
+    """
+    def __init__(self, threshold_min, threshold_max, n_images, curve="linear", points=None, hysteresis=0.0):
+        self.n_images = n_images
+        bounds = build_level_edges(threshold_min, threshold_max, n_images, curve, points)
+        self.edges = bounds[1:-1]
+        widths = np.diff(bounds)
+        margins = min(MAX_HYSTERESIS, max(0.0, hysteresis)) * np.minimum(widths[:-1], widths[1:])
+        self.hysteresis = bool(np.any(margins > 0))
+        self.up_edges = self.edges + margins
+        self.down_edges = self.edges - margins
+
+    def index(self, rms, prev_index=-1):
+        index = int(np.searchsorted(self.edges, rms, side="right"))
+        if not self.hysteresis or prev_index < 0 or index == prev_index:
+            return index
+        if index > prev_index:
+            return max(prev_index, int(np.searchsorted(self.up_edges, rms, side="right")))
+        return min(prev_index, int(np.searchsorted(self.down_edges, rms, side="right")))
+
+# ====== 母音判定（LPCによるフォルマント推定） ======
+# 日本語5母音の代表的なフォルマント周波数（F1, F2）[Hz]（成人男性。女性・子どもは VOWEL_SPEAKER_SCALES でずらす）
+VOWEL_FORMANTS = {
+    "a": (800.0, 1250.0),
+    "i": (300.0, 2300.0),
+    "u": (350.0, 1400.0),
+    "e": (500.0, 1950.0),
+    "o": (500.0, 850.0),
+}
+VOWEL_KEYS = ("a", "i", "u", "e", "o")
+VOWEL_LABELS = {"a": "あ", "i": "い", "u": "う", "e": "え", "o": "お"}
+SELECTION_MODE_LABELS = {"volume": "音量", "vowel": "母音＋音量"}
+VOWEL_DECIMATION = 4 # LPC解析前の間引き率（44.5kHz → 約11kHz）
+VOWEL_LPC_ORDER = 12 # LPC次数（間引き後のサンプリング周波数[kHz] + 2 程度）
+VOWEL_SPEAKER_SCALES = np.linspace(0.9, 1.4, 11) # 声道の長さに合わせてフォルマント全体をずらす倍率の候補（成人男性≒1, 女性≒1.15, 子ども≒1.3）
+VOWEL_SCALE_SMOOTHING = 0.02 # 話者の倍率の推定を1チャンクごとに近づける割合（約1秒で追従）
+
+# 判定は対数周波数空間での最近傍で行う（倍率は対数空間では平行移動になる）
+_VOWEL_CENTROIDS = np.log(np.array([VOWEL_FORMANTS[v] for v in VOWEL_KEYS]))
+_VOWEL_SCALED_CENTROIDS = _VOWEL_CENTROIDS[None, :, :] + np.log(VOWEL_SPEAKER_SCALES)[:, None, None] # (倍率, 母音, F1/F2)
+_lpc_window_cache = {}
+
+def _lpc_coefficients(x, order):
+    """自己相関法（FFT）とLevinson-Durbin再帰でLPC係数を求める"""
+    n = x.size
+    spectrum = np.fft.rfft(x, 2 * n)
+    r = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2)[:order + 1]
+    if r[0] <= 0.0:
+        return None
+    r[0] *= 1.0 + 1e-9 # 数値安定化のためのわずかなホワイトノイズ補正
+
+    a = np.zeros(order + 1)
+    a[0] = 1.0
+    err = r[0]
+    for i in range(1, order + 1):
+        k = -np.dot(a[:i], r[i:0:-1]) / err
+        a[1:i + 1] += k * a[i - 1::-1]
+        err *= 1.0 - k * k
+        if err <= 0.0:
+            return None
+    return a
+
+def estimate_formants(samples, rate=RATE):
+    """int16のチャンクからF1, F2[Hz]を推定する。推定できない場合はNoneを返す"""
+    n = (samples.size // VOWEL_DECIMATION) * VOWEL_DECIMATION
+    if n < VOWEL_LPC_ORDER * VOWEL_DECIMATION * 2:
+        return None
+    # 平均による間引き（簡易ローパス込み）とプリエンファシス
+    x = samples[:n].reshape(-1, VOWEL_DECIMATION).mean(axis=1)
+    x = np.append(x[0], x[1:] - 0.97 * x[:-1])
+    window = _lpc_window_cache.get(x.size)
+    if window is None:
+        window = _lpc_window_cache.setdefault(x.size, np.hamming(x.size))
+    a = _lpc_coefficients(x * window, VOWEL_LPC_ORDER)
+    if a is None:
+        return None
+
+    roots = np.roots(a)
+    roots = roots[roots.imag > 0]
+    fs = rate / VOWEL_DECIMATION
+    freqs = np.angle(roots) * (fs / (2 * np.pi))
+    bandwidths = -np.log(np.abs(roots)) * (fs / np.pi)
+    freqs = np.sort(freqs[(freqs > 200.0) & (freqs < fs / 2 - 100.0) & (bandwidths < 500.0)])
+    if freqs.size < 2:
+        return None
+    return float(freqs[0]), float(freqs[1])
+
+class VowelClassifier:
+    """チャンクを母音クラス（"a"〜"o"）に分類する。話者の声道の長さ（フォルマント全体の倍率）を推定しながら判定する
+
+    女性や子どもの声はフォルマントが全体に高く、成人男性の代表値のままでは「う」が「え」に、「お」が「あ」に寄る。
+    チャンクごとに全倍率・全母音の中で最も近い組み合わせの倍率を「票」とし、その指数移動平均を話者の倍率とする。
+    1チャンクだけでは、子どもの「う」と大人の「え」のように倍率を取り違える組み合わせがあるので、
+    判定には推定した倍率だけを使う（母音が入れ替わるうちに、あ・い・お などで倍率が定まる）。
+    """
+    def __init__(self):
+        self.log_scale = None # 推定した倍率（対数）。最初の有声チャンクで決める
+
+    def classify(self, samples, rate=RATE):
+        """判定不能ならNone"""
+        formants = estimate_formants(samples, rate)
+        if formants is None:
+            return None
+        log_formants = np.log(formants)
+        distances = np.sum((_VOWEL_SCALED_CENTROIDS - log_formants) ** 2, axis=2)
+        vote = float(np.log(VOWEL_SPEAKER_SCALES[np.unravel_index(np.argmin(distances), distances.shape)[0]]))
+        if self.log_scale is None:
+            self.log_scale = vote
+        else:
+            self.log_scale += (vote - self.log_scale) * VOWEL_SCALE_SMOOTHING
+        distances = np.sum((_VOWEL_CENTROIDS + self.log_scale - log_formants) ** 2, axis=1)
+        return VOWEL_KEYS[int(np.argmin(distances))]
+
+def label_to_key(labels, label, default):
+    """{設定値: 表示名} の辞書を使って、表示名から設定値を引く"""
+    return next((key for key, text in labels.items() if text == label), default)
+
+def parse_frame_list(text):
+    """"1,2,3" や "1-3" 形式の文字列を画像番号のリストに変換する"""
+    frames = []
+    for part in str(text).replace("、", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            frames.extend(range(int(first), int(last) + 1))
+        else:
+            frames.append(int(part))
+    return frames
+
+def format_frame_list(frames):
+    """画像番号のリストを "1-3,5" 形式の文字列に変換する"""
+    parts = []
+    for frame in frames:
+        if parts and parts[-1][1] + 1 == frame:
+            parts[-1][1] = frame
+        else:
+            parts.append([frame, frame])
+    return ",".join(f"{a}" if a == b else f"{a}-{b}" for a, b in parts)
+
+def build_default_vowel_table(ordinals):
+    """母音テーブル未設定時の既定値: 先頭を口閉じ、残りを5母音に均等分割する"""
+    table = {"closed": ordinals[:1]}
+    rest = ordinals[1:] or ordinals[:1]
+    size = max(1, len(rest) // len(VOWEL_KEYS))
+    for i, vowel in enumerate(VOWEL_KEYS):
+        frames = rest[i * size:(i + 1) * size] if i < len(VOWEL_KEYS) - 1 else rest[i * size:]
+        table[vowel] = frames or rest[-1:]
+    return table
+
+# ====== 閾値の自動調整（キャリブレーション） ======
+CALIBRATION_BINS = 128 # ヒストグラムのビン数（対数間隔）
+CALIBRATION_DECAY = 0.999 # チャンクごとの減衰率（約1000チャンク≒23秒分の履歴を重視）
+CALIBRATION_MIN_CHUNKS = 200 # 推定に必要な最小チャンク数（約4.6秒）
+CALIBRATION_INTERVAL = 1.0 # 常時調整モードで閾値を見直す間隔（秒）
+CALIBRATION_NOISE_PERCENTILE = 20 # 雑音レベルとみなすパーセンタイル
+CALIBRATION_SPEECH_PERCENTILE = 98 # 発話ピークとみなすパーセンタイル
+CALIBRATION_NOISE_MARGIN = 1.5 # 下限閾値 = 雑音レベル × この倍率
+CALIBRATION_SPEECH_RATIO = 0.9 # 上限閾値 = 発話ピーク × この倍率
+CALIBRATION_SAVE_DELAY_MS = 3000 # 調整結果をプリセットへ書き戻すまでの待ち時間（連続書き込みの抑制）
+
+class LevelCalibrator:
+    """チャンクRMSの減衰付きヒストグラムから雑音レベルと発話ピークを推定する
+
+    ヒストグラムは固定長配列なので、セッションがどれだけ長くてもメモリ使用量は一定。
+    減衰は「新しいサンプルほど重みを大きくする」形で実装し、1チャンクあたりの処理をO(1)に保つ。
+    """
+    def __init__(self, bins=CALIBRATION_BINS, decay=CALIBRATION_DECAY):
+        self.edges = np.geomspace(1.0, 32768.0, bins + 1)
+        self.counts = np.zeros(bins)
+        self.decay = decay
+        self.weight = 1.0
+        self.chunk_count = 0
+        self.lock = threading.Lock()
+
+    def add(self, rms):
+        with self.lock:
+            self.weight /= self.decay
+            if self.weight > 1e12:
+                # 重みが大きくなりすぎる前に正規化する
+                self.counts /= self.weight
+                self.weight = 1.0
+            bin_index = int(np.searchsorted(self.edges, rms, side="right")) - 1
+            self.counts[min(max(bin_index, 0), self.counts.size - 1)] += self.weight
+            self.chunk_count += 1
+
+    def reset(self):
+        with self.lock:
+            self.counts[:] = 0.0
+            self.weight = 1.0
+            self.chunk_count = 0
+
+    def _percentile(self, cumulative, q):
+        i = int(np.searchsorted(cumulative, cumulative[-1] * q / 100.0))
+        i = min(i, self.counts.size - 1)
+        return float(np.sqrt(self.edges[i] * self.edges[i + 1])) # ビンの幾何中心
+
+    def estimate(self):
+        """(下限閾値, 上限閾値) を返す。データ不足や発話が無い場合はNone"""
+        with self.lock:
+            if self.chunk_count < CALIBRATION_MIN_CHUNKS:
+                return None
+            cumulative = np.cumsum(self.counts)
+        noise_floor = self._percentile(cumulative, CALIBRATION_NOISE_PERCENTILE)
+        speech_peak = self._percentile(cumulative, CALIBRATION_SPEECH_PERCENTILE)
+        threshold_min = int(min(MAX_RMS_VALUE, noise_floor * CALIBRATION_NOISE_MARGIN))
+        threshold_max = int(min(MAX_RMS_VALUE, speech_peak * CALIBRATION_SPEECH_RATIO))
+        if threshold_max <= threshold_min * 1.5:
+            return None
+        return threshold_min, threshold_max
+
+level_calibrator = LevelCalibrator()
+
+# ====== 無音時の省電力待機 ======
+IDLE_GUI_INTERVAL_CHUNKS = 10 # 待機中に音量モニターへ値を送る間隔（チャンク数, 約0.23秒）
+IDLE_MONITOR_INTERVAL_MS = 250 # 待機中の音量モニター更新間隔（通常は50ms）
+
+# 動作状況の統計（オーディオスレッドが書き込み、GUIが表示する）
+engine_metrics = {
+    "idle": False, # 省電力待機中か
+    "idle_seconds": 0.0, # 今回の動作中に省電力待機していた時間（秒）
+    "cpu_saved_ms": 0.0, # 省電力待機で節約した解析処理時間の推定値（ミリ秒）
+    "mic_waiting": False, # マイクが抜かれて再接続を待っているか
+    "mic_recoveries": 0, # マイクを開き直した回数
+    "mic_recovery_seconds": 0.0, # 前回マイクが切れてから開き直すまでの時間（秒）
+    "stalls": 0, # ウォッチドッグが検出した停止の回数（起動してからの累計）
+    "start_latency_ms": 0.0, # 前回 開始が押されてから最初のコマを送るまでの時間（ミリ秒）
+    "warm_start": False, # 前回の開始が待機中のエンジンからだったか
+}
+
+def format_engine_metrics():
+    text = f"省電力待機: {'待機中' if engine_metrics['idle'] else '通常'}（累計 {engine_metrics['idle_seconds']:.0f}秒, 節約CPU時間 {engine_metrics['cpu_saved_ms']:.0f}ms）"
+    if engine_metrics["mic_waiting"]:
+        text += "\nマイク: 再接続待ち"
+    elif engine_metrics["mic_recoveries"]:
+        text += f"\nマイク再接続: {engine_metrics['mic_recoveries']}回（前回の復旧 {engine_metrics['mic_recovery_seconds']:.1f}秒）"
+    if engine_metrics["stalls"]:
+        text += f"\n処理の停止を検出: {engine_metrics['stalls']}回（詳細はログ）"
+    if engine_metrics["start_latency_ms"]:
+        text += f"\n開始から最初のコマまで: {engine_metrics['start_latency_ms']:.0f}ms（{'待機から' if engine_metrics['warm_start'] else '起動から'}）"
+    return text
+
+# ====== 音量モニターへの受け渡し（ロックなしのリング） ======
+LEVEL_RING_SLOTS = 1024 # 保持するチャンク数（約23秒分。GUIがそれ以上止まった分は読み飛ばす）
+LEVEL_RING_WRITING = np.iinfo(np.uint64).max # 書き込み途中のスロットに入れておく番号
+LEVEL_RECORD_DTYPE = np.dtype([("rms", "<f8"), ("seq", "<u8")])
+LEVEL_HEADER_DTYPE = np.dtype([("write_seq", "<u8")] + [(key, "<f8") for key in engine_metrics])
+
+class LevelRing:
+    """オーディオ側がチャンクごとの音量と動作状況を書き込み、GUIがロックなしで読むためのリング
+
+    書き手は1つだけ。スロットの番号を「書き込み中」にしてから音量を書き、最後に番号と書き込み位置を
+    進めるので、読み手は番号が期待どおりのスロットだけを使えば書きかけの値を読まずに済む。
+    スレッドで動かすときは普通のメモリ、別プロセスで動かすときは共有メモリの上に置く。
+    """
+    def __init__(self, buffer, slots=LEVEL_RING_SLOTS):
+        self.header = np.ndarray((), dtype=LEVEL_HEADER_DTYPE, buffer=buffer)
+        self.records = np.ndarray(slots, dtype=LEVEL_RECORD_DTYPE, buffer=buffer, offset=LEVEL_HEADER_DTYPE.itemsize)
+        self.levels = self.records["rms"]
+        self.seqs = self.records["seq"]
+        self.read_seq = int(self.header["write_seq"])
+
+    @staticmethod
+    def size(slots=LEVEL_RING_SLOTS):
+        return LEVEL_HEADER_DTYPE.itemsize + LEVEL_RECORD_DTYPE.itemsize * slots
+
+    def publish(self, rms):
+        """音量を1つ書き込み、あわせて engine_metrics の値も書き込む（書き手側）"""
+        seq = int(self.header["write_seq"])
+        slot = seq % len(self.seqs)
+        self.seqs[slot] = LEVEL_RING_WRITING
+        self.levels[slot] = rms
+        self.seqs[slot] = seq
+        for key, value in engine_metrics.items():
+            self.header[key] = value
+        self.header["write_seq"] = seq + 1
+
+    def read(self):
+        """前回から書き込まれた音量を古い順に返す（読み手側）"""
+        write_seq = int(self.header["write_seq"])
+        start = max(self.read_seq, write_seq - len(self.seqs) + 1)
+        self.read_seq = write_seq
+        if start >= write_seq:
+            return self.levels[:0].copy()
+        seqs = np.arange(start, write_seq, dtype=np.uint64)
+        slots = seqs % len(self.seqs)
+        # 音量を写してから番号を確かめる（写している間に上書きされたスロットは番号が変わっている）
+        levels = self.levels[slots]
+        return levels[self.seqs[slots] == seqs]
+
+    def metrics(self):
+        """書き手が最後に書き込んだ engine_metrics の値"""
+        return {key: type(default)(self.header[key]) for key, default in engine_metrics.items()}
+
+    def close(self):
+        """バッファへの参照を手放す（共有メモリを閉じる前に呼ぶ）"""
+        del self.header, self.records, self.levels, self.seqs
+
+level_ring = LevelRing(bytearray(LevelRing.size()))
+
+# ====== 描画方式 ======
+RENDER_MODE_LABELS = {"visibility": "画像の表示切替", "spritesheet": "スプライトシート"}
+SPRITE_METADATA_SUFFIX = ".json" # スプライトシート画像と同じ名前で置く情報ファイルの拡張子
+
+class VisibilityRenderer:
+    """グループ内の番号付き画像ソースの表示・非表示を切り替えてコマを描画する（従来方式）"""
+    def __init__(self, obs, group_name, item_ids, ordinals):
+        self.obs = obs
+        self.group_name = group_name
+        self.item_ids = item_ids
+        self.ordinals = ordinals
+
+    def reset(self):
+        # すべての画像を非表示にする
+        for item_id in self.item_ids:
+            if item_id is not None:
+                self.obs.set_visible(self.group_name, item_id, False)
+
+    def show(self, index, prev_index):
+        if prev_index != -1 and prev_index is not None:
+            item_id_to_hide = self.item_ids[prev_index]
+            if item_id_to_hide is not None:
+                self.obs.set_visible(self.group_name, item_id_to_hide, False)
+
+        item_id_to_show = self.item_ids[index]
+        if item_id_to_show is not None:
+            self.obs.set_visible(self.group_name, item_id_to_show, True)
+
+class RequestBatch:
+    """描画方式からの表示の変更をためておき、1回のバッチ要求にまとめてOBSへ送る
+
+    表示の変更（set_visible / set_scene_item_transform）だけをため、情報の取得はそのままOBSに渡す。
+    """
+    def __init__(self, obs):
+        self.obs = obs
+        self.requests = []
+
+    def __getattr__(self, name):
+        return getattr(self.obs, name)
+
+    def set_visible(self, scene_name, item_id, visible):
+        self.requests.append({"requestType": "SetSceneItemEnabled", "requestData": {"sceneName": scene_name, "sceneItemId": item_id, "sceneItemEnabled": visible}})
+
+    def set_scene_item_transform(self, scene_name, item_id, transform):
+        self.requests.append({"requestType": "SetSceneItemTransform", "requestData": {"sceneName": scene_name, "sceneItemId": item_id, "sceneItemTransform": transform}})
+
+    def flush(self, request_class="animation"):
+        """ためた要求をまとめて送り、送った要求の数を返す"""
+        count = len(self.requests)
+        if count:
+            self.obs.send_batch(self.requests, request_class)
+            self.requests = []
+        return count
+
+class SpriteSheetRenderer:
+    """1枚のスプライトシート画像ソースを切り抜き（クロップ）範囲の変更でコマ送りする
+
+    OBSが保持する画像は1枚だけになり、コマの切り替えもSetSceneItemTransformの1リクエストで済む。
+    """
+    def __init__(self, obs, group_name, item_id, sheet_width, sheet_height, columns, frame_width, frame_height, cells, ordinals):
+        self.obs = obs
+        self.group_name = group_name
+        self.item_id = item_id
+        self.ordinals = ordinals
+        # コマごとのクロップ値を先に計算しておく
+        self.crops = []
+        for cell in cells:
+            left = (cell % columns) * frame_width
+            top = (cell // columns) * frame_height
+            self.crops.append({
+                "cropLeft": left,
+                "cropTop": top,
+                "cropRight": max(0, sheet_width - left - frame_width),
+                "cropBottom": max(0, sheet_height - top - frame_height),
+            })
+
+    @classmethod
+    def load(cls, obs, group_name, source_name, start_index, end_index, fallback_columns=None, fallback_count=None):
+        """OBS上のスプライトシート画像ソースと情報ファイルから描画器を作る（失敗時はValueError）"""
+        item_id = obs.get_scene_item_id(group_name, source_name)
+        if item_id is None:
+            raise ValueError(f"スプライトシート '{source_name}' がグループ '{group_name}' 内に見つかりません。")
+        transform = obs.get_scene_item_transform(group_name, item_id)
+        sheet_width = int(transform.get("sourceWidth", 0))
+        sheet_height = int(transform.get("sourceHeight", 0))
+        if sheet_width <= 0 or sheet_height <= 0:
+            raise ValueError(f"スプライトシート '{source_name}' の画像サイズを取得できませんでした。")
+
+        # 情報ファイル（ツールで作成した <画像名>.json）を優先し、無ければプリセットの列数・コマ数を使う
+        metadata = {}
+        image_file = obs.get_input_settings(source_name).get("file")
+        if image_file:
+            try:
+                with open(os.path.splitext(image_file)[0] + SPRITE_METADATA_SUFFIX, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                metadata = {}
+        columns = int(metadata.get("columns") or fallback_columns or 0)
+        frames = metadata.get("frames") or list(range(1, int(fallback_count or 0) + 1))
+        if columns <= 0 or not frames:
+            raise ValueError(f"スプライトシート '{source_name}' の情報ファイルが見つかりません。")
+        rows = -(-len(frames) // columns)
+        frame_width = int(metadata.get("frame_width") or sheet_width // columns)
+        frame_height = int(metadata.get("frame_height") or sheet_height // rows)
+
+        cells = [cell for cell, ordinal in enumerate(frames) if start_index <= ordinal <= end_index]
+        if not cells:
+            raise ValueError("選択された範囲にスプライトシートのコマがありません。")
+        ordinals = [frames[cell] for cell in cells]
+        return cls(obs, group_name, item_id, sheet_width, sheet_height, columns, frame_width, frame_height, cells, ordinals)
+
+    def reset(self):
+        self.show(0, -1)
+
+    def show(self, index, prev_index):
+        self.obs.set_scene_item_transform(self.group_name, self.item_id, self.crops[index])
+
+RENDERER_CONFIG_KEYS = ("render_mode", "group_name", "frames", "image_range", "sprite_source", "sprite_columns", "sprite_count")
+
+def build_renderer(obs, config):
+    """設定に合わせて描画方式を用意する（用意できない場合はValueError）"""
+    start_index, end_index = config.image_range
+    if config.render_mode == "spritesheet":
+        return SpriteSheetRenderer.load(obs, config.group_name, config.sprite_source, start_index, end_index, config.sprite_columns, config.sprite_count)
+
+    if not config.frames:
+        raise ValueError("画像ソースのIDが取得できていません。")
+
+    # 選択された範囲の画像のみを抽出
+    frames = config.frames.select(start_index, end_index)
+    if not frames:
+        raise ValueError("選択された範囲に画像ソースが見つかりませんでした。")
+    return VisibilityRenderer(obs, config.group_name, list(frames.item_ids), list(frames.ordinals))
+
+def build_vowel_positions(config, ordinals):
+    """母音モード: 母音テーブルの画像番号を選択範囲内の位置に変換する（音量モードでは空）"""
+    vowel_positions = {}
+    if config.selection_mode == "vowel":
+        ordinal_to_position = {ordinal: pos for pos, ordinal in enumerate(ordinals)}
+        table = config.vowel_table or build_default_vowel_table(sorted(ordinal_to_position))
+        for key, frames in table.items():
+            positions = [ordinal_to_position[frame] for frame in frames if frame in ordinal_to_position]
+            if positions:
+                vowel_positions[key] = positions
+    return vowel_positions
+
+# ====== 番組・プレビューに出ているグループ ======
+SCENE_SOURCE_TYPE = "OBS_SOURCE_TYPE_SCENE" # 入れ子にしたシーン（グループもこの種類）
+
+class LiveGroups:
+    """番組（プログラム）・プレビューのシーンから見えるシーンとグループの名前を、OBSのイベントで追跡する
+
+    イベントは obs-websocket の受信スレッドで届き、そこからは要求を送れないので、
+    変化を記録して on_change で知らせるだけにし、シーンの中身の問い合わせは refresh() で行う。
+    入れ子にしたシーンの中もたどる。現在のシーンやシーンの中身を取得できない場合（古いOBSなど）は、
+    names を None にしてすべてを出演中として扱う。
+    """
+    def __init__(self, obs, on_change):
+        self.obs = obs
+        self.on_change = on_change
+        self.program_scene = None
+        self.preview_scene = None
+        self.initialized = False
+        self.dirty = True
+        self.names = None # 出演中のシーン・グループの名前（None ならすべて）
+        self.handlers = ((self._on_program, events.CurrentProgramSceneChanged),
+                         (self._on_preview, events.CurrentPreviewSceneChanged),
+                         (self._on_studio_mode, events.StudioModeStateChanged),
+                         (self._on_scene_changed, events.SceneItemCreated),
+                         (self._on_scene_changed, events.SceneItemRemoved),
+                         (self._on_scene_changed, events.SceneNameChanged))
+        obs.register_events(self.handlers)
+
+    def _changed(self):
+        self.dirty = True
+        self.on_change()
+
+    def _on_program(self, event):
+        self.program_scene = event.datain.get("sceneName")
+        self._changed()
+
+    def _on_preview(self, event):
+        self.preview_scene = event.datain.get("sceneName")
+        self._changed()
+
+    def _on_studio_mode(self, event):
+        if not event.datain.get("studioModeEnabled"):
+            self.preview_scene = None
+        self._changed()
+
+    def _on_scene_changed(self, event):
+        self._changed()
+
+    def refresh(self):
+        """出演中の名前を問い合わせ直す（要求を送れるスレッドで呼ぶ）"""
+        self.dirty = False # 問い合わせ中に届いた変化は、次の refresh() で反映する
+        if not self.initialized:
+            self.program_scene, self.preview_scene = self.obs.get_current_scenes()
+            self.initialized = True
+        if self.program_scene is None:
+            self.names = None
+            return
+        names = set()
+        scenes = [scene for scene in (self.program_scene, self.preview_scene) if scene]
+        while scenes:
+            scene = scenes.pop()
+            if scene in names:
+                continue
+            names.add(scene)
+            items = self.obs.get_scene_items(scene)
+            if items is None:
+                self.names = None
+                return
+            for item in items:
+                if item.get("isGroup") or item.get("sourceKind") == "group":
+                    names.add(item["sourceName"])
+                elif item.get("sourceType") == SCENE_SOURCE_TYPE:
+                    scenes.append(item["sourceName"])
+        self.names = names
+
+    def is_live(self, name):
+        return self.names is None or name in self.names
+
+    def close(self):
+        self.obs.unregister_events(self.handlers)
+
+# ====== 複数のOBSへの送信 ======
+OBS_PING_INTERVAL = 2.0 # 往復時間を測る間隔（秒）
+OBS_TARGET_METRICS_INTERVAL = 1.0 # OBSごとの送信状況をGUIへ送る間隔（秒）
+OBS_DISPATCHER_STOP_TIMEOUT = 2.0 # 送信スレッドの終了を待つ時間（秒）
+OBS_SETUP_CHUNK = 50 # 描画方式の初期化（全画像の非表示など）を1回のバッチ要求で送る最大件数
+OBS_SETUP_RETRY = 0.05 # 初期化の要求を送る予算が無かったときに、もう一度試すまでの時間（秒）
+OBS_LATENCY_SMOOTHING = 0.1 # 送信時間の指数移動平均の係数
+
+class ObsDispatcher:
+    """1つのOBSへの表示の変更を、そのOBS専用のスレッドで送る
+
+    オーディオスレッドは send_batch() で要求を預けるだけで、送信を待たない。
+    まだ送っていない要求は (要求の種類, グループ, アイテムID) ごとに最新のものだけを残すので、
+    送信が遅れているOBSには変更がまとめて届き、最終的な表示は他のOBSと同じになる。
+    live_only のときは、そのOBSの番組・プレビューに出ていないグループへの要求は送らずに保留し
+    （同じくアイテムごとに最新のものだけを残す）、グループがシーンに出た時点でまとめて送る。
+    情報の取得（描画方式を用意するとき）も送信スレッドと同じ接続を使うので、ロックで順番に使う。
+    描画方式の初期化（「復旧」の優先度で預けた要求）は OBS_SETUP_CHUNK 件ずつ、予算が空いているときだけ送り、
+    その間に預けられた口パクの要求を先に送る（画像の多いグループでも、開始直後の口パクが待たされない）。
+    """
+    def __init__(self, name, obs, live_only=True):
+        self.name = name
+        self.obs = obs
+        self.obs_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.held = {} # シーンに出ていないグループへの要求（送信スレッドだけが使う）
+        self.live_only = live_only
+        self.pending_since = 0.0
+        self.wake = threading.Event()
+        self.running = True
+        self.batches = 0 # 送ったバッチ要求の数
+        self.merged = 0 # 送る前に新しい要求で置き換えた要求の数
+        self.wait_ms = 0.0 # 要求を預けてから送り始めるまでの時間（指数移動平均）
+        self.send_ms = 0.0 # バッチ要求の送信にかかった時間（指数移動平均）
+        self.rtt_ms = None # 往復時間（最後に測った値）
+        self.last_batch = None # 最後に送り終えたバッチ要求の (待ち時間[ms], 送信時間[ms])（送るたびに新しいタプルにする）
+        self.skipped = 0 # シーンに出ていないため送らずに済んだ要求の数
+        self.live = LiveGroups(obs, self.wake_up)
+        self.thread = threading.Thread(target=self._run, name=f"obs-{name}", daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        method = getattr(self.obs, name)
+        def call(*args, **kwargs):
+            with self.obs_lock:
+                return method(*args, **kwargs)
+        return call
+
+    def send_batch(self, batch_requests, request_class="animation"):
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.perf_counter()
+            for request in batch_requests:
+                data = request["requestData"]
+                key = (request["requestType"], data["sceneName"], data["sceneItemId"])
+                if self.pending.pop(key, None) is not None:
+                    self.merged += 1
+                self.pending[key] = (request, request_class)
+        self.wake.set()
+
+    def wake_up(self):
+        self.wake.set()
+
+    def set_live_only(self, live_only):
+        self.live_only = live_only
+        self.wake.set()
+
+    def _hold_offline(self, pending):
+        """シーンに出ていないグループへの要求を保留に回し、今送る要求を返す"""
+        if self.live.dirty:
+            with self.obs_lock:
+                self.live.refresh()
+        if not self.live_only:
+            self.held, pending = {}, {**self.held, **pending}
+            return pending
+        for key, request in pending.items():
+            if self.held.pop(key, None) is not None:
+                self.skipped += 1
+            self.held[key] = request
+        sending = {key: request for key, request in self.held.items() if self.live.is_live(key[1])}
+        for key in sending:
+            del self.held[key]
+        return sending
+
+    def _send(self, pending, setup_limit=None):
+        """口パクの要求を先に送り、続けて初期化の要求を setup_limit 件まで送る。送れなかった初期化の要求を返す"""
+        animation = [request for request, request_class in pending.values() if request_class == "animation"]
+        setup = [(key, item) for key, item in pending.items() if item[1] != "animation"]
+        self.obs.send_batch(animation)
+        if setup_limit is None:
+            self.obs.send_batch([request for _, (request, _) in setup], "repair")
+            return {}
+        sending = setup[:setup_limit]
+        if not self.obs.send_batch([request for _, (request, _) in sending], "repair", block=False):
+            sending = []
+        return dict(setup[len(sending):])
+
+    def _run(self):
+        # 要求を待っている間は見張らず、送信と往復時間の測定の間だけ見張る
+        stage = f"send:{self.name}"
+        watchdog.watch(stage, STALL_THRESHOLDS["send"])
+        watchdog.rest(stage)
+        last_ping = 0.0
+        timeout = OBS_PING_INTERVAL
+        try:
+            while self.running:
+                self.wake.wait(timeout)
+                self.wake.clear()
+                watchdog.beat(stage)
+                with self.lock:
+                    pending, self.pending = self.pending, {}
+                    since = self.pending_since
+                pending = self._hold_offline(pending)
+                timeout = OBS_PING_INTERVAL
+                if pending:
+                    start = time.perf_counter()
+                    with self.obs_lock:
+                        rest = self._send(pending, OBS_SETUP_CHUNK)
+                    if rest:
+                        # 残りの初期化の要求は預かり直す（その間に新しく預けられた要求のほうを残す）
+                        with self.lock:
+                            if not self.pending:
+                                self.pending_since = time.perf_counter()
+                            for key, item in rest.items():
+                                self.pending.setdefault(key, item)
+                        timeout = OBS_SETUP_RETRY
+                    done = time.perf_counter()
+                    self.batches += 1
+                    self.last_batch = ((start - since) * 1000, (done - start) * 1000)
+                    self.wait_ms += (self.last_batch[0] - self.wait_ms) * OBS_LATENCY_SMOOTHING
+                    self.send_ms += (self.last_batch[1] - self.send_ms) * OBS_LATENCY_SMOOTHING
+                if time.perf_counter() - last_ping >= OBS_PING_INTERVAL:
+                    last_ping = time.perf_counter()
+                    with self.obs_lock:
+                        rtt = self.obs.ping()
+                    self.rtt_ms = rtt * 1000 if rtt is not None else None
+                watchdog.rest(stage)
+        finally:
+            watchdog.unwatch(stage)
+
+    def metrics(self):
+        return {"name": self.name, "wait_ms": self.wait_ms, "send_ms": self.send_ms, "rtt_ms": self.rtt_ms,
+                "batches": self.batches, "merged": self.merged, "held": len(self.held), "skipped": self.skipped}
+
+    def close(self):
+        """預かっている要求を送り切ってから切断する（保留中の要求は、シーンに出ていないので送らない）"""
+        self.running = False
+        self.wake.set()
+        self.thread.join(OBS_DISPATCHER_STOP_TIMEOUT)
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        pending = self._hold_offline(pending)
+        self.live.close()
+        with self.obs_lock:
+            if pending:
+                self._send(pending)
+            self.obs.disconnect()
+
+class FanOutRenderer:
+    """OBSごとに作った描画方式を同じコマで同時に動かす（コマの番号はメインのOBSのもの）"""
+    def __init__(self, renderers):
+        self.renderers = renderers
+        self.ordinals = renderers[0].ordinals
+
+    def reset(self):
+        for renderer in self.renderers:
+            renderer.reset()
+
+    def show(self, index, prev_index):
+        for renderer in self.renderers:
+            renderer.show(index, prev_index)
+
+def build_mirror_renderer(obs, config, primary):
+    """他のOBS用の描画方式を作る。画像IDはそのOBSのグループを名前で引き直す（見つからない場合はValueError）"""
+    if config.render_mode == "spritesheet":
+        renderer = build_renderer(obs, config)
+        if renderer.ordinals != primary.ordinals:
+            raise ValueError("スプライトシートのコマがメインのOBSと一致しません。")
+        return renderer
+    frames = NamingScheme(config.name_pattern).resolve(obs.get_group_items(config.group_name), config.namespace)
+    item_ids = dict(zip(frames.ordinals, frames.item_ids))
+    if not any(ordinal in item_ids for ordinal in primary.ordinals):
+        raise ValueError(f"グループ '{config.group_name}' に画像ソースが見つかりませんでした。")
+    # メインのOBSにしかない画像は表示しない（VisibilityRenderer は None のIDを読み飛ばす）
+    return VisibilityRenderer(obs, config.group_name, [item_ids.get(ordinal) for ordinal in primary.ordinals], primary.ordinals)
+
+class ObsTargets:
+    """口パクを送るOBS（メイン＋ミラー）への接続一式
+
+    OBSごとに ObsDispatcher と RequestBatch を持ち、描画方式もOBSごとに作って FanOutRenderer で束ねる。
+    ミラー先に接続できない・グループが無い場合は警告して、そのOBSを除いて続ける。
+    """
+    def __init__(self, config):
+        host, port, password = config.obs_settings
+        # 描画方式を用意するときの情報の取得や往復時間の測定は「復旧」の優先度で送る
+        primary = AsyncOBS(host, int(port), password, request_class="repair")
+        if not primary.connect():
+            raise ConnectionError("OBSに接続できませんでした。")
+        self.dispatchers = [ObsDispatcher("メイン", primary, config.live_only)]
+        for name, (host, port, password) in config.mirror_obs:
+            mirror = AsyncOBS(host, int(port), password, request_class="repair")
+            if mirror.connect():
+                self.dispatchers.append(ObsDispatcher(name, mirror, config.live_only))
+            else:
+                log.warning(f"⚠ OBS '{name}' に接続できないため、このOBSには送りません")
+        self.batches = [RequestBatch(dispatcher) for dispatcher in self.dispatchers]
 
-    def get_scene_item_id(self, scene_name, source_name):
-        try:
-            response = self.ws.call(
-                requests.GetSceneItemId(sceneName=scene_name, sourceName=source_name)
-            )
-            if response.status and 'sceneItemId' in response.datain:
-                return response.datain['sceneItemId']
-            return None
-        except Exception:
-            return None
+    def build_renderer(self, config):
+        """すべてのOBSに同じコマを表示する描画方式を作る（メインのOBSで用意できない場合はValueError）"""
+        primary = build_renderer(self.batches[0], config)
+        renderers = [primary]
+        for dispatcher, batch in zip(self.dispatchers[1:], self.batches[1:]):
+            try:
+                renderers.append(build_mirror_renderer(batch, config, primary))
+            except ValueError as e:
+                log.warning(f"⚠ OBS '{dispatcher.name}': {e}（このOBSには送りません）")
+        return FanOutRenderer(renderers)
 
-    def set_visible(self, scene_name, item_id, visible):
-        try:
-            self.ws.call(
-                requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=visible)
-            )
-        except Exception:
-            pass
+    def set_live_only(self, live_only):
+        for dispatcher in self.dispatchers:
+            dispatcher.set_live_only(live_only)
+
+    def has_requests(self):
+        return any(batch.requests for batch in self.batches)
+
+    def flush(self, request_class="animation"):
+        """ためた要求を各OBSの送信スレッドに預ける（送信は待たない）"""
+        return sum(batch.flush(request_class) for batch in self.batches)
+
+    def metrics(self):
+        return [dispatcher.metrics() for dispatcher in self.dispatchers]
 
     def disconnect(self):
-        self.ws.disconnect()
+        for dispatcher in self.dispatchers:
+            dispatcher.close()
 
-# PyAudioデバイス取得関数
-def get_mic_devices():
-    p = pyaudio.PyAudio()
-    info = p.get_host_api_info_by_index(0)
-    num_devices = info.get('deviceCount')
-    
-    devices = []
-    for i in range(0, num_devices):
-        device_info = p.get_device_info_by_host_api_device_index(0, i)
-        if device_info.get('maxInputChannels') > 0:
-            devices.append({
-                "name": device_info.get('name'),
-                "index": i
-            })
-    p.terminate()
-    return devices
+def format_obs_target_metrics(rows):
+    lines = []
+    for row in rows:
+        rtt = f"{row['rtt_ms']:.1f}ms" if row["rtt_ms"] is not None else "応答なし"
+        line = f"OBS {row['name']}: 往復 {rtt}, 送信待ち {row['wait_ms']:.1f}ms, 送信 {row['send_ms']:.1f}ms（まとめた要求 {row['merged']}件）"
+        if row["skipped"]:
+            line += f", シーンに出ていないため省いた要求 {row['skipped']}件"
+        lines.append(line)
+    return "\n".join(lines)
+
+# ====== コマの選択 ======
+class FrameSelector:
+    """音量（母音モードでは母音も）から表示するコマを選び、切り替えの間隔（COOLING_TIME）を守る
+
+    オーディオスレッドと、補助ツールでのトレースの再生で同じ処理を使う。
+    """
+    def __init__(self, config, ordinals):
+        self.ordinals = ordinals
+        self.n_frames = len(ordinals)
+        self.prev_index = -1
+        self.last_change_time = 0
+        self.last_vowel = "a"
+        self.config = None
+        self.reconfigure(config)
+
+    def reconfigure(self, config):
+        """設定の差し替え。表示中のコマと最後に切り替えた時刻は引き継ぐ"""
+        if self.config is None or config.changed(self.config, "selection_mode", "vowel_table"):
+            self.vowel_positions = build_vowel_positions(config, self.ordinals)
+            self.closed_index = self.vowel_positions.get("closed", [0])[0]
+        self.config = config
+        # 閾値などが変わった可能性があるので、コマの境界は次に使うときに計算し直す
+        self.mappers = {}
+
+    def _mapper(self, n_images):
+        mapper = self.mappers.get(n_images)
+        if mapper is None:
+            config = self.config
+            mapper = self.mappers[n_images] = LevelMapper(config.threshold_min, config.threshold_max, n_images, config.mapping_curve, config.mapping_points, config.hysteresis)
+        return mapper
+
+    def needs_vowel(self, rms):
+        """このチャンクで母音判定が必要か"""
+        return bool(self.vowel_positions) and rms >= self.config.threshold_min
+
+    def choose(self, rms, vowel=None):
+        """表示すべきコマの位置を返す（vowel: 母音判定の結果。判定できなかった場合はNone）"""
+        if not self.vowel_positions:
+            return self._mapper(self.n_frames).index(rms, self.prev_index)
+        if rms < self.config.threshold_min:
+            # 音量閾値以下の場合、口閉じ画像を表示する
+            return self.closed_index
+        # 判定できなかったチャンク（子音・雑音）は直前の母音を引き継ぐ
+        self.last_vowel = vowel or self.last_vowel
+        frames = self.vowel_positions.get(self.last_vowel) or self.vowel_positions.get("a") or [self.closed_index]
+        prev_level = frames.index(self.prev_index) if self.prev_index in frames else -1
+        return frames[self._mapper(len(frames)).index(rms, prev_level)]
+
+    def commit(self, index, now):
+        """切り替えの間隔を満たしていれば表示中のコマを index にしてTrueを返す"""
+        if index != self.prev_index and (now - self.last_change_time) >= COOLING_TIME:
+            self.prev_index = index
+            self.last_change_time = now
+            return True
+        return False
+
+# ====== アニメーションレイヤー（タイマー駆動） ======
+LAYER_KIND_LABELS = {"blink": "まばたき", "idle": "待機"}
+LAYER_DEFAULT_INTERVALS = {"blink": (2.0, 6.0), "idle": (5.0, 15.0)} # 次に動くまでの秒数（最小, 最大）
+BLINK_FRAME_SECONDS = 0.05 # まばたき中の1コマの表示時間
+TIMER_WHEEL_SLOTS = 256
+
+def parse_animation_layers(text):
+    """「まばたき:目:1-3@2-6, 待機:からだ@5-10」形式の文字列をアニメーションレイヤーのリストに変換する
+
+    種類:グループ名[/名前空間][:開始-終了][@最小秒-最大秒]。間隔を省略すると種類ごとの既定値を使う。
+    """
+    layers = []
+    for part in str(text).replace("、", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        spec, _, interval_text = part.partition("@")
+        fields = [field.strip() for field in spec.split(":")]
+        if len(fields) not in (2, 3) or not fields[1]:
+            raise ValueError(f"「種類:グループ名」の形式ではありません: {part}")
+        kind = label_to_key(LAYER_KIND_LABELS, fields[0], fields[0])
+        if kind not in LAYER_KIND_LABELS:
+            raise ValueError(f"レイヤーの種類は {'・'.join(LAYER_KIND_LABELS.values())} のいずれかです: {part}")
+        image_range = None
+        if len(fields) == 3:
+            start, _, end = fields[2].partition("-")
+            image_range = [int(start), int(end or start)]
+        interval = list(LAYER_DEFAULT_INTERVALS[kind])
+        if interval_text.strip():
+            low, _, high = interval_text.strip().partition("-")
+            interval = [float(low), float(high or low)]
+            if not 0 < interval[0] <= interval[1]:
+                raise ValueError(f"間隔は「2-6」のように小さい方から正の秒数で指定してください: {part}")
+        group_name, namespace = split_group_namespace(fields[1])
+        layers.append({"kind": kind, "group_name": group_name, "namespace": namespace, "image_range": image_range, "interval": interval})
+    return layers
+
+def format_animation_layers(layers):
+    parts = []
+    for layer in layers:
+        text = f"{LAYER_KIND_LABELS[layer['kind']]}:{format_group_namespace(layer)}"
+        if layer.get("image_range"):
+            start, end = layer["image_range"]
+            text += f":{start}-{end}"
+        low, high = layer["interval"]
+        text += f"@{low:g}-{high:g}" if low != high else f"@{low:g}"
+        parts.append(text)
+    return ", ".join(parts)
+
+class TimerWheel:
+    """オーディオスレッドのチャンクを1目盛りとして進めるタイマーホイール
+
+    レイヤーごとにスレッドやタイマーを作らず、advance() で期限の来た項目をまとめて取り出す。
+    1周より先の予定は、期限の目盛りになるまで同じ枠に残しておく。
+    """
+    def __init__(self, tick_seconds, slots=TIMER_WHEEL_SLOTS):
+        self.tick_seconds = tick_seconds
+        self.slots = [[] for _ in range(slots)]
+        self.start_time = time.time()
+        self.tick = 0
+
+    def schedule(self, delay, item):
+        target = self.tick + max(1, math.ceil(delay / self.tick_seconds))
+        self.slots[target % len(self.slots)].append((target, item))
+
+    def advance(self, now):
+        """now までに期限が来た項目を期限順に返す"""
+        due = []
+        target_tick = int((now - self.start_time) / self.tick_seconds)
+        while self.tick < target_tick:
+            self.tick += 1
+            slot = self.slots[self.tick % len(self.slots)]
+            if slot:
+                due.extend(item for tick, item in slot if tick <= self.tick)
+                slot[:] = [entry for entry in slot if entry[0] > self.tick]
+        return due
+
+class TimerLayer:
+    """タイマーホイールから呼ばれて、グループ内のコマを切り替えるレイヤー"""
+    def __init__(self, renderer, interval, rng):
+        self.renderer = renderer
+        self.interval = interval
+        self.rng = rng
+        self.current = -1
+
+    def _show(self, index):
+        self.renderer.show(index, self.current)
+        self.current = index
+
+    def _schedule_next(self, wheel):
+        wheel.schedule(self.rng.uniform(*self.interval), self)
+
+    def start(self, wheel):
+        self._show(0)
+        if len(self.renderer.ordinals) > 1:
+            self._schedule_next(wheel)
+
+class BlinkLayer(TimerLayer):
+    """ランダムな間隔で、画像範囲の先頭（目を開けた画像）から最後のコマまで進めて先頭に戻す"""
+    def __init__(self, renderer, interval, rng):
+        super().__init__(renderer, interval, rng)
+        n_frames = len(renderer.ordinals)
+        self.sequence = list(range(1, n_frames)) + list(range(n_frames - 2, -1, -1))
+        self.step = 0
+
+    def fire(self, wheel):
+        self._show(self.sequence[self.step])
+        self.step += 1
+        if self.step < len(self.sequence):
+            wheel.schedule(BLINK_FRAME_SECONDS, self)
+        else:
+            self.step = 0
+            self._schedule_next(wheel)
+
+class IdleLayer(TimerLayer):
+    """ランダムな間隔で、画像範囲の中からランダムなコマに切り替える"""
+    def fire(self, wheel):
+        self._show(self.rng.choice([index for index in range(len(self.renderer.ordinals)) if index != self.current]))
+        self._schedule_next(wheel)
 
-# 音量から画像インデックス計算
-def get_image_index(volume, n_images):
-    index = int(volume * n_images)
-    return min(index, n_images - 1)
+TIMER_LAYER_CLASSES = {"blink": BlinkLayer, "idle": IdleLayer}
+
+# ====== セッショントレース ======
+TRACE_FOLDER = "traces"
+TRACE_SUFFIX = ".trace"
+TRACE_MAGIC = b"YKTR"
+TRACE_VERSION = 3
+TRACE_CAPACITY = 1 << 17 # 記録するチャンク数の上限（約50分。超えたら古いものから上書きする）
+TRACE_HEADER_SIZE = 64 # ヘッダー（固定部）に使う領域。設定のJSONはレコードの後ろに必要なだけ置く
+TRACE_KEEP_FILES = 5 # 残しておくトレースファイルの数
+# 識別子, 版, レコード長, 容量, 書き込んだレコードの総数, 開始時刻, JSONの長さ
+TRACE_HEADER = struct.Struct("<4sHIIQdI")
+TRACE_COUNT_OFFSET = struct.calcsize("<4sHII")
+# 経過秒, RMS（省電力待機中はピーク値）, 選んだコマ, 母音, フラグ, OBSへのバッチ要求の送信時間[ms], 解析時間[ms]
+TRACE_RECORD = struct.Struct("<dfhbBfffff")
+TRACE_RECORD_DTYPE = np.dtype([("t", "<f8"), ("rms", "<f4"), ("index", "<i2"), ("vowel", "i1"), ("flags", "u1"), ("request_ms", "<f4"),
+                               ("wait_ms", "<f4"), ("send_ms", "<f4"), ("rtt_ms", "<f4"), ("analysis_ms", "<f4")])
+TRACE_FLAG_SHOWN = 1 # コマを切り替えてOBSに要求を送った
+TRACE_FLAG_IDLE = 2 # 省電力待機中のチャンク（コマの選択はしていない）
+TRACE_FLAG_CONFIG = 4 # このチャンクの直前に設定が差し替えられた
+TRACE_FLAG_SENT = 8 # 前のチャンクからこのチャンクまでに、メインのOBSへのバッチ要求を送り終えた（wait_ms, send_ms が有効）
+# 再生に必要な設定項目（OBSの接続情報などは記録しない）
+TRACE_CONFIG_KEYS = ("threshold_min", "threshold_max", "selection_mode", "vowel_table", "mapping_curve", "mapping_points", "hysteresis", "idle_after", "render_mode", "image_range")
+
+class TraceRecorder:
+    """チャンクごとの音量・選んだコマ・OBSへの要求時間を、大きさが一定のメモリマップ上のリングファイルに記録する
+
+    request_ms は送信スレッドに預けるまでの時間で、OBSとのやり取りの時間は送信スレッド（メインのOBS）が
+    最後に送り終えたバッチ要求の待ち時間・送信時間と、最後に測った往復時間を記録する。
+
+    オーディオスレッドからのみ使う。設定の履歴（差し替えられたチャンク番号と内容）はレコードの後ろにJSONで置き、
+    差し替えのたびに長さに合わせて書き直す（画像が多くても切り詰めたり古い設定を捨てたりしない）。
+    画像番号のリストは "1-2000" 形式の文字列にして、差し替えのたびに書き直す量を小さくする。
+    """
+    def __init__(self, path, capacity=TRACE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+        self.start_time = time.time()
+        self.configs = []
+        self.traced_batch = None # 最後に記録したバッチ要求（同じバッチを2回数えない）
+        # メモリマップはヘッダーとレコードだけにし、後ろの設定のJSONは普通のファイル書き込みで伸び縮みさせる
+        self.json_offset = TRACE_HEADER_SIZE + capacity * TRACE_RECORD.size
+        self.file = open(path, "w+b")
+        self.file.truncate(self.json_offset)
+        self.map = mmap.mmap(self.file.fileno(), self.json_offset)
+
+    def add_config(self, config, ordinals):
+        """設定が差し替えられたことを記録する（次に記録するチャンクから有効）"""
+        values = {key: getattr(config, key) for key in TRACE_CONFIG_KEYS}
+        values["vowel_table"] = {key: format_frame_list(frames) for key, frames in values["vowel_table"].items()}
+        self.configs.append({
+            "seq": self.count,
+            "config": values,
+            "ordinals": format_frame_list(ordinals),
+        })
+        self._write_header()
+
+    def _write_header(self):
+        payload = json.dumps({"configs": self.configs}, ensure_ascii=False).encode("utf-8")
+        # JSONを書き終えてから長さをヘッダーに入れる（途中で止まっても読める方の長さが残る）
+        self.file.seek(self.json_offset)
+        self.file.write(payload)
+        self.file.truncate()
+        self.file.flush()
+        TRACE_HEADER.pack_into(self.map, 0, TRACE_MAGIC, TRACE_VERSION, TRACE_RECORD.size, self.capacity, self.count, self.start_time, len(payload))
+
+    def record(self, now, rms, index, vowel, flags, request_ms=0.0, analysis_ms=0.0, dispatcher=None):
+        wait_ms = send_ms = rtt_ms = 0.0
+        if dispatcher is not None:
+            batch = dispatcher.last_batch
+            if batch is not None and batch is not self.traced_batch:
+                self.traced_batch = batch
+                wait_ms, send_ms = batch
+                flags |= TRACE_FLAG_SENT
+            rtt_ms = dispatcher.rtt_ms or 0.0
+        offset = TRACE_HEADER_SIZE + (self.count % self.capacity) * TRACE_RECORD.size
+        TRACE_RECORD.pack_into(self.map, offset, now - self.start_time, rms, index, vowel, flags, request_ms, wait_ms, send_ms, rtt_ms, analysis_ms)
+        self.count += 1
+        struct.pack_into("<Q", self.map, TRACE_COUNT_OFFSET, self.count)
+
+    def close(self):
+        self._write_header()
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+def open_trace_recorder():
+    """traces フォルダに新しいトレースファイルを作る（古いファイルは TRACE_KEEP_FILES 個まで残す）"""
+    os.makedirs(TRACE_FOLDER, exist_ok=True)
+    old_files = sorted(f for f in os.listdir(TRACE_FOLDER) if f.endswith(TRACE_SUFFIX))
+    for file_name in old_files[:max(0, len(old_files) - (TRACE_KEEP_FILES - 1))]:
+        try:
+            os.remove(os.path.join(TRACE_FOLDER, file_name))
+        except OSError as e:
+            log.warning(f"⚠ 古いトレースファイルを削除できませんでした: {e}")
+    path = os.path.join(TRACE_FOLDER, time.strftime("trace_%Y%m%d_%H%M%S") + TRACE_SUFFIX)
+    return TraceRecorder(path)
+
+def read_trace(path):
+    """トレースファイルを読み込み、(情報の辞書, 古い順に並べたレコードの配列) を返す"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < TRACE_HEADER_SIZE:
+        raise ValueError(f"トレースファイルではありません: {path}")
+    magic, version, record_size, capacity, count, start_time, json_length = TRACE_HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != TRACE_RECORD.size:
+        raise ValueError(f"対応していない形式のトレースファイルです: {path}")
+    json_offset = TRACE_HEADER_SIZE + capacity * record_size
+    if len(data) < json_offset + json_length:
+        raise ValueError(f"トレースファイルが途中で切れています: {path}")
+    info = json.loads(data[json_offset:json_offset + json_length].decode("utf-8"))
+    for entry in info["configs"]:
+        entry["ordinals"] = parse_frame_list(entry["ordinals"])
+        entry["config"]["vowel_table"] = {key: parse_frame_list(frames) for key, frames in entry["config"]["vowel_table"].items()}
+    records = np.frombuffer(data, dtype=TRACE_RECORD_DTYPE, count=capacity, offset=TRACE_HEADER_SIZE)
+    if count > capacity:
+        split = count % capacity
+        records = np.concatenate((records[split:], records[:split]))
+    else:
+        records = records[:count]
+    info.update(start_time=start_time, count=count, first_seq=max(0, count - capacity))
+    return info, records
+
+def open_input_stream(p, config):
+    """設定のマイクを (名前, ホストAPI) で探して開く（見つからない・開けない場合は例外）"""
+    index = find_input_device(p, config.mic_device)
+    if index is None:
+        raise OSError(f"マイクデバイス '{config.mic_device[0]}' が見つかりません")
+    return p.open(format=FORMAT,
+                  channels=config.channel_count(),
+                  rate=RATE,
+                  input_device_index=index,
+                  input=True,
+                  frames_per_buffer=CHUNK)
+
+def close_input_stream(stream):
+    """マイクが抜かれた後のストリームは停止・クローズでも例外になることがあるので無視する"""
+    try:
+        if stream.is_active():
+            stream.stop_stream()
+        stream.close()
+    except OSError:
+        pass
 
 # オーディオとOBSを操作する関数（別スレッドで実行）
 def audio_loop(app_instance):
-    global obs_client, run_audio_thread, current_scene_name, current_group_name, current_image_ids, current_threshold_min, current_threshold_max, audio_data_queue, selected_mic_index
+    global obs_targets, run_audio_thread
+
+    log.info("🎧 オーディオスレッド開始")
+    watchdog.watch("capture", STALL_THRESHOLDS["capture"])
 
-    print("🎧 オーディオスレッド開始")
+    def close_mouths():
+        """口パクしているすべてのグループを口閉じの画像にして送る"""
+        for mouth_renderer, mouth_selector in [(renderer, selector)] + [(r, sel) for _, r, sel in route_outputs]:
+            if mouth_selector.prev_index != mouth_selector.closed_index:
+                mouth_renderer.show(mouth_selector.closed_index, mouth_selector.prev_index)
+                mouth_selector.prev_index = mouth_selector.closed_index
+        obs_targets.flush()
 
+    def fail(status_text):
+        ui_bus.call("on_engine_error", app_instance.on_engine_error)
+        ui_bus.configure("status_label", text=status_text, text_color="red")
+
+    p = pyaudio.PyAudio()
+    stream = None
+    config = None
+    renderer = None
+    stream_channels = 0
+    analyzer = None
+    selector = None
+    route_outputs = None # チャンネル振り分け先ごとの (ルート, 描画方式, コマの選択)
+    timer_layers = None
+    timer_wheel = None
+    rng = random.Random()
+    recorder = None
+    start_requested_at = None # 開始が押された時刻（最初のコマを送るまで）
+    warm_start = False # その開始が、すでに動いていたループ（待機中・動作中）からか
+    standby_raw = None # 待機中に読んだが、開始が押されたので次の周回で使うチャンク
+    devices_refreshed = time.perf_counter() # 待機中に最後に PyAudio を開き直した時刻
+    vowel_classifier = VowelClassifier() # 話者の倍率の推定は、設定を差し替えても引き継ぐ
     try:
-        obs_client = AsyncOBS(app_instance.obs_host_entry.get(), int(app_instance.obs_port_entry.get()), app_instance.obs_password_entry.get())
-        if not obs_client.connect():
-            app_instance.after(0, app_instance.on_stop)
-            app_instance.after(0, lambda: app_instance.status_label.configure(text="OBS接続エラー", text_color="red"))
-            return
+        last_calibration_time = time.time()
+        last_target_report = 0.0
+        trace_flags = 0
 
-        if not current_image_ids:
-            print("❌ 画像ソースのIDが取得できていません。")
-            obs_client.disconnect()
-            app_instance.after(0, app_instance.on_stop)
-            app_instance.after(0, lambda: app_instance.status_label.configure(text="画像ソースIDエラー", text_color="red"))
-            return
-            
-        start_index = int(app_instance.image_range_start_optionmenu.get())
-        end_index = int(app_instance.image_range_end_optionmenu.get())
-        
-        # 選択された範囲の画像のみを抽出
-        image_names = sorted(current_image_ids.keys(), key=lambda x: int(re.sub(r'[^0-9]', '', x)))
-        selected_image_names = [name for name in image_names if start_index <= int(re.sub(r'[^0-9]', '', name)) <= end_index]
-
-        if not selected_image_names:
-            print("❌ 選択された範囲に画像ソースが見つかりませんでした。")
-            obs_client.disconnect()
-            app_instance.after(0, app_instance.on_stop)
-            app_instance.after(0, lambda: app_instance.status_label.configure(text="選択範囲に画像なし", text_color="red"))
-            return
-            
-        prev_index = -1
-        last_change_time = 0
+        idle = False
+        idle_chunk_count = 0
+        quiet_since = time.time()
+        active_cost = idle_cost = 0.0 # 1チャンクあたりの解析時間（指数移動平均, 秒）
+        engine_metrics.update(idle=False, idle_seconds=0.0, cpu_saved_ms=0.0, mic_waiting=False, mic_recoveries=0, mic_recovery_seconds=0.0)
 
-        # すべての画像を非表示にする
-        for image_name in selected_image_names:
-            item_id = current_image_ids.get(image_name)
-            if item_id is not None:
-                obs_client.set_visible(current_group_name, item_id, False)
+        while audio_loop_wanted():
+            watchdog.beat("capture")
+            new_config = current_engine_config
+            if new_config is not config:
+                # 設定が差し替えられたら、変わった部分だけを用意し直す（初回はすべて）
+                log.debug("🔧 エンジンの設定を差し替えます")
+                if new_config.changed(config, "obs_settings", "mirror_obs"):
+                    if obs_targets:
+                        obs_targets.disconnect()
+                        obs_targets = None
+                    try:
+                        obs_targets = ObsTargets(new_config)
+                    except ConnectionError:
+                        fail("OBS接続エラー")
+                        return
+                    renderer = None
+                    route_outputs = None
+                    timer_layers = None
+                elif new_config.changed(config, "live_only"):
+                    obs_targets.set_live_only(new_config.live_only)
 
-        p = pyaudio.PyAudio()
-        try:
-            stream = p.open(format=FORMAT,
-                            channels=CHANNELS,
-                            rate=RATE,
-                            input_device_index=selected_mic_index,
-                            input=True,
-                            frames_per_buffer=CHUNK)
-        except Exception as e:
-            print(f"❌ PyAudioデバイスのオープンに失敗しました: {e}")
-            obs_client.disconnect()
-            app_instance.after(0, app_instance.on_stop)
-            app_instance.after(0, lambda: app_instance.status_label.configure(text="マイクエラー", text_color="red"))
-            return
+                if renderer is None or new_config.changed(config, *RENDERER_CONFIG_KEYS):
+                    try:
+                        renderer = obs_targets.build_renderer(new_config)
+                    except ValueError as e:
+                        log.error(f"❌ {e}")
+                        fail("スプライトシートエラー" if new_config.render_mode == "spritesheet" else "画像ソースエラー")
+                        return
+                    renderer.reset()
+                    selector = FrameSelector(new_config, renderer.ordinals)
+                else:
+                    selector.reconfigure(new_config)
 
-        print("🎤 マイク音量取得中…")
-        
-        while run_audio_thread:
-            data = np.frombuffer(stream.read(CHUNK, exception_on_overflow=False), dtype=np.int16)
-            rms = np.sqrt(np.mean(np.square(data, dtype=np.float64))) if data.size > 0 else 0.0
+                if route_outputs is None or new_config.changed(config, "channel_routes"):
+                    route_outputs = []
+                    for route in new_config.channel_routes:
+                        route_config = new_config.group_config(route)
+                        try:
+                            route_renderer = obs_targets.build_renderer(route_config)
+                        except ValueError as e:
+                            log.error(f"❌ チャンネル{route['channel']}（{route['group_name']}）: {e}")
+                            fail("チャンネル振り分けエラー")
+                            return
+                        route_renderer.reset()
+                        route_outputs.append((route, route_renderer, FrameSelector(route_config, route_renderer.ordinals)))
+                else:
+                    for route, _, route_selector in route_outputs:
+                        route_selector.reconfigure(new_config.group_config(route))
+
+                if timer_layers is None or new_config.changed(config, "animation_layers"):
+                    # まばたき・待機モーションは、タイマーホイールから呼ばれたときだけコマを切り替える
+                    timer_wheel = TimerWheel(CHUNK / RATE)
+                    timer_layers = []
+                    for layer in new_config.animation_layers:
+                        try:
+                            layer_renderer = obs_targets.build_renderer(new_config.group_config(layer))
+                        except ValueError as e:
+                            log.error(f"❌ {LAYER_KIND_LABELS[layer['kind']]}レイヤー（{layer['group_name']}）: {e}")
+                            fail("アニメーションレイヤーエラー")
+                            return
+                        layer_renderer.reset()
+                        timer_layer = TIMER_LAYER_CLASSES[layer["kind"]](layer_renderer, layer["interval"], rng)
+                        timer_layer.start(timer_wheel)
+                        timer_layers.append(timer_layer)
+
+                # 描画方式の初期化（全画像の非表示など）は、口パクより低い優先度で少しずつ送る
+                obs_targets.flush("repair")
+
+                if stream is None or new_config.changed(config, "mic_device") or new_config.channel_count() != stream_channels:
+                    if stream is not None:
+                        close_input_stream(stream)
+                        stream = None
+                    if p is None:
+                        p = pyaudio.PyAudio()
+                    stream_channels = new_config.channel_count()
+                    analyzer = None
+                    try:
+                        stream = open_input_stream(p, new_config)
+                    except Exception as e:
+                        log.error(f"❌ PyAudioデバイスのオープンに失敗しました: {e}")
+                        fail("マイクエラー")
+                        return
+                    log.info("🎤 マイク音量取得中…")
+
+                if analyzer is None or new_config.changed(config, "level_detector", "attack_ms", "release_ms"):
+                    analyzer = make_level_analyzer(new_config, stream_channels)
+
+                if new_config.trace_enabled and recorder is None:
+                    try:
+                        recorder = open_trace_recorder()
+                        log.info(f"📝 トレースの記録を開始しました: {recorder.path}")
+                    except OSError as e:
+                        log.warning(f"⚠ トレースファイルを作成できませんでした: {e}")
+                elif not new_config.trace_enabled and recorder is not None:
+                    recorder.close()
+                    log.info(f"📝 トレースの記録を終了しました: {recorder.path}")
+                    recorder = None
+                if recorder is not None:
+                    recorder.add_config(new_config, renderer.ordinals)
+                    trace_flags = TRACE_FLAG_CONFIG
+                if new_config.profile_enabled and watchdog.profile is None:
+                    watchdog.start_profile()
+                    log.info("📊 プロファイルの記録を開始しました")
+                elif not new_config.profile_enabled and watchdog.profile is not None:
+                    log.info(f"📊 プロファイルを保存しました: {watchdog.stop_profile()}")
+
+                if not new_config.dispatch and (config is None or config.dispatch):
+                    # 停止: マイクとOBSとの接続はそのままで、口を閉じてから送るのをやめる
+                    close_mouths()
+                    log.info("⏸ 待機中です（マイクとOBSとの接続を用意したまま停止しています）")
+                elif new_config.dispatch and new_config.changed(config, "dispatch", "requested_at"):
+                    start_requested_at = new_config.requested_at or None
+                    warm_start = config is not None
+
+                config = new_config
+                idle = False
+                engine_metrics["idle"] = False
+                quiet_since = time.time()
+
+            try:
+                if standby_raw is not None:
+                    raw, standby_raw = standby_raw, None
+                else:
+                    if stream is None:
+                        stream = open_input_stream(p, config) # 待機中に開き直した（マイクが無ければ抜かれたときと同じ扱い）
+                    raw = stream.read(CHUNK, exception_on_overflow=False)
+            except OSError as e:
+                # マイクが抜かれた: OBSとの接続はそのままで、同じデバイスが戻るまで開き直しを試みる
+                log.warning(f"⚠ マイクからの読み取りに失敗しました: {e}")
+                lost_time = time.perf_counter()
+                engine_metrics["mic_waiting"] = True
+                level_ring.publish(0.0)
+                ui_bus.configure("status_label", text="⚠ マイクが切断されました。再接続を待っています…", text_color="orange")
+                close_mouths()
+
+                # PortAudio のデバイス一覧は、すべての PyAudio を終了しないと更新されない
+                if stream is not None:
+                    close_input_stream(stream)
+                stream = None
+                p.terminate()
+                p = None
+                while audio_loop_wanted() and current_engine_config is config:
+                    time.sleep(MIC_RETRY_INTERVAL)
+                    watchdog.beat("capture")
+                    p = pyaudio.PyAudio()
+                    try:
+                        stream = open_input_stream(p, config)
+                        break
+                    except Exception:
+                        p.terminate()
+                        p = None
+                engine_metrics["mic_waiting"] = False
+                if stream is None:
+                    continue # 停止した・設定が差し替えられた（次の周回で開き直す）
+                recovery_seconds = time.perf_counter() - lost_time
+                engine_metrics["mic_recoveries"] += 1
+                engine_metrics["mic_recovery_seconds"] = recovery_seconds
+                level_ring.publish(0.0)
+                log.info(f"🎤 マイクを開き直しました（復旧まで {recovery_seconds:.2f}秒）")
+                ui_bus.configure("status_label", text=f"▶ 音量監視中...（マイク再接続 {recovery_seconds:.1f}秒）", text_color="blue")
+                continue
+
+            # チャンネルごとの列はインターリーブされたバッファのビュー（コピーしない）
+            frames = split_channels(np.frombuffer(raw, dtype=np.int16), stream_channels)
+            data = frames[:, config.input_channel - 1]
+            analysis_start = time.perf_counter()
+            if analysis_start - last_target_report >= OBS_TARGET_METRICS_INTERVAL:
+                last_target_report = analysis_start
+                ui_bus.call("obs_targets", app_instance.on_obs_target_metrics, obs_targets.metrics())
+
+            if not config.dispatch:
+                if current_engine_config is not config and current_engine_config.dispatch:
+                    # 読み取り中に開始が押された: このチャンクを開始後の最初のチャンクとして使う（もう1チャンク待たない）
+                    standby_raw = raw
+                    continue
+                # 待機中: 音量モニターと閾値の調整には使えるよう、音量だけを測る
+                rms = float(analyzer.measure(frames)[config.input_channel - 1])
+                level_ring.publish(rms)
+                level_calibrator.add(rms)
+                if time.perf_counter() - devices_refreshed >= STANDBY_DEVICE_REFRESH:
+                    # PyAudio を持ったままだと GUI のデバイス確認に新しいマイクが出ないので、開き直す（マイクは次の周回で開く）
+                    devices_refreshed = time.perf_counter()
+                    close_input_stream(stream)
+                    stream = None
+                    p.terminate()
+                    p = pyaudio.PyAudio()
+                continue
+
+            if idle:
+                # 省電力待機中: 全チャンネルのピーク値だけで無音判定する（ピーク ≧ RMS なので、ピークが下限未満ならRMSも下限未満）
+                peak = max(int(frames.max()), -int(frames.min())) if frames.size > 0 else 0
+                if peak < config.threshold_min:
+                    idle_chunk_count += 1
+                    if idle_chunk_count % IDLE_GUI_INTERVAL_CHUNKS == 0:
+                        # 音量モニターとキャリブレーションには間引いたチャンクの実測値だけを渡す
+                        rms = float(analyzer.measure(frames)[config.input_channel - 1])
+                        level_ring.publish(rms)
+                        level_calibrator.add(rms)
+                    cost = time.perf_counter() - analysis_start
+                    idle_cost += (cost - idle_cost) * 0.01
+                    engine_metrics["idle_seconds"] += CHUNK / RATE
+                    engine_metrics["cpu_saved_ms"] += max(0.0, active_cost - cost) * 1000
+                    for timer_layer in timer_wheel.advance(time.time()):
+                        timer_layer.fire(timer_wheel)
+                    obs_targets.flush()
+                    if recorder is not None:
+                        recorder.record(time.time(), peak, selector.prev_index, -1, TRACE_FLAG_IDLE | trace_flags, 0.0, cost * 1000, obs_targets.dispatchers[0])
+                        trace_flags = 0
+                    continue
+                # 音が戻ったら、このチャンクから通常処理に戻る
+                idle = False
+                engine_metrics["idle"] = False
+                quiet_since = time.time()
+
+            levels = analyzer.measure(frames)
+            rms = float(levels[config.input_channel - 1])
             
-            audio_data_queue.put(rms)
+            level_ring.publish(rms)
+            level_calibrator.add(rms)
 
-            if rms < current_threshold_min:
-                # 音量閾値以下の場合、一番低い番号の画像を表示する
-                index = 0
-            else:
-                volume = (rms - current_threshold_min) / (current_threshold_max - current_threshold_min)
-                index = get_image_index(volume, len(selected_image_names))
+            if config.auto_calibration and time.time() - last_calibration_time >= CALIBRATION_INTERVAL:
+                last_calibration_time = time.time()
+                thresholds = level_calibrator.estimate()
+                if thresholds is not None and thresholds != (config.threshold_min, config.threshold_max):
+                    # 次のチャンクで新しい設定として読み込まれ、コマの境界も計算し直される
+                    update_engine_config(threshold_min=thresholds[0], threshold_max=thresholds[1])
+                    ui_bus.call("apply_calibrated_thresholds", app_instance.apply_calibrated_thresholds, *thresholds)
+
+            vowel = vowel_classifier.classify(data) if selector.needs_vowel(rms) else None
+            index = selector.choose(rms, vowel)
             
             current_time = time.time()
+            analysis_cost = time.perf_counter() - analysis_start
+            active_cost += (analysis_cost - active_cost) * 0.01
 
-            if index != prev_index and (current_time - last_change_time) >= COOLING_TIME:
-                if prev_index != -1 and prev_index is not None:
-                    item_id_to_hide = current_image_ids.get(selected_image_names[prev_index])
-                    if item_id_to_hide is not None:
-                        obs_client.set_visible(current_group_name, item_id_to_hide, False)
-                
-                item_id_to_show = current_image_ids.get(selected_image_names[index])
-                if item_id_to_show is not None:
-                    obs_client.set_visible(current_group_name, item_id_to_show, True)
-                
-                prev_index = index
-                last_change_time = current_time
+            prev_index = selector.prev_index
+            if selector.commit(index, current_time):
+                renderer.show(index, prev_index)
+                trace_flags |= TRACE_FLAG_SHOWN
+
+            # 他のチャンネルは振り分け先のグループに音量で口パクさせる
+            route_active = False
+            for route, route_renderer, route_selector in route_outputs:
+                route_level = float(levels[route["channel"] - 1])
+                route_index = route_selector.choose(route_level)
+                route_prev_index = route_selector.prev_index
+                if route_selector.commit(route_index, current_time):
+                    route_renderer.show(route_index, route_prev_index)
+                route_active = route_active or route_level >= config.threshold_min or route_selector.prev_index != route_selector.closed_index
+
+            for timer_layer in timer_wheel.advance(current_time):
+                timer_layer.fire(timer_wheel)
+
+            # すべてのレイヤーの変更を1回のバッチ要求で送る
+            request_ms = 0.0
+            if obs_targets.has_requests():
+                request_start = time.perf_counter()
+                obs_targets.flush()
+                request_ms = (time.perf_counter() - request_start) * 1000
+            if recorder is not None:
+                recorder.record(current_time, rms, index, VOWEL_KEYS.index(vowel) if vowel else -1, trace_flags, request_ms, analysis_cost * 1000, obs_targets.dispatchers[0])
+            trace_flags = 0
+            if start_requested_at is not None:
+                latency_ms = (time.time() - start_requested_at) * 1000
+                start_requested_at = None
+                engine_metrics.update(start_latency_ms=latency_ms, warm_start=warm_start)
+                origin = "待機から" if warm_start else "起動から"
+                log.info(f"▶ 開始から最初のコマまで {latency_ms:.0f}ms（{origin}）")
+                ui_bus.configure("status_label", text=f"▶ 音量監視中...（開始まで {latency_ms:.0f}ms・{origin}）", text_color="blue")
+
+            # 全員が口閉じの画像を表示したまま無音が続いたら省電力待機に入る
+            if rms >= config.threshold_min or selector.prev_index != selector.closed_index or route_active:
+                quiet_since = current_time
+            elif config.idle_after > 0 and current_time - quiet_since >= config.idle_after:
+                idle = True
+                engine_metrics["idle"] = True
             
     except Exception as e:
-        print(f"❌ オーディオスレッドで予期せぬエラーが発生しました: {e}")
-        app_instance.after(0, app_instance.on_stop)
-        app_instance.after(0, lambda: app_instance.show_error(f"オーディオ処理中にエラーが発生しました: {e}"))
+        log.error(f"❌ オーディオスレッドで予期せぬエラーが発生しました: {e}")
+        ui_bus.call("on_engine_error", app_instance.on_engine_error)
+        ui_bus.call("show_error", app_instance.show_error, f"オーディオ処理中にエラーが発生しました: {e}")
         
     finally:
-        if 'stream' in locals() and stream.is_active():
-            stream.stop_stream()
-            stream.close()
-        if 'p' in locals():
+        if recorder is not None:
+            recorder.close()
+            log.info(f"📝 トレースを保存しました: {recorder.path}")
+        if stream is not None:
+            close_input_stream(stream) # 停止済みのストリームも閉じる
+        if p is not None:
             p.terminate()
-        if obs_client:
-            obs_client.disconnect()
-        print("✅ オーディオループ終了")
+        if obs_targets:
+            obs_targets.disconnect()
+            obs_targets = None
+        watchdog.unwatch("capture")
+        if watchdog.profile is not None:
+            log.info(f"📊 プロファイルを保存しました: {watchdog.stop_profile()}")
+        log.info("✅ オーディオループ終了")
+
+# ====== 別プロセスでの実行 ======
+ENGINE_PROCESS_STOP_TIMEOUT = 5.0 # 停止を指示してからプロセスの終了を待つ時間（秒）
+
+class _EngineEventBus:
+    """別プロセスの audio_loop からのGUI更新要求を、GUIプロセスへ送る（UiBus と同じ呼び方）
+
+    関数は送れないので名前で送り、GUIプロセス側で App のメソッドに置き換える。
+    """
+    def __init__(self, events):
+        self.events = events
+
+    def configure(self, widget_name, **options):
+        self.events.put(("configure", widget_name, options))
+
+    def set(self, widget_name, value):
+        self.events.put(("set", widget_name, value))
+
+    def call(self, key, func, *args):
+        self.events.put(("call", key, (func, args)))
+
+class _AppMethodNames:
+    """別プロセスで audio_loop に渡す app_instance の代わり（メソッドの代わりにその名前を返す）"""
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return name
+
+def _receive_engine_commands(commands):
+    global run_audio_thread
+    while True:
+        config = commands.get()
+        if config is None:
+            run_audio_thread = False
+            return
+        # 値が同じ設定は差し替えない（作り直しや省電力待機の解除が起きないように）
+        if config.changed(current_engine_config, *EngineConfig.DEFAULTS):
+            swap_engine_config(config)
 
-def start_audio_thread(app_instance):
-    global run_audio_thread, audio_thread
-    if audio_thread is not None and audio_thread.is_alive():
+def engine_process_main(config, shm_name, commands, events):
+    """別プロセスのエントリポイント: GUIプロセスから送られる設定で audio_loop を動かす"""
+    global ui_bus, level_ring, run_audio_thread
+    shm = shared_memory.SharedMemory(name=shm_name)
+    level_ring = LevelRing(shm.buf)
+    ui_bus = _EngineEventBus(events)
+    swap_engine_config(config)
+    run_audio_thread = True
+    threading.Thread(target=_receive_engine_commands, args=(commands,), daemon=True).start()
+    # ログはGUIプロセスのリングに転送して、ファイルへの書き出しとビューアへの表示はあちらで行う
+    log.start(lambda records: events.put(("log", None, records)))
+    watchdog.start()
+    try:
+        audio_loop(_AppMethodNames())
+    finally:
+        watchdog.stop()
+        log.stop()
+        level_ring.close()
+        shm.close()
+
+class EngineProcess:
+    """キャプチャ・解析・OBSへの送信を別プロセスで動かす（GUIプロセス側の窓口）
+
+    GUIの再描画が GIL を占有しても音声の読み取りが遅れないよう、audio_loop を別のインタープリターで動かす。
+    設定はキューで送り、音量と動作状況は共有メモリ上の LevelRing でロックなしに受け取る。
+    """
+    def __init__(self, config):
+        context = multiprocessing.get_context("spawn") # Tkを動かしているプロセスはforkしない
+        self.shm = shared_memory.SharedMemory(create=True, size=LevelRing.size())
+        self.ring = LevelRing(self.shm.buf)
+        self.commands = context.Queue()
+        self.events = context.Queue()
+        self.process = context.Process(target=engine_process_main, args=(config, self.shm.name, self.commands, self.events), daemon=True)
+        self.process.start()
+
+    def send(self, config):
+        self.commands.put(config)
+
+    def forward_events(self, app):
+        """プロセスからのGUI更新要求を ui_bus に移す（GUIスレッドで呼ぶ）"""
+        exited = not self.process.is_alive() # 終了済みなら、送られた要求はすべてキューに入っている
+        while True:
+            try:
+                kind, target, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "configure":
+                ui_bus.configure(target, **payload)
+            elif kind == "set":
+                ui_bus.set(target, payload)
+            elif kind == "log":
+                log.add(payload)
+            else:
+                name, args = payload
+                ui_bus.call(target, getattr(app, name), *args)
+        if exited and self.process.exitcode != 0:
+            log.error(f"❌ オーディオ処理のプロセスが異常終了しました（終了コード {self.process.exitcode}）")
+            ui_bus.call("on_engine_error", app.on_engine_error)
+            ui_bus.configure("status_label", text="オーディオ処理のプロセスが異常終了しました", text_color="red")
+
+    def stop(self):
+        self.commands.put(None)
+        # 送られてくる要求を読み捨てながら待つ（キューが詰まったままだとプロセスが終了できない）
+        # ログだけは最後まで受け取って残す
+        deadline = time.time() + ENGINE_PROCESS_STOP_TIMEOUT
+        exited = False
+        while not exited and time.time() < deadline:
+            exited = not self.process.is_alive()
+            self.process.join(0.1)
+            try:
+                while True:
+                    kind, _, payload = self.events.get_nowait()
+                    if kind == "log":
+                        log.add(payload)
+            except queue.Empty:
+                pass
+        if self.process.is_alive():
+            log.warning("⚠ オーディオ処理のプロセスが応答しないため強制終了します")
+            self.process.terminate()
+            self.process.join()
+        self.ring.close()
+        self.shm.close()
+        self.shm.unlink()
+
+def start_audio_thread(app_instance, isolated=False):
+    """オーディオループを開始する（isolated=True なら別プロセスで動かす）"""
+    global run_audio_thread, audio_thread, engine_process, level_ring
+    if engine_process is not None or (audio_thread is not None and audio_thread.is_alive()):
         stop_audio_thread()
     
     run_audio_thread = True
+    if isolated:
+        engine_process = EngineProcess(current_engine_config)
+        level_ring = engine_process.ring
+        log.info("✅ オーディオ処理のプロセスを開始しました。")
+        return
     audio_thread = threading.Thread(target=audio_loop, args=(app_instance,))
     audio_thread.start()
-    print("✅ 新しいオーディオスレッドを開始しました。")
+    log.info("✅ 新しいオーディオスレッドを開始しました。")
 
 def stop_audio_thread():
-    global run_audio_thread, audio_thread
+    global run_audio_thread, audio_standby, audio_thread, engine_process, level_ring
+    audio_standby = False
+    if engine_process is not None:
+        run_audio_thread = False
+        engine_process.stop()
+        engine_process = None
+        level_ring = LevelRing(bytearray(LevelRing.size()))
+        log.info("✅ オーディオ処理のプロセスを停止しました。")
     if audio_thread and audio_thread.is_alive():
         run_audio_thread = False
         audio_thread.join()
-        print("✅ オーディオスレッドを停止しました。")
+        log.info("✅ オーディオスレッドを停止しました。")
+
+def audio_loop_wanted():
+    """オーディオループを続けるか（動作中か、停止して待機しているとき）"""
+    return run_audio_thread or audio_standby
+
+def audio_engine_alive(isolated):
+    """指定した方式（スレッド／別プロセス）のオーディオループが、動作中か待機中で動いているか"""
+    if not audio_loop_wanted():
+        return False
+    if isolated:
+        return engine_process is not None and engine_process.process.is_alive()
+    return engine_process is None and audio_thread is not None and audio_thread.is_alive()
+
+def resume_audio_engine():
+    """待機中のオーディオループに、OBSへの送信を再開させる（設定は呼び出し側で差し替え済み）"""
+    global run_audio_thread, audio_standby
+    run_audio_thread = True
+    audio_standby = False
+
+def enter_audio_standby():
+    """オーディオループを止めずに、マイクとOBSとの接続を用意したまま送信だけを止める"""
+    global run_audio_thread, audio_standby
+    audio_standby = True
+    run_audio_thread = False
+    update_engine_config(dispatch=False)
+
+# ====== ローカル操作API（HTTP） ======
+CONTROL_HOST = "127.0.0.1" # 同じPCからだけ受け付ける
+DEFAULT_CONTROL_PORT = 50080
+CONTROL_ALLOWED_HOSTS = ("127.0.0.1", "localhost")
+CONTROL_GUI_TIMEOUT = 5.0 # GUIスレッドでの操作を待つ最大時間（秒）
+CONTROL_STREAM_INTERVAL = 0.1 # 状態ストリームを送る間隔（秒）
+CONTROL_MAX_BODY = 4096 # 受け付ける要求本文の最大サイズ（バイト）
+
+class _ControlRequestHandler(BaseHTTPRequestHandler):
+    """操作APIの要求を1つ処理する（要求ごとにサーバーのスレッドで呼ばれる）"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # 要求ごとのアクセスログは出さない
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _host_allowed(self):
+        # ブラウザ経由の別サイトからの要求（DNSリバインディング）を受け付けない
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        return host in CONTROL_ALLOWED_HOSTS
+
+    def do_GET(self):
+        control = self.server.control
+        if not self._host_allowed():
+            self._reply(403, {"ok": False, "error": "許可されていないホスト名です"})
+        elif self.path == "/status":
+            self._reply(200, {"ok": True, **control.status})
+        elif self.path == "/status/stream":
+            self._stream_status(control)
+        else:
+            self._reply(404, {"ok": False, "error": f"不明なパスです: {self.path}"})
+
+    def do_POST(self):
+        control = self.server.control
+        if not self._host_allowed():
+            self._reply(403, {"ok": False, "error": "許可されていないホスト名です"})
+            return
+        # application/json 以外を拒否すると、ブラウザは別サイトからの要求の前に確認を挟むので勝手に操作されない
+        if not (self.headers.get("Content-Type") or "").startswith("application/json"):
+            self._reply(415, {"ok": False, "error": "Content-Type: application/json で送ってください"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > CONTROL_MAX_BODY:
+                raise ValueError("要求本文が大きすぎます")
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("要求本文はJSONオブジェクトで送ってください")
+        except ValueError as e:
+            self._reply(400, {"ok": False, "error": f"要求本文を読み取れませんでした: {e}"})
+            return
+        t0 = time.perf_counter()
+        status, reply = control.handle_command(self.path, body)
+        reply["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        self._reply(status, reply)
+
+    def _stream_status(self, control):
+        """状態を Server-Sent Events で一定間隔ごとに送り続ける（接続が切れるかサーバーを止めるまで）"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while not control.stopping.is_set():
+                self.wfile.write(f"data: {json.dumps(control.status, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                control.stopping.wait(CONTROL_STREAM_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class ControlServer:
+    """Stream Deck やスクリプトからプリセット・閾値・開始/停止を操作するためのHTTPサーバー
+
+    ループバック（127.0.0.1）でだけ待ち受ける。閾値の変更は要求を受けたスレッドから
+    そのまま動作中の設定を差し替えるので、数ミリ秒で反映される。画面の内容から設定を作る操作
+    （プリセットの適用・開始・停止）は ui_bus 経由でGUIスレッドに渡し、その結果を待って応答する。
+    状態は App が一定間隔ごとに status に入れ替えた辞書を返す（GUIのウィジェットには触れない）。
+    """
+    def __init__(self, app, port=DEFAULT_CONTROL_PORT):
+        self.app = app
+        self.port = port
+        self.status = {}
+        self.stopping = threading.Event()
+        self.command_count = 0
+        self.command_lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """待ち受けを始める（ポートが使えない場合は OSError）"""
+        self.httpd = ThreadingHTTPServer((CONTROL_HOST, self.port), _ControlRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.control = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="control-api", daemon=True)
+        self.thread.start()
+        log.info(f"🎛 操作APIを開始しました: http://{CONTROL_HOST}:{self.port}/")
+
+    def stop(self):
+        self.stopping.set()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+            log.info("🎛 操作APIを停止しました")
+
+    def run_on_gui(self, func, *args):
+        """func をGUIスレッドで実行し、(戻り値, エラーメッセージのリスト) を返す。時間切れならNone"""
+        done = threading.Event()
+        result = {}
+
+        def run():
+            self.app.control_errors = []
+            try:
+                result["value"] = func(*args)
+                result["errors"] = self.app.control_errors
+                self.app._publish_control_status()
+            except Exception as e:
+                result["value"] = None
+                result["errors"] = [str(e)]
+            finally:
+                self.app.control_errors = None
+                done.set()
+
+        with self.command_lock:
+            self.command_count += 1
+            key = ("control", self.command_count) # 要求ごとに別のキーにして、まとめられないようにする
+        ui_bus.call(key, run)
+        if not done.wait(CONTROL_GUI_TIMEOUT):
+            return None
+        return result["value"], result["errors"]
+
+    def handle_command(self, path, body):
+        """POST の操作を実行し、(HTTPステータス, 応答の辞書) を返す"""
+        if path == "/thresholds":
+            return self._set_thresholds(body)
+        commands = {
+            "/preset": (self.app.control_apply_preset, (str(body.get("name", "")),)),
+            "/start": (self.app.control_start, ()),
+            "/stop": (self.app.control_stop, ()),
+        }
+        if path not in commands:
+            return 404, {"ok": False, "error": f"不明な操作です: {path}"}
+        func, args = commands[path]
+        outcome = self.run_on_gui(func, *args)
+        if outcome is None:
+            return 503, {"ok": False, "error": "GUIの応答がありません（ダイアログが開いていないか確認してください）"}
+        ok, errors = outcome
+        if not ok:
+            return 409, {"ok": False, "error": " / ".join(errors) or "操作できませんでした"}
+        return 200, {"ok": True, **self.status}
+
+    def _set_thresholds(self, body):
+        try:
+            threshold_min = int(body.get("min", self.status.get("threshold_min", 0)))
+            threshold_max = int(body.get("max", self.status.get("threshold_max", 0)))
+        except (TypeError, ValueError):
+            return 400, {"ok": False, "error": "閾値には数値を指定してください"}
+        if not 0 <= threshold_min < threshold_max <= MAX_RMS_VALUE:
+            return 400, {"ok": False, "error": f"閾値は 0 ≦ 下限 < 上限 ≦ {MAX_RMS_VALUE} で指定してください"}
+        # 動作中の設定をこのスレッドで差し替え、画面の表示は後からGUIスレッドで合わせる
+        update_engine_config(threshold_min=threshold_min, threshold_max=threshold_max)
+        self.status = {**self.status, "threshold_min": threshold_min, "threshold_max": threshold_max}
+        ui_bus.call("control_thresholds", self.app.control_show_thresholds, threshold_min, threshold_max)
+        return 200, {"ok": True, **self.status}
+
+
+# ====== 画像範囲の選択 ======
+IMAGE_RANGE_PREVIEW_COUNT = 10 # プレビューに並べる画像番号の数
+
+class ImageRangePicker(ctk.CTkFrame):
+    """使用画像範囲の入力欄と、見つかった画像番号の一部だけを並べたプレビュー
+
+    画像番号は昇順のリストとして持つだけで、作るウィジェットはプレビューの
+    IMAGE_RANGE_PREVIEW_COUNT 個のボタンだけなので、画像が何個あってもグループの切り替えに
+    かかる時間は変わらない。プレビューの番号は左クリックで開始、右クリックで終了に設定する。
+    """
+    def __init__(self, master, command=None, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.command = command # 範囲が変更されたときに呼ぶ関数
+        self.indices = []
+        self.offset = 0 # プレビューの先頭に表示している位置
+
+        entry_frame = ctk.CTkFrame(self, fg_color="transparent")
+        entry_frame.pack(fill="x")
+        ctk.CTkLabel(entry_frame, text="使用画像範囲:", width=100).pack(side="left", padx=(0, 5))
+        self.start_entry = ctk.CTkEntry(entry_frame, width=80)
+        self.start_entry.pack(side="left", padx=(0, 5))
+        ctk.CTkLabel(entry_frame, text="〜", width=20).pack(side="left", padx=0)
+        self.end_entry = ctk.CTkEntry(entry_frame, width=80)
+        self.end_entry.pack(side="left", padx=(5, 0))
+        for entry in (self.start_entry, self.end_entry):
+            entry.bind("<KeyRelease>", lambda event: self._on_change())
+
+        preview_frame = ctk.CTkFrame(self, fg_color="transparent")
+        preview_frame.pack(fill="x", pady=(5, 0))
+        ctk.CTkButton(preview_frame, text="◀", width=24, command=lambda: self.scroll(-IMAGE_RANGE_PREVIEW_COUNT)).pack(side="left", padx=(0, 2))
+        self.preview_buttons = []
+        for slot in range(IMAGE_RANGE_PREVIEW_COUNT):
+            button = ctk.CTkButton(preview_frame, text="", width=32, command=lambda slot=slot: self._pick(slot, self.start_entry))
+            button.bind("<Button-3>", lambda event, slot=slot: self._pick(slot, self.end_entry))
+            button.pack(side="left", padx=1)
+            self.preview_buttons.append(button)
+        ctk.CTkButton(preview_frame, text="▶", width=24, command=lambda: self.scroll(IMAGE_RANGE_PREVIEW_COUNT)).pack(side="left", padx=(2, 0))
+        self.error_label = ctk.CTkLabel(self, text="", text_color="red")
+        self.error_label.pack(fill="x")
+        self.clear()
+
+    def _contains(self, value):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            return False
+        position = bisect.bisect_left(self.indices, number)
+        return position < len(self.indices) and self.indices[position] == number
+
+    def _set_entries(self, start, end):
+        for entry, value in ((self.start_entry, start), (self.end_entry, end)):
+            entry.delete(0, ctk.END)
+            entry.insert(0, str(value))
+
+    def set_indices(self, indices, start=None, end=None):
+        """見つかった画像番号（昇順）と範囲を設定する（start, end が見つかった番号でなければ先頭と末尾）"""
+        if not indices:
+            self.clear()
+            return
+        self.indices = indices
+        start = int(start) if self._contains(start) else indices[0]
+        end = int(end) if self._contains(end) else indices[-1]
+        self._set_entries(start, end)
+        self.offset = bisect.bisect_left(indices, start)
+        self.scroll(0)
+
+    def clear(self):
+        self.indices = []
+        self.offset = 0
+        self._set_entries("-", "-")
+        self.error_label.configure(text="")
+        self._refresh()
+
+    def get(self):
+        """入力欄の (開始, 終了) の文字列（プリセットに保存する値）"""
+        return self.start_entry.get().strip(), self.end_entry.get().strip()
+
+    def get_range(self):
+        """入力された (開始, 終了) を検証して返す（不正な場合はメッセージ付きの ValueError）"""
+        start_text, end_text = self.get()
+        try:
+            start, end = int(start_text), int(end_text)
+        except ValueError:
+            raise ValueError("画像範囲が正しく選択されていません。")
+        if start > end:
+            raise ValueError("画像範囲の開始番号は終了番号より小さく設定してください。")
+        position = bisect.bisect_left(self.indices, start)
+        if position >= len(self.indices) or self.indices[position] > end:
+            raise ValueError(f"画像範囲 {start}〜{end} に見つかった画像がありません。")
+        return start, end
+
+    def scroll(self, delta):
+        self.offset = max(0, min(self.offset + delta, len(self.indices) - IMAGE_RANGE_PREVIEW_COUNT))
+        self._refresh()
+
+    def _pick(self, slot, entry):
+        position = self.offset + slot
+        if position >= len(self.indices):
+            return
+        entry.delete(0, ctk.END)
+        entry.insert(0, str(self.indices[position]))
+        self._on_change()
+
+    def _on_change(self):
+        try:
+            self.get_range()
+            self.error_label.configure(text="")
+        except ValueError as e:
+            self.error_label.configure(text=f"⚠ {e}" if self.indices else "")
+        self._refresh()
+        if self.command:
+            self.command()
+
+    def _refresh(self):
+        """プレビューに表示している範囲のボタンだけを書き換える（範囲内の番号は色を変える）"""
+        try:
+            start, end = self.get_range()
+        except ValueError:
+            start, end = 0, -1
+        for slot, button in enumerate(self.preview_buttons):
+            position = self.offset + slot
+            if position < len(self.indices):
+                number = self.indices[position]
+                button.configure(text=str(number), state="normal", fg_color="#3a7ebf" if start <= number <= end else "gray")
+            else:
+                button.configure(text="", state="disabled", fg_color="transparent")
 
 # GUIクラス
 class App(ctk.CTk):
@@ -252,6 +3229,14 @@ class App(ctk.CTk):
         
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # ログの書き出しを始める（ファイルに残すレベルは自動読み込み設定を読んだ後に反映する）
+        self.log_file = RotatingLogFile()
+        log.start(self.log_file, console_log_sink)
+        self.log_window = None
+        # GUIスレッドの心拍は音量モニターの更新ごとに送る
+        watchdog.start()
+        watchdog.watch("gui", STALL_THRESHOLDS["gui"])
+        
         if not os.path.exists(PRESET_FOLDER):
             os.makedirs(PRESET_FOLDER)
         if not os.path.exists(OBS_PRESET_FOLDER):
@@ -263,26 +3248,54 @@ class App(ctk.CTk):
         self.obs_preset_var = ctk.StringVar(value="OBS接続: なし")
         self.app_preset_var = ctk.StringVar(value="アプリ設定: なし")
         
-        self.mic_devices = get_mic_devices()
+        self.device_watcher = DeviceWatcher()
+        self.device_watcher.scan()
+        self.mic_devices = self.device_watcher.list()
         self.mic_device_names = [dev["name"] for dev in self.mic_devices]
+        self.is_scanning_devices = False
         
         self.obs_client = None
         self.is_obs_preset_valid = False
         self.is_app_preset_valid = False
-        self.is_searching = False # 検索中フラグを追加
+        self.search_job = None # 実行中の画像検索（DiscoveryJob）
+        self.search_label = ""
+        self.search_selection_loaded = False # 選択中のグループの結果を検索の途中で反映したか
         
-        # 修正部分: 検索結果をキャッシュする辞書を追加
-        self.cache_image_ids = {}
+        # 修正部分: 検索結果をキャッシュする辞書を追加（(シーン, グループ) → グループ内の全ソースの {名前: ID}）
+        self.cache_group_items = {}
+        self.naming = NamingScheme()
+        self.calibration_save_job = None # 自動調整した閾値の書き戻し予約
+        self.control_server = None # 操作API（有効なときの ControlServer）
+        self.control_errors = None # 操作APIからの操作中に出たエラー（ダイアログの代わりに応答で返す）
+        self.last_rms = 0.0
+        self.obs_target_metrics = [] # OBSごとの送信状況（オーディオ側から定期的に届く）
+        self.calibration_save_preset = None
+        self.app_presets = PresetStore(PRESET_FOLDER)
+        self.obs_presets = PresetStore(OBS_PRESET_FOLDER)
+        self.app_presets.refresh()
+        self.obs_presets.refresh()
 
         self.create_widgets()
         
         self.update_preset_list()
         self.update_obs_preset_list()
         self.update_volume_monitor()
+        self.drain_ui_bus()
+        self.after(PRESET_WATCH_INTERVAL_MS, self.watch_presets)
+        self.after(DEVICE_WATCH_INTERVAL_MS, self.watch_devices)
         
         self.auto_load_settings = self.load_auto_load_settings()
+        self.log_file.level = LOG_LEVELS.get(self.auto_load_settings.get("log_level"), LOG_LEVELS["INFO"])
         # auto_load_checkboxをauto_search_checkboxに名称変更
         self.auto_search_checkbox.select() if self.auto_load_settings.get("auto_load", False) else self.auto_search_checkbox.deselect()
+        self.engine_process_checkbox.select() if self.auto_load_settings.get("engine_process", False) else self.engine_process_checkbox.deselect()
+        self.live_only_checkbox.select() if self.auto_load_settings.get("live_only", True) else self.live_only_checkbox.deselect()
+        self.warm_standby_checkbox.select() if self.auto_load_settings.get("warm_standby", True) else self.warm_standby_checkbox.deselect()
+        self.control_port_entry.insert(0, str(self.auto_load_settings.get("control_port", DEFAULT_CONTROL_PORT)))
+        self.mirror_obs_entry.insert(0, self.auto_load_settings.get("mirror_obs_presets", ""))
+        if self.auto_load_settings.get("control_api", False):
+            self.control_api_checkbox.select()
+            self.start_control_server()
 
     def create_widgets(self):
         # 既存のテーマ設定フレーム
@@ -307,6 +3320,8 @@ class App(ctk.CTk):
             width=120  # 幅を調整して他のウィジェットと並べやすくする
         )
         help_button.pack(side="right", padx=(10, 0))
+        log_button = ctk.CTkButton(appearance_control_frame, text="ログ", command=self.show_log_viewer, width=60)
+        log_button.pack(side="right", padx=(10, 0))
 
         self.scrollable_frame = ctk.CTkScrollableFrame(self)
         self.scrollable_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -319,6 +3334,15 @@ class App(ctk.CTk):
         self.obs_port_entry = self.add_entry_with_label(obs_group_frame, "ポート:", "4455", self.clear_obs_preset_name)
         self.obs_password_entry = self.add_entry_with_label(obs_group_frame, "パスワード:", "", self.clear_obs_preset_name)
 
+        # 同じ口パクを送る他のOBS（録画用PCなど）。OBS接続プリセット名をカンマ区切りで指定する（auto_load_settings.json に保存）
+        mirror_frame = ctk.CTkFrame(obs_group_frame, fg_color="transparent")
+        mirror_frame.pack(fill="x", padx=10, pady=5)
+        ctk.CTkLabel(mirror_frame, text="同時に送るOBS:", width=100).pack(side="left", padx=(0, 5))
+        self.mirror_obs_entry = ctk.CTkEntry(mirror_frame, placeholder_text="OBS接続プリセット名（カンマ区切り）")
+        self.mirror_obs_entry.bind("<Return>", self.on_mirror_obs_change)
+        self.mirror_obs_entry.bind("<FocusOut>", self.on_mirror_obs_change)
+        self.mirror_obs_entry.pack(side="left", fill="x", expand=True)
+
         # 接続テストボタンの名称変更と自動画像検索チェックボックスの移動
         connection_button_frame = ctk.CTkFrame(obs_group_frame, fg_color="transparent")
         connection_button_frame.pack(fill="x", pady=5)
@@ -415,21 +3439,97 @@ class App(ctk.CTk):
         ctk.CTkButton(search_and_restart_frame, text="↻ 再起動", command=self.on_restart).pack(side="left", padx=(0, 5), fill="x", expand=True)
         # 既存のボタンを新しいフレームに移動
         ctk.CTkButton(search_and_restart_frame, text="OBS内画像ID網羅検索", command=self.start_find_all_sources_thread).pack(side="left", padx=(5, 0), fill="x", expand=True)
+        self.cancel_search_button = ctk.CTkButton(search_and_restart_frame, text="■ 検索中止", width=90, state="disabled", command=self.cancel_search)
+        self.cancel_search_button.pack(side="left", padx=(5, 0))
         
         self.found_images_label = ctk.CTkLabel(setting_frame, text="見つかった画像: 0個")
         self.found_images_label.pack(fill="x", pady=5)
         
-        # 画像範囲選択プルダウン
-        image_range_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
-        image_range_frame.pack(fill="x", pady=5)
-        ctk.CTkLabel(image_range_frame, text="使用画像範囲:", width=100).pack(side="left", padx=(0, 5))
-        self.image_range_start_optionmenu = ctk.CTkOptionMenu(image_range_frame, values=["-"], width=80)
-        self.image_range_start_optionmenu.bind("<Configure>", lambda event: self.clear_app_preset_status()) # 変更
-        self.image_range_start_optionmenu.pack(side="left", padx=(0, 5))
-        ctk.CTkLabel(image_range_frame, text="〜", width=20).pack(side="left", padx=0)
-        self.image_range_end_optionmenu = ctk.CTkOptionMenu(image_range_frame, values=["-"], width=80)
-        self.image_range_end_optionmenu.bind("<Configure>", lambda event: self.clear_app_preset_status()) # 変更
-        self.image_range_end_optionmenu.pack(side="left", padx=(5, 0))
+        # 画像ソース名の形式（{n} が画像番号）と、このグループで使う名前空間
+        naming_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        naming_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(naming_frame, text="画像名の形式:", width=100).pack(side="left", padx=(0, 5))
+        self.name_pattern_entry = ctk.CTkEntry(naming_frame)
+        self.name_pattern_entry.insert(0, DEFAULT_NAME_PATTERN)
+        self.name_pattern_entry.bind("<KeyRelease>", self.on_naming_change)
+        self.name_pattern_entry.pack(side="left", fill="x", expand=True)
+        ctk.CTkLabel(naming_frame, text="名前空間:").pack(side="left", padx=(5, 2))
+        self.name_namespace_entry = ctk.CTkEntry(naming_frame, width=60, placeholder_text="なし")
+        self.name_namespace_entry.bind("<KeyRelease>", self.on_naming_change)
+        self.name_namespace_entry.pack(side="left")
+
+        # 画像範囲の入力とプレビュー（画像が1000個あってもプレビューのボタンは一定数）
+        self.image_range_picker = ImageRangePicker(setting_frame, command=self.clear_app_preset_status)
+        self.image_range_picker.pack(fill="x", pady=5)
+
+        # 描画方式（番号付き画像の表示切替 / スプライトシートの切り抜き）
+        render_mode_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        render_mode_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(render_mode_frame, text="描画方式:", width=100).pack(side="left", padx=(0, 5))
+        self.render_mode_optionmenu = ctk.CTkOptionMenu(render_mode_frame, values=list(RENDER_MODE_LABELS.values()), command=lambda value: self.clear_app_preset_status())
+        self.render_mode_optionmenu.pack(side="left", fill="x", expand=True)
+
+        sprite_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        sprite_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(sprite_frame, text="スプライト:", width=100).pack(side="left", padx=(0, 5))
+        self.sprite_source_entry = ctk.CTkEntry(sprite_frame, placeholder_text="画像ソース名")
+        self.sprite_source_entry.pack(side="left", fill="x", expand=True)
+        ctk.CTkLabel(sprite_frame, text="列:").pack(side="left", padx=(5, 2))
+        self.sprite_columns_entry = ctk.CTkEntry(sprite_frame, width=45, placeholder_text="自動")
+        self.sprite_columns_entry.pack(side="left")
+        ctk.CTkLabel(sprite_frame, text="コマ数:").pack(side="left", padx=(5, 2))
+        self.sprite_count_entry = ctk.CTkEntry(sprite_frame, width=45, placeholder_text="自動")
+        self.sprite_count_entry.pack(side="left")
+        for entry in (self.sprite_source_entry, self.sprite_columns_entry, self.sprite_count_entry):
+            entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+
+        # 口形選択モード（音量のみ / 母音＋音量）
+        selection_mode_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        selection_mode_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(selection_mode_frame, text="口形選択モード:", width=100).pack(side="left", padx=(0, 5))
+        self.selection_mode_optionmenu = ctk.CTkOptionMenu(selection_mode_frame, values=list(SELECTION_MODE_LABELS.values()), command=lambda value: self.clear_app_preset_status())
+        self.selection_mode_optionmenu.pack(side="left", fill="x", expand=True)
+
+        # 母音テーブル（母音ごとの画像番号を音量の小さい順に指定。空欄なら自動で均等割り当て）
+        vowel_table_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        vowel_table_frame.pack(fill="x", pady=5)
+        self.vowel_table_entries = {}
+        for i, key in enumerate(("closed",) + VOWEL_KEYS):
+            label = "閉" if key == "closed" else VOWEL_LABELS[key]
+            vowel_table_frame.grid_columnconfigure((i % 3) * 2 + 1, weight=1)
+            ctk.CTkLabel(vowel_table_frame, text=f"{label}:", width=20).grid(row=i // 3, column=(i % 3) * 2, padx=(5, 2), pady=2)
+            entry = ctk.CTkEntry(vowel_table_frame, placeholder_text="例: 2-4")
+            entry.grid(row=i // 3, column=(i % 3) * 2 + 1, sticky="ew", pady=2)
+            entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+            self.vowel_table_entries[key] = entry
+
+        # 音量の検出方式（包絡線はアタックとリリースの時定数をミリ秒で指定）
+        detector_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        detector_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(detector_frame, text="音量の検出:", width=100).pack(side="left", padx=(0, 5))
+        self.level_detector_optionmenu = ctk.CTkOptionMenu(detector_frame, values=list(LEVEL_DETECTOR_LABELS.values()), width=100, command=lambda value: self.clear_app_preset_status())
+        self.level_detector_optionmenu.pack(side="left", padx=(0, 5))
+        self.attack_ms_entry = self._add_ms_entry(detector_frame, "アタック:", DEFAULT_ATTACK_MS)
+        self.release_ms_entry = self._add_ms_entry(detector_frame, "リリース:", DEFAULT_RELEASE_MS)
+
+        # 音量→画像のマッピングカーブとヒステリシス
+        mapping_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        mapping_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(mapping_frame, text="マッピング:", width=100).pack(side="left", padx=(0, 5))
+        self.mapping_curve_optionmenu = ctk.CTkOptionMenu(mapping_frame, values=list(MAPPING_CURVE_LABELS.values()), width=100, command=lambda value: self.clear_app_preset_status())
+        self.mapping_curve_optionmenu.pack(side="left", padx=(0, 5))
+        ctk.CTkLabel(mapping_frame, text="ヒステリシス:").pack(side="left", padx=(5, 5))
+        self.hysteresis_entry = ctk.CTkEntry(mapping_frame, width=50)
+        self.hysteresis_entry.insert(0, "0")
+        self.hysteresis_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.hysteresis_entry.pack(side="left")
+
+        mapping_points_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        mapping_points_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(mapping_points_frame, text="カスタム点:", width=100).pack(side="left", padx=(0, 5))
+        self.mapping_points_entry = ctk.CTkEntry(mapping_points_frame, placeholder_text="入力:出力（0〜1） 例: 0.2:0.5, 0.6:0.9")
+        self.mapping_points_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.mapping_points_entry.pack(side="left", fill="x", expand=True)
 
         mic_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
         mic_frame.pack(fill="x", pady=5)
@@ -437,6 +3537,27 @@ class App(ctk.CTk):
         self.mic_optionmenu = ctk.CTkOptionMenu(mic_frame, values=self.mic_device_names if self.mic_device_names else ["マイクなし"], command=lambda value: self.clear_app_preset_status()) # 変更
         self.mic_optionmenu.bind("<Configure>", lambda event: self.clear_app_preset_status()) # 変更
         self.mic_optionmenu.pack(side="left", fill="x", expand=True)
+
+        # マルチチャンネルのオーディオインターフェース: 1つのデバイスの各チャンネルを別々のグループに振り分ける
+        channel_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        channel_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(channel_frame, text="チャンネル:", width=100).pack(side="left", padx=(0, 5))
+        self.mic_channel_entry = ctk.CTkEntry(channel_frame, width=40)
+        self.mic_channel_entry.insert(0, "1")
+        self.mic_channel_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.mic_channel_entry.pack(side="left")
+        ctk.CTkLabel(channel_frame, text="振り分け:").pack(side="left", padx=(5, 2))
+        self.channel_routes_entry = ctk.CTkEntry(channel_frame, placeholder_text="ch:グループ名[:開始-終了] 例: 2:まりさ, 3:れいむ:1-10")
+        self.channel_routes_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.channel_routes_entry.pack(side="left", fill="x", expand=True)
+
+        # まばたき・待機モーションなど、タイマーで動かすレイヤー（検索済みのグループを使う）
+        layers_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        layers_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(layers_frame, text="レイヤー:", width=100).pack(side="left", padx=(0, 5))
+        self.animation_layers_entry = ctk.CTkEntry(layers_frame, placeholder_text="種類:グループ名[:開始-終了][@秒] 例: まばたき:目@2-6, 待機:からだ@5-10")
+        self.animation_layers_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.animation_layers_entry.pack(side="left", fill="x", expand=True)
         
         # 音量閾値（下限）の入力欄をスライダーと数値入力のフレームに修正
         volume_min_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
@@ -516,6 +3637,50 @@ class App(ctk.CTk):
         # 修正: ボタンの状態を常に'normal'にする
         self.set_threshold_and_restart_button = ctk.CTkButton(setting_frame, text="閾値を設定し再起動", command=self.on_set_threshold_and_restart, state="normal")
         self.set_threshold_and_restart_button.pack(fill="x", pady=5, padx=10)
+
+        # 閾値の自動調整（実際の音量分布から下限・上限を推定する）
+        calibration_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        calibration_frame.pack(fill="x", pady=5, padx=10)
+        self.auto_calibration_checkbox = ctk.CTkCheckBox(calibration_frame, text="閾値を常時自動調整", command=self.on_toggle_auto_calibration)
+        self.auto_calibration_checkbox.pack(side="left", padx=(0, 5))
+        ctk.CTkButton(calibration_frame, text="今すぐ自動調整", command=self.on_calibrate_now).pack(side="left", padx=(5, 0), fill="x", expand=True)
+
+        # 無音が続いたときの省電力待機
+        idle_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        idle_frame.pack(fill="x", pady=5)
+        ctk.CTkLabel(idle_frame, text="省電力待機:", width=100).pack(side="left", padx=(0, 5))
+        self.idle_after_entry = ctk.CTkEntry(idle_frame, width=50)
+        self.idle_after_entry.insert(0, f"{DEFAULT_IDLE_AFTER:g}")
+        self.idle_after_entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        self.idle_after_entry.pack(side="left")
+        ctk.CTkLabel(idle_frame, text="秒間無音で開始（0で無効）").pack(side="left", padx=(5, 0))
+
+        # 口パクの不具合を後から再現するためのトレース記録（traces フォルダに保存）
+        self.trace_checkbox = ctk.CTkCheckBox(setting_frame, text="トレースを記録（不具合の調査用）", command=self.on_toggle_trace)
+        self.trace_checkbox.pack(anchor="w", pady=5, padx=10)
+        # 見張っているスレッドのスタックを数えて、停止したときに profiles フォルダへ保存する
+        self.profile_checkbox = ctk.CTkCheckBox(setting_frame, text="プロファイルを記録（処理の重さの調査用）", command=self.on_toggle_profile)
+        self.profile_checkbox.pack(anchor="w", pady=5, padx=10)
+
+        # GUIの操作で音声の読み取りが遅れないよう、音声処理を別プロセスで動かす（auto_load_settings.json に保存）
+        self.engine_process_checkbox = ctk.CTkCheckBox(setting_frame, text="音声処理を別プロセスで動かす（GUI操作中の音飛び対策）", command=self.on_toggle_engine_process)
+        self.engine_process_checkbox.pack(anchor="w", pady=5, padx=10)
+
+        # 番組・プレビューのシーンに出ていないグループへは表示の変更を送らない（auto_load_settings.json に保存）
+        self.live_only_checkbox = ctk.CTkCheckBox(setting_frame, text="シーンに出ているときだけOBSへ送る（配信に映っていないグループは止める）", command=self.on_toggle_live_only)
+        self.live_only_checkbox.pack(anchor="w", pady=5, padx=10)
+
+        # 停止してもマイクとOBSとの接続を閉じずに待機し、次の開始・再起動をすぐに行う（auto_load_settings.json に保存）
+        self.warm_standby_checkbox = ctk.CTkCheckBox(setting_frame, text="停止中もマイクとOBS接続を用意しておく（すぐに開始できます）", command=self.on_toggle_warm_standby)
+        self.warm_standby_checkbox.pack(anchor="w", pady=5, padx=10)
+
+        # Stream Deck やスクリプトからの操作を受け付けるローカルHTTPサーバー（auto_load_settings.json に保存）
+        control_frame = ctk.CTkFrame(setting_frame, fg_color="transparent")
+        control_frame.pack(fill="x", pady=5, padx=10)
+        self.control_api_checkbox = ctk.CTkCheckBox(control_frame, text="操作APIを有効にする　ポート:", command=self.on_toggle_control_api)
+        self.control_api_checkbox.pack(side="left")
+        self.control_port_entry = ctk.CTkEntry(control_frame, width=70)
+        self.control_port_entry.pack(side="left", padx=(5, 0))
         
         # --- 修正箇所: 音量モニターのUIを再構築 ---
         self.volume_monitor_frame = ctk.CTkFrame(self, corner_radius=10)
@@ -538,6 +3703,10 @@ class App(ctk.CTk):
         # 閾値マーカーの数値ラベルを追加
         self.min_threshold_label = ctk.CTkLabel(self.volume_monitor_frame, text="0", text_color="red")
         self.max_threshold_label = ctk.CTkLabel(self.volume_monitor_frame, text="0", text_color="green")
+
+        # 動作状況の統計（閾値の数値ラベルと重ならないよう間隔を空ける）
+        self.metrics_label = ctk.CTkLabel(self.volume_monitor_frame, text="", font=ctk.CTkFont(size=11))
+        self.metrics_label.pack(fill="x", padx=10, pady=(20, 2))
         # --- 修正箇所ここまで ---
         
         # 実行ボタンの上の適用中プリセット表示
@@ -585,7 +3754,9 @@ class App(ctk.CTk):
             
     def save_auto_load_settings(self):
         # auto_load_checkboxをauto_search_checkboxに名称変更
-        settings = {"auto_load": self.auto_search_checkbox.get()}
+        settings = {"auto_load": self.auto_search_checkbox.get(), "engine_process": self.engine_process_checkbox.get(), "live_only": self.live_only_checkbox.get(),
+                    "warm_standby": self.warm_standby_checkbox.get(), "control_api": self.control_api_checkbox.get(), "control_port": self.control_port_entry.get().strip(),
+                    "mirror_obs_presets": self.mirror_obs_entry.get().strip(), "log_level": LOG_LEVEL_NAMES[self.log_file.level]}
         with open(AUTO_LOAD_SETTINGS_FILE, "w") as f:
             json.dump(settings, f)
 
@@ -609,8 +3780,40 @@ class App(ctk.CTk):
         self.save_theme_settings()
 
     def update_preset_list(self):
-        files = [f.replace(".json", "") for f in os.listdir(PRESET_FOLDER) if f.endswith(".json")]
-        self.preset_optionmenu.configure(values=files if files else ["-"])
+        names = self.app_presets.names()
+        self.preset_optionmenu.configure(values=names if names else ["-"])
+
+    def watch_presets(self):
+        """プリセットフォルダの変更を確認し、一覧と適用中のプリセットを最新の内容にする"""
+        try:
+            changed_app = self.app_presets.refresh()
+            changed_obs = self.obs_presets.refresh()
+            if changed_app:
+                self.update_preset_list()
+            if changed_obs:
+                self.update_obs_preset_list()
+
+            # 保存済みのまま適用中のプリセットがファイルで書き換えられたら、適用し直す（未保存の変更は上書きしない）
+            applied_obs = self._get_applied_obs_preset_name()
+            if applied_obs in changed_obs and "(保存済)" in self.obs_current_preset_label.cget("text"):
+                if applied_obs in self.obs_presets.presets:
+                    log.info(f"🔄 OBS接続プリセット '{applied_obs}' の変更を反映します")
+                    self.apply_obs_preset(applied_obs)
+                else:
+                    self.clear_obs_preset_name()
+            if changed_obs and run_audio_thread:
+                self.on_mirror_obs_change()
+            applied_app = self._get_applied_app_preset_name()
+            if applied_app in changed_app and "(保存済)" in self.app_current_preset_label.cget("text"):
+                if applied_app in self.app_presets.presets:
+                    log.info(f"🔄 アプリ設定プリセット '{applied_app}' の変更を反映します")
+                    self.apply_app_preset(applied_app)
+                else:
+                    self.clear_app_preset_name()
+        except Exception as e:
+            log.warning(f"⚠ プリセットの確認に失敗しました: {e}")
+        finally:
+            self.after(PRESET_WATCH_INTERVAL_MS, self.watch_presets)
         
     def save_preset(self):
         preset_name = self.preset_name_entry.get().strip()
@@ -618,10 +3821,8 @@ class App(ctk.CTk):
             self.show_error("プリセット名には半角英数字、ハイフン、アンダースコアのみ使用可能です。")
             return
             
-        file_path = os.path.join(PRESET_FOLDER, f"{preset_name}.json")
-        
         # ファイルがすでに存在するかをチェックする
-        if os.path.exists(file_path):
+        if self.app_presets.exists(preset_name):
             # 存在する場合は上書き確認メッセージを表示
             response = messagebox.askyesno(
                 "上書き確認",
@@ -635,17 +3836,35 @@ class App(ctk.CTk):
             # 現在のGUI設定からデータを取得
             data = {
                 "mic_device": self.mic_optionmenu.get(),
+                "mic_channel": int(self.mic_channel_entry.get() or 1),
+                "channel_routes": parse_channel_routes(self.channel_routes_entry.get()),
+                "animation_layers": parse_animation_layers(self.animation_layers_entry.get()),
                 "threshold_min": self.threshold_min_slider.get(),
                 "threshold_max": self.threshold_max_slider.get(),
                 "scene_name": self.scene_name_optionmenu.get(),
                 "group_name": self.group_name_optionmenu.get(),
-                "image_range_start": self.image_range_start_optionmenu.get(),
-                "image_range_end": self.image_range_end_optionmenu.get()
+                "image_range_start": self.image_range_picker.get()[0],
+                "image_range_end": self.image_range_picker.get()[1],
+                "selection_mode": self._get_selection_mode(),
+                "vowel_table": self._get_vowel_table_from_entries(),
+                "auto_calibration": bool(self.auto_calibration_checkbox.get()),
+                "mapping_curve": self._get_mapping_curve(),
+                "mapping_points": parse_mapping_points(self.mapping_points_entry.get()),
+                "hysteresis": float(self.hysteresis_entry.get() or 0),
+                "level_detector": self._get_level_detector(),
+                "attack_ms": float(self.attack_ms_entry.get() or 0),
+                "release_ms": float(self.release_ms_entry.get() or 0),
+                "render_mode": self._get_render_mode(),
+                "sprite_source": self.sprite_source_entry.get().strip(),
+                "name_pattern": self.naming.pattern,
+                "name_namespace": self.name_namespace_entry.get().strip(),
+                "sprite_columns": int(self.sprite_columns_entry.get()) if self.sprite_columns_entry.get().strip() else None,
+                "sprite_count": int(self.sprite_count_entry.get()) if self.sprite_count_entry.get().strip() else None,
+                "idle_after": float(self.idle_after_entry.get() or 0)
             }
             
             # ファイルにデータを書き込む
-            with open(file_path, "w") as f:
-                json.dump(data, f, indent=4)
+            self.app_presets.save(preset_name, data)
             
             # UIを更新
             self.update_preset_list()
@@ -662,93 +3881,131 @@ class App(ctk.CTk):
         preset_name = self.preset_optionmenu.get()
         if preset_name == "-":
             return
-            
-        file_path = os.path.join(PRESET_FOLDER, f"{preset_name}.json")
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-                
-                # シーン名とグループ名を保持
-                scene_name_to_set = data.get("scene_name", "-")
-                group_name_to_set = data.get("group_name", "-")
+        if self.apply_app_preset(preset_name):
+            self.preset_optionmenu.set("-") # 適用後に選択欄をリセット
+            self.preset_name_entry.delete(0, ctk.END) # この行を追加
+
+    def apply_app_preset(self, preset_name):
+        """メモリ上のプリセットを画面に一度に反映する。動作中なら設定を差し替えて、止めずに切り替える"""
+        data = self.app_presets.get(preset_name)
+        if data is None:
+            self.show_error(f"アプリ設定プリセット '{preset_name}' が見つかりませんでした。")
+            return False
 
-                # シーンをまず設定し、その後の非同期処理でグループと画像範囲を設定
-                self.scene_name_optionmenu.set(scene_name_to_set)
+        try:
+            scene_name_to_set = data.get("scene_name", "-")
+            group_name_to_set = data.get("group_name", "-")
 
-                # 非同期でグループリストを更新し、完了後にグループと画像範囲を設定する
-                self.after(100, self._load_app_preset_async_helper, data)
+            # シーンとグループは検索結果のキャッシュから選択肢を作って直接設定し、
+            # OBS側のグループ一覧はバックグラウンドで取り直す
+            self.scene_name_optionmenu.set(scene_name_to_set)
+            cached_groups = [group for (scene, group), items in self.cache_group_items.items() if scene == scene_name_to_set and items]
+            self.group_name_optionmenu.configure(values=["-"] + cached_groups)
+            self.group_name_optionmenu.set(group_name_to_set)
 
-                self.mic_optionmenu.set(data.get("mic_device", "マイクなし"))
-                self.threshold_min_slider.set(data.get("threshold_min", 0))
-                self.threshold_max_slider.set(data.get("threshold_max", 0))
-                self.update_volume_labels_from_slider()
-        except FileNotFoundError:
-            self.show_error(f"アプリ設定プリセット '{preset_name}' が見つかりませんでした。")
-            return
+            self.mic_optionmenu.set(data.get("mic_device", "マイクなし"))
+            self.mic_channel_entry.delete(0, ctk.END)
+            self.mic_channel_entry.insert(0, str(data.get("mic_channel", 1)))
+            self.channel_routes_entry.delete(0, ctk.END)
+            if data.get("channel_routes"):
+                self.channel_routes_entry.insert(0, format_channel_routes(data["channel_routes"]))
+            self.animation_layers_entry.delete(0, ctk.END)
+            if data.get("animation_layers"):
+                self.animation_layers_entry.insert(0, format_animation_layers(data["animation_layers"]))
+            self.selection_mode_optionmenu.set(SELECTION_MODE_LABELS.get(data.get("selection_mode", "volume"), SELECTION_MODE_LABELS["volume"]))
+            self._set_vowel_table_entries(data.get("vowel_table", {}))
+            self.auto_calibration_checkbox.select() if data.get("auto_calibration", False) else self.auto_calibration_checkbox.deselect()
+            self.mapping_curve_optionmenu.set(MAPPING_CURVE_LABELS.get(data.get("mapping_curve", "linear"), MAPPING_CURVE_LABELS["linear"]))
+            self.mapping_points_entry.delete(0, ctk.END)
+            if data.get("mapping_points"):
+                self.mapping_points_entry.insert(0, format_mapping_points(data["mapping_points"]))
+            self.hysteresis_entry.delete(0, ctk.END)
+            self.hysteresis_entry.insert(0, f"{data.get('hysteresis', 0):g}")
+            self.level_detector_optionmenu.set(LEVEL_DETECTOR_LABELS.get(data.get("level_detector", "envelope"), LEVEL_DETECTOR_LABELS["envelope"]))
+            for entry, key, default in ((self.attack_ms_entry, "attack_ms", DEFAULT_ATTACK_MS), (self.release_ms_entry, "release_ms", DEFAULT_RELEASE_MS)):
+                entry.delete(0, ctk.END)
+                entry.insert(0, f"{data.get(key, default):g}")
+            self.render_mode_optionmenu.set(RENDER_MODE_LABELS.get(data.get("render_mode", "visibility"), RENDER_MODE_LABELS["visibility"]))
+            for entry, key in ((self.sprite_source_entry, "sprite_source"), (self.sprite_columns_entry, "sprite_columns"), (self.sprite_count_entry, "sprite_count")):
+                entry.delete(0, ctk.END)
+                if data.get(key):
+                    entry.insert(0, str(data[key]))
+            self.idle_after_entry.delete(0, ctk.END)
+            self.idle_after_entry.insert(0, f"{data.get('idle_after', DEFAULT_IDLE_AFTER):g}")
+            self.naming = NamingScheme(data.get("name_pattern", DEFAULT_NAME_PATTERN))
+            self.name_pattern_entry.delete(0, ctk.END)
+            self.name_pattern_entry.insert(0, self.naming.pattern)
+            self.name_namespace_entry.delete(0, ctk.END)
+            self.name_namespace_entry.insert(0, data.get("name_namespace", ""))
+            self.threshold_min_slider.set(data.get("threshold_min", 0))
+            self.threshold_max_slider.set(data.get("threshold_max", 0))
+            self.update_volume_labels_from_slider()
         except Exception as e:
             self.show_error(f"アプリ設定プリセットの読み込みに失敗しました: {e}")
-            return
+            return False
+
+        # 画像範囲は適用中のプリセットから読むので、先にプリセット名を反映しておく
         self.app_current_preset_label.configure(text=f"適用中: {preset_name} (保存済)")
         self.app_preset_var.set(f"アプリ設定: {preset_name} (保存済)")
-        self.status_label.configure(text=f"アプリ設定プリセット '{preset_name}' を適用しました。", text_color="green")
         self.is_app_preset_valid = True
-        self.preset_optionmenu.set("-") # 適用後に選択欄をリセット
-        self.preset_name_entry.delete(0, ctk.END) # この行を追加
+        self._update_image_range_on_group_change()
+        self.update_group_list_async(group_name_to_set=group_name_to_set)
+
+        if run_audio_thread:
+            config = self._build_engine_config()
+            if config is None:
+                return False
+            swap_engine_config(config)
+            log.info(f"🔄 動作中の設定をアプリ設定プリセット '{preset_name}' に切り替えました")
+        self.status_label.configure(text=f"アプリ設定プリセット '{preset_name}' を適用しました。", text_color="green")
+        return True
     
-    def _load_app_preset_async_helper(self, data):
-        """非同期でグループリストを更新した後、プリセットの値を設定するヘルパーメソッド"""
-        # _update_group_list_asyncが完了するまで待機
-        self.update_group_list_async(group_name_to_set=data.get("group_name"))
-        
-        # グループ名が設定されたら、画像範囲も設定
-        self.after(200, self._update_image_range_on_group_change_with_preset, data.get("image_range_start"), data.get("image_range_end"))
-        
-    def _update_image_range_on_group_change_with_preset(self, preset_start, preset_end):
-        global current_image_ids
-        selected_scene = self.scene_name_optionmenu.get()
-        selected_group = self.group_name_optionmenu.get()
+    def _get_selection_mode(self):
+        return label_to_key(SELECTION_MODE_LABELS, self.selection_mode_optionmenu.get(), "volume")
+
+    def _get_render_mode(self):
+        return label_to_key(RENDER_MODE_LABELS, self.render_mode_optionmenu.get(), "visibility")
+
+    def _add_ms_entry(self, frame, label, default):
+        """「ラベル [値] ms」の入力欄を並べる"""
+        ctk.CTkLabel(frame, text=label).pack(side="left", padx=(5, 5))
+        entry = ctk.CTkEntry(frame, width=45)
+        entry.insert(0, f"{default:g}")
+        entry.bind("<KeyRelease>", lambda event: self.clear_app_preset_status())
+        entry.pack(side="left")
+        ctk.CTkLabel(frame, text="ms").pack(side="left", padx=(2, 0))
+        return entry
+
+    def _get_level_detector(self):
+        return label_to_key(LEVEL_DETECTOR_LABELS, self.level_detector_optionmenu.get(), "envelope")
+
+    def _get_mapping_curve(self):
+        return label_to_key(MAPPING_CURVE_LABELS, self.mapping_curve_optionmenu.get(), "linear")
 
-        if selected_scene == "-" or selected_group == "-":
-            return
-        
-        cache_key = (selected_scene, selected_group)
-        if cache_key in self.cache_image_ids:
-            cached_data = self.cache_image_ids[cache_key]
-            current_image_ids = cached_data
-            
-            image_indices = sorted([int(re.sub(r'[^0-9]', '', name)) for name in current_image_ids.keys()])
-            str_indices = [str(x) for x in image_indices]
-            
-            if str_indices:
-                self.image_range_start_optionmenu.configure(values=str_indices)
-                self.image_range_end_optionmenu.configure(values=str_indices)
-                
-                if preset_start in str_indices:
-                    self.image_range_start_optionmenu.set(preset_start)
-                else:
-                    self.image_range_start_optionmenu.set(str_indices[0])
-                    
-                if preset_end in str_indices:
-                    self.image_range_end_optionmenu.set(preset_end)
-                else:
-                    self.image_range_end_optionmenu.set(str_indices[-1])
-            else:
-                self.image_range_start_optionmenu.configure(values=["-"])
-                self.image_range_end_optionmenu.configure(values=["-"])
-                self.image_range_start_optionmenu.set("-")
-                self.image_range_end_optionmenu.set("-")
+    def _get_vowel_table_from_entries(self):
+        """母音テーブル入力欄の内容を {母音: [画像番号, ...]} の辞書にする（不正な入力はValueError）"""
+        table = {}
+        for key, entry in self.vowel_table_entries.items():
+            frames = parse_frame_list(entry.get())
+            if frames:
+                table[key] = frames
+        return table
+
+    def _set_vowel_table_entries(self, table):
+        for key, entry in self.vowel_table_entries.items():
+            entry.delete(0, ctk.END)
+            frames = table.get(key)
+            if frames:
+                entry.insert(0, format_frame_list(frames))
+
+    def _get_applied_app_preset_name(self):
+        preset_name = self.app_preset_var.get().replace("アプリ設定: ", "").replace(" (保存済)", "")
+        return None if preset_name == "なし" else preset_name
+
+    def _get_applied_obs_preset_name(self):
+        preset_name = self.obs_preset_var.get().replace("OBS接続: ", "").replace(" (保存済)", "")
+        return None if preset_name == "なし" else preset_name
 
-            self.found_images_label.configure(text=f"見つかった画像: {len(cached_data)}個")
-            self.status_label.configure(text="✅ 画像データがロードされました。", text_color="green")
-        else:
-            self.image_range_start_optionmenu.configure(values=["-"])
-            self.image_range_end_optionmenu.configure(values=["-"])
-            self.image_range_start_optionmenu.set("-")
-            self.image_range_end_optionmenu.set("-")
-            self.found_images_label.configure(text="見つかった画像: 0個")
-            self.status_label.configure(text="画像が見つかりませんでした。検索ボタンを押してください。", text_color="red")
-            current_image_ids = {} # グローバル変数をクリア
-        
     def delete_preset(self):
         preset_name = self.preset_optionmenu.get()
         if preset_name == "-":
@@ -761,9 +4018,8 @@ class App(ctk.CTk):
         if not response:
             return
             
-        file_path = os.path.join(PRESET_FOLDER, f"{preset_name}.json")
         try:
-            os.remove(file_path)
+            self.app_presets.delete(preset_name)
             self.update_preset_list()
             if self.app_current_preset_label.cget("text") == f"適用中: {preset_name} (保存済)":
                 self.clear_app_preset_name()
@@ -775,8 +4031,8 @@ class App(ctk.CTk):
             self.show_error(f"アプリ設定プリセットの削除に失敗しました: {e}")
 
     def update_obs_preset_list(self):
-        files = [f.replace(".json", "") for f in os.listdir(OBS_PRESET_FOLDER) if f.endswith(".json")]
-        self.obs_preset_optionmenu.configure(values=files if files else ["-"])
+        names = self.obs_presets.names()
+        self.obs_preset_optionmenu.configure(values=names if names else ["-"])
 
     def save_obs_preset(self):
         preset_name = self.obs_preset_name_entry.get().strip()
@@ -784,10 +4040,8 @@ class App(ctk.CTk):
             self.show_error("プリセット名には半角英数字、ハイフン、アンダースコアのみ使用可能です。")
             return
 
-        file_path = os.path.join(OBS_PRESET_FOLDER, f"{preset_name}.json")
-
         # ファイルがすでに存在するかをチェックする
-        if os.path.exists(file_path):
+        if self.obs_presets.exists(preset_name):
             # 存在する場合は上書き確認メッセージを表示
             response = messagebox.askyesno(
                 "上書き確認",
@@ -798,10 +4052,15 @@ class App(ctk.CTk):
                 return
 
         data = {
-            ...
+            "host": self.obs_host_entry.get(),
+            "port": self.obs_port_entry.get(),
+            "password": self.obs_password_entry.get()
         }
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
+        try:
+            self.obs_presets.save(preset_name, data)
+        except Exception as e:
+            self.show_error(f"OBS接続プリセットの保存に失敗しました: {e}")
+            return
         self.update_obs_preset_list()
         self.obs_preset_name_entry.delete(0, ctk.END)
         self.status_label.configure(text=f"OBS接続プリセット '{preset_name}' を保存しました。", text_color="green")
@@ -813,49 +4072,43 @@ class App(ctk.CTk):
         preset_name = self.obs_preset_optionmenu.get()
         if preset_name == "-":
             return
-            
-        file_path = os.path.join(OBS_PRESET_FOLDER, f"{preset_name}.json")
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-                self.obs_host_entry.delete(0, ctk.END)
-                self.obs_host_entry.insert(0, data.get("host", "localhost"))
-                self.obs_port_entry.delete(0, ctk.END)
-                self.obs_port_entry.insert(0, data.get("port", "4455"))
-                self.obs_password_entry.delete(0, ctk.END)
-                self.obs_password_entry.insert(0, data.get("password", ""))
-
-                # 適用したプリセットのシーン名とグループ名を表示
-                try:
-                    app_preset_path = os.path.join(PRESET_FOLDER, f"{preset_name}.json")
-                    if os.path.exists(app_preset_path):
-                        with open(app_preset_path, "r") as f:
-                            app_data = json.load(f)
-                            scene_name = app_data.get("scene_name", "なし")
-                            group_name = app_data.get("group_name", "なし")
-                            print(f"✅ プリセット適用: シーン名 '{scene_name}', グループ名 '{group_name}'")
-                except Exception as e:
-                    print(f"⚠ 関連するアプリ設定プリセットの読み込みに失敗しました: {e}")
-                
-                # シーンリストを更新
-                self.update_scene_list()
-                
-                # 修正部分: 自動検索のタイミングを遅延させる
-                if self.auto_search_checkbox.get():
-                    self.after(500, self.start_find_all_sources_thread)
+        if self.apply_obs_preset(preset_name):
+            self.obs_preset_optionmenu.set("-") # 適用後に選択欄をリセット
 
-        except FileNotFoundError:
+    def apply_obs_preset(self, preset_name):
+        data = self.obs_presets.get(preset_name)
+        if data is None:
             self.show_error(f"OBS接続プリセット '{preset_name}' が見つかりませんでした。")
-            return
-        except Exception as e:
-            self.show_error(f"OBS接続プリセットの読み込みに失敗しました: {e}")
-            return
-            
+            return False
+
+        self.obs_host_entry.delete(0, ctk.END)
+        self.obs_host_entry.insert(0, data.get("host", "localhost"))
+        self.obs_port_entry.delete(0, ctk.END)
+        self.obs_port_entry.insert(0, data.get("port", "4455"))
+        self.obs_password_entry.delete(0, ctk.END)
+        self.obs_password_entry.insert(0, data.get("password", ""))
+
+        # 適用したプリセットのシーン名とグループ名を表示
+        app_data = self.app_presets.get(preset_name)
+        if app_data is not None:
+            log.info(f"✅ プリセット適用: シーン名 '{app_data.get('scene_name', 'なし')}', グループ名 '{app_data.get('group_name', 'なし')}'")
+        
+        # シーンリストを更新
+        self.update_scene_list()
+        
+        if self.auto_search_checkbox.get():
+            self.start_find_all_sources_thread()
+
         self.obs_current_preset_label.configure(text=f"適用中: {preset_name} (保存済)")
         self.obs_preset_var.set(f"OBS接続: {preset_name} (保存済)")
         self.status_label.configure(text=f"OBS接続プリセット '{preset_name}' を適用しました。", text_color="green")
         self.is_obs_preset_valid = True
-        self.obs_preset_optionmenu.set("-") # 適用後に選択欄をリセット
+
+        if run_audio_thread:
+            # 接続先だけを差し替える（オーディオスレッドが接続し直す）
+            update_engine_config(obs_settings=self._get_obs_connection_settings())
+            log.info(f"🔄 動作中の接続先をOBS接続プリセット '{preset_name}' に切り替えました")
+        return True
         
     def delete_obs_preset(self):
         preset_name = self.obs_preset_optionmenu.get()
@@ -869,9 +4122,8 @@ class App(ctk.CTk):
         if not response:
             return
             
-        file_path = os.path.join(OBS_PRESET_FOLDER, f"{preset_name}.json")
         try:
-            os.remove(file_path)
+            self.obs_presets.delete(preset_name)
             self.update_obs_preset_list()
             if self.obs_current_preset_label.cget("text") == f"適用中: {preset_name} (保存済)":
                 self.clear_obs_preset_name()
@@ -900,17 +4152,14 @@ class App(ctk.CTk):
             self.app_preset_var.set(new_text.replace("適用中: ", "アプリ設定: "))
 
     def clear_group_and_image_info(self, value=None):
-        global current_image_ids
+        global current_frames
         self.group_name_optionmenu.set("-")
         self.group_name_optionmenu.configure(values=["-"]) 
         self.update_group_list_async()
         self.found_images_label.configure(text="見つかった画像: 0個")
-        self.image_range_start_optionmenu.configure(values=["-"])
-        self.image_range_end_optionmenu.configure(values=["-"])
-        self.image_range_start_optionmenu.set("-")
-        self.image_range_end_optionmenu.set("-")
+        self.image_range_picker.clear()
         self.status_label.configure(text="シーンとグループを選択してください。", text_color="orange")
-        current_image_ids = {}
+        current_frames = None
 
     def update_volume_labels_from_slider(self, value=None):
         min_val = int(self.threshold_min_slider.get())
@@ -963,8 +4212,100 @@ class App(ctk.CTk):
         self.min_threshold_label.place(relx=min_pos, y=label_y, anchor=ctk.N)
         self.max_threshold_label.place(relx=max_pos, y=label_y, anchor=ctk.N)
 
+    def watch_devices(self):
+        """マイクの抜き差しを定期的に確認する（一覧の取り直しは時間がかかることがあるので別スレッドで行う）"""
+        if not self.is_scanning_devices:
+            self.is_scanning_devices = True
+            threading.Thread(target=self._scan_devices_async, daemon=True).start()
+        self.after(DEVICE_WATCH_INTERVAL_MS, self.watch_devices)
+
+    def _scan_devices_async(self):
+        try:
+            arrived, removed = self.device_watcher.scan()
+            if arrived or removed:
+                ui_bus.call("mic_devices", self.on_mic_devices_changed, self.device_watcher.list(), arrived, removed)
+        except Exception as e:
+            log.warning(f"⚠ マイクデバイスの確認に失敗しました: {e}")
+        finally:
+            self.is_scanning_devices = False
+
+    def on_mic_devices_changed(self, devices, arrived, removed):
+        # 選択中のマイクが抜かれても選択はそのまま残し、挿し直されたら同じ名前で使い続ける
+        self.mic_devices = devices
+        self.mic_device_names = [dev["name"] for dev in devices]
+        self.mic_optionmenu.configure(values=self.mic_device_names if self.mic_device_names else ["マイクなし"])
+        for device in removed:
+            log.info(f"🔌 マイクが取り外されました: {device['name']}（{device['host_api']}）")
+        for device in arrived:
+            log.info(f"🔌 マイクが接続されました: {device['name']}（{device['host_api']}）")
+        if run_audio_thread:
+            return
+        if arrived:
+            self.status_label.configure(text=f"🎤 マイクが接続されました: {arrived[0]['name']}", text_color="green")
+        else:
+            self.status_label.configure(text=f"⚠ マイクが取り外されました: {removed[0]['name']}", text_color="orange")
+
+    def drain_ui_bus(self):
+        """ワーカースレッドから投稿されたGUI更新をまとめて適用する（GUIスレッドで定期実行）"""
+        try:
+            if engine_process is not None:
+                engine_process.forward_events(self)
+            for kind, target, payload in ui_bus.drain():
+                try:
+                    if kind == "configure":
+                        getattr(self, target).configure(**payload)
+                    elif kind == "set":
+                        getattr(self, target).set(payload)
+                    else:
+                        target(*payload)
+                except Exception as e:
+                    log.warning(f"⚠ GUIの更新に失敗しました: {e}")
+        finally:
+            self.after(UI_BUS_INTERVAL_MS, self.drain_ui_bus)
+
+    def _get_obs_connection_settings(self):
+        """ワーカースレッドに渡すOBS接続情報（ホスト, ポート, パスワード）をGUIスレッドで読み取る"""
+        return self.obs_host_entry.get(), self.obs_port_entry.get(), self.obs_password_entry.get()
+
+    def _get_mirror_obs(self):
+        """「同時に送るOBS」のプリセット名から ((プリセット名, 接続情報), ...) を作る（不正な場合はValueError）"""
+        primary = self._get_obs_connection_settings()
+        mirrors = []
+        for name in self.mirror_obs_entry.get().replace("、", ",").split(","):
+            name = name.strip()
+            if not name:
+                continue
+            data = self.obs_presets.get(name)
+            if data is None:
+                raise ValueError(f"OBS接続プリセット '{name}' が見つかりません。")
+            settings = (data.get("host", "localhost"), data.get("port", "4455"), data.get("password", ""))
+            if settings[:2] == primary[:2] or any(settings[:2] == other[:2] for _, other in mirrors):
+                raise ValueError(f"OBS接続プリセット '{name}' は、すでに送り先にあるOBSと同じです。")
+            mirrors.append((name, settings))
+        return tuple(mirrors)
+
+    def on_mirror_obs_change(self, event=None):
+        self.save_auto_load_settings()
+        if not run_audio_thread:
+            return
+        try:
+            mirror_obs = self._get_mirror_obs()
+        except ValueError as e:
+            self.status_label.configure(text=f"⚠ {e}", text_color="red")
+            return
+        if mirror_obs != current_engine_config.mirror_obs:
+            update_engine_config(mirror_obs=mirror_obs)
+            log.info(f"🔄 口パクを送るOBSを変更しました（メイン＋{len(mirror_obs)}台）")
+
+    def on_obs_target_metrics(self, rows):
+        self.obs_target_metrics = rows
+
     def show_error(self, message):
         self.status_label.configure(text=f"エラー: {message}", text_color="red")
+        if self.control_errors is not None:
+            # 操作APIからの操作中はダイアログで止めず、エラーを応答で返す
+            self.control_errors.append(message)
+            return
         messagebox.showerror("エラー", message)
         
     def test_obs_connection(self):
@@ -982,11 +4323,11 @@ class App(ctk.CTk):
                     scene_name = scenes[0]
                     groups = obs_client_local.get_group_list_in_scene(scene_name)
                     group_name = groups[0] if groups else "なし"
-                    print(f"✅ 成功: シーン名 '{scene_name}', グループ名 '{group_name}'")
+                    log.info(f"✅ 成功: シーン名 '{scene_name}', グループ名 '{group_name}'")
                 else:
-                    print("⚠ 接続成功: シーンが見つかりませんでした。")
+                    log.warning("⚠ 接続成功: シーンが見つかりませんでした。")
             except Exception as e:
-                print(f"⚠ シーン/グループ情報の取得に失敗しました: {e}")
+                log.warning(f"⚠ シーン/グループ情報の取得に失敗しました: {e}")
                 
             obs_client_local.disconnect()
             
@@ -994,51 +4335,47 @@ class App(ctk.CTk):
             self.update_scene_list()
 
             if self.auto_search_checkbox.get(): # 変更
-                # 修正部分: 自動検索のタイミングを遅延させる
-                self.after(500, self.start_find_all_sources_thread)
+                self.start_find_all_sources_thread()
         else:
             self.status_label.configure(text="❌ OBSへの接続に失敗しました。", text_color="red")
             
-    def _update_scene_list_async(self):
-        self.status_label.configure(text="シーンリスト更新中...", text_color="orange")
-        self.update_idletasks()
+    def _update_scene_list_async(self, obs_settings):
+        ui_bus.configure("status_label", text="シーンリスト更新中...", text_color="orange")
         
-        obs_client_local = AsyncOBS(self.obs_host_entry.get(), int(self.obs_port_entry.get()), self.obs_password_entry.get())
+        obs_client_local = AsyncOBS(obs_settings[0], int(obs_settings[1]), obs_settings[2])
         if not obs_client_local.connect():
-            self.after(0, lambda: self.show_error("OBSに接続できませんでした。設定を確認してください。"))
+            ui_bus.call("show_error", self.show_error, "OBSに接続できませんでした。設定を確認してください。")
             return
         
         scenes = obs_client_local.get_scene_list()
         obs_client_local.disconnect()
 
         if scenes:
-            self.after(0, lambda: self.scene_name_optionmenu.configure(values=scenes))
-            self.after(0, lambda: self.scene_name_optionmenu.set(scenes[0]))
-            self.after(0, self.update_group_list_async)
-            self.after(0, lambda: self.status_label.configure(text="✅ シーンリストを更新しました。", text_color="green"))
+            ui_bus.configure("scene_name_optionmenu", values=scenes)
+            ui_bus.set("scene_name_optionmenu", scenes[0])
+            ui_bus.call("update_group_list", self.update_group_list_async)
+            ui_bus.configure("status_label", text="✅ シーンリストを更新しました。", text_color="green")
         else:
-            self.after(0, lambda: self.scene_name_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.scene_name_optionmenu.set("-"))
-            self.after(0, lambda: self.group_name_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.group_name_optionmenu.set("-"))
-            self.after(0, lambda: self.show_error("シーンが見つかりませんでした。"))
+            ui_bus.configure("scene_name_optionmenu", values=["-"])
+            ui_bus.set("scene_name_optionmenu", "-")
+            ui_bus.configure("group_name_optionmenu", values=["-"])
+            ui_bus.set("group_name_optionmenu", "-")
+            ui_bus.call("show_error", self.show_error, "シーンが見つかりませんでした。")
             
     def update_scene_list(self):
-        threading.Thread(target=self._update_scene_list_async).start()
+        threading.Thread(target=self._update_scene_list_async, args=(self._get_obs_connection_settings(),)).start()
         
-    def _update_group_list_async(self, value=None, group_name_to_set=None):
-        selected_scene = self.scene_name_optionmenu.get()
+    def _update_group_list_async(self, selected_scene, obs_settings, group_name_to_set=None):
         if selected_scene == "-" or not selected_scene:
-            self.after(0, lambda: self.group_name_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.group_name_optionmenu.set("-"))
+            ui_bus.configure("group_name_optionmenu", values=["-"])
+            ui_bus.set("group_name_optionmenu", "-")
             return
 
-        self.status_label.configure(text="グループリスト更新中...", text_color="orange")
-        self.update_idletasks()
+        ui_bus.configure("status_label", text="グループリスト更新中...", text_color="orange")
         
-        obs_client_local = AsyncOBS(self.obs_host_entry.get(), int(self.obs_port_entry.get()), self.obs_password_entry.get())
+        obs_client_local = AsyncOBS(obs_settings[0], int(obs_settings[1]), obs_settings[2])
         if not obs_client_local.connect():
-            self.after(0, lambda: self.show_error("OBSに接続できませんでした。設定を確認してください。"))
+            ui_bus.call("show_error", self.show_error, "OBSに接続できませんでした。設定を確認してください。")
             return
 
         groups = obs_client_local.get_group_list_in_scene(selected_scene)
@@ -1048,359 +4385,412 @@ class App(ctk.CTk):
         visible_groups = []
         for group in groups:
             cache_key = (selected_scene, group)
-            if cache_key in self.cache_image_ids:
-                if len(self.cache_image_ids[cache_key]) > 0:
+            if cache_key in self.cache_group_items:
+                if len(self.cache_group_items[cache_key]) > 0:
                     visible_groups.append(group)
             else:
                 visible_groups.append(group)
 
         if visible_groups:
-            self.after(0, lambda: self.group_name_optionmenu.configure(values=["-"] + visible_groups))
+            ui_bus.configure("group_name_optionmenu", values=["-"] + visible_groups)
             # プリセットからグループ名が指定されていれば設定
             if group_name_to_set and group_name_to_set in visible_groups:
-                self.after(0, lambda: self.group_name_optionmenu.set(group_name_to_set))
+                ui_bus.set("group_name_optionmenu", group_name_to_set)
             else:
-                self.after(0, lambda: self.group_name_optionmenu.set("-"))
-            self.after(0, lambda: self.status_label.configure(text="✅ グループリストを更新しました。", text_color="green"))
-            self.after(0, self._update_image_range_on_group_change)
+                ui_bus.set("group_name_optionmenu", "-")
+            ui_bus.configure("status_label", text="✅ グループリストを更新しました。", text_color="green")
+            ui_bus.call("update_image_range", self._update_image_range_on_group_change)
 
         else:
-            self.after(0, lambda: self.group_name_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.group_name_optionmenu.set("-"))
-            self.after(0, lambda: self.status_label.configure(text="⚠ グループが見つかりませんでした。", text_color="red"))
-            self.after(0, lambda: self.image_range_start_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.image_range_end_optionmenu.configure(values=["-"]))
-            self.after(0, lambda: self.found_images_label.configure(text="見つかった画像: 0個"))
+            ui_bus.configure("group_name_optionmenu", values=["-"])
+            ui_bus.set("group_name_optionmenu", "-")
+            ui_bus.configure("status_label", text="⚠ グループが見つかりませんでした。", text_color="red")
+            ui_bus.call("clear_image_range", self.image_range_picker.clear)
+            ui_bus.configure("found_images_label", text="見つかった画像: 0個")
             
     def update_group_list_async(self, value=None, group_name_to_set=None):
-        threading.Thread(target=self._update_group_list_async, args=(value, group_name_to_set)).start()
+        threading.Thread(target=self._update_group_list_async, args=(self.scene_name_optionmenu.get(), self._get_obs_connection_settings(), group_name_to_set)).start()
         
+    def _group_frames(self, scene_name, group_name, namespace=""):
+        """検索結果のキャッシュから、画像名の形式に合う画像の FrameTable を作る（未検索ならNone）"""
+        items = self.cache_group_items.get((scene_name, group_name))
+        return None if items is None else self.naming.resolve(items, namespace)
+
+    def on_naming_change(self, event=None):
+        """画像名の形式・名前空間が編集されたら、形式を組み立て直して画像の一覧を作り直す"""
+        pattern = self.name_pattern_entry.get().strip() or DEFAULT_NAME_PATTERN
+        if pattern != self.naming.pattern:
+            try:
+                self.naming = NamingScheme(pattern)
+            except ValueError as e:
+                self.status_label.configure(text=f"⚠ {e}", text_color="red")
+                return
+        self._update_image_range_on_group_change()
+        self.clear_app_preset_status()
+
     def _update_image_range_on_group_change(self, value=None):
-        global current_image_ids
+        global current_frames
         selected_scene = self.scene_name_optionmenu.get()
         selected_group = self.group_name_optionmenu.get()
         
         if selected_scene == "-" or selected_group == "-":
-            self.image_range_start_optionmenu.configure(values=["-"])
-            self.image_range_end_optionmenu.configure(values=["-"])
-            self.image_range_start_optionmenu.set("-")
-            self.image_range_end_optionmenu.set("-")
+            self.image_range_picker.clear()
             self.found_images_label.configure(text="見つかった画像: 0個")
             self.status_label.configure(text="シーンとグループを選択してください。", text_color="orange")
-            current_image_ids = {}
+            current_frames = None
             return
             
         cache_key = (selected_scene, selected_group)
-        if cache_key in self.cache_image_ids:
-            print(f"✅ キャッシュから画像データをロードします: {cache_key}")
-            cached_data = self.cache_image_ids[cache_key]
-            current_image_ids = cached_data
+        frames = self._group_frames(selected_scene, selected_group, self.name_namespace_entry.get().strip())
+        if frames is not None:
+            log.info(f"✅ キャッシュから画像データをロードします: {cache_key}")
+            current_frames = frames
             
             # プリセットから設定された値があるか確認
-            preset_file_path = os.path.join(PRESET_FOLDER, f"{self.app_preset_var.get().replace('アプリ設定: ', '').replace(' (保存済)', '')}.json")
-            
             preset_start_range = "-"
             preset_end_range = "-"
-            try:
-                if os.path.exists(preset_file_path):
-                    with open(preset_file_path, "r") as f:
-                        data = json.load(f)
-                        if data.get("scene_name") == selected_scene and data.get("group_name") == selected_group:
-                            preset_start_range = data.get("image_range_start")
-                            preset_end_range = data.get("image_range_end")
-            except Exception:
-                pass
-            
-            # 画像範囲の選択肢と値を更新
-            image_indices = sorted([int(re.sub(r'[^0-9]', '', name)) for name in current_image_ids.keys()])
-            str_indices = [str(x) for x in image_indices]
+            data = self.app_presets.presets.get(self._get_applied_app_preset_name())
+            if data and data.get("scene_name") == selected_scene and data.get("group_name") == selected_group:
+                preset_start_range = data.get("image_range_start")
+                preset_end_range = data.get("image_range_end")
             
-            if str_indices:
-                self.image_range_start_optionmenu.configure(values=str_indices)
-                self.image_range_end_optionmenu.configure(values=str_indices)
-                
-                # プリセットから読み込んだ値があれば設定
-                if preset_start_range in str_indices:
-                    self.image_range_start_optionmenu.set(preset_start_range)
-                else:
-                    self.image_range_start_optionmenu.set(str_indices[0])
-                    
-                if preset_end_range in str_indices:
-                    self.image_range_end_optionmenu.set(preset_end_range)
-                else:
-                    self.image_range_end_optionmenu.set(str_indices[-1])
-            else:
-                self.image_range_start_optionmenu.configure(values=["-"])
-                self.image_range_end_optionmenu.configure(values=["-"])
-                self.image_range_start_optionmenu.set("-")
-                self.image_range_end_optionmenu.set("-")
+            # 画像範囲を更新（プリセットから読み込んだ値があれば設定）
+            self.image_range_picker.set_indices(frames.ordinals, preset_start_range, preset_end_range)
 
-            self.found_images_label.configure(text=f"見つかった画像: {len(cached_data)}個")
+            self.found_images_label.configure(text=f"見つかった画像: {len(frames)}個")
             self.status_label.configure(text="✅ 画像データがロードされました。", text_color="green")
             
         else:
-            print(f"⚠ キャッシュに画像データがありません: {cache_key}")
-            self.image_range_start_optionmenu.configure(values=["-"])
-            self.image_range_end_optionmenu.configure(values=["-"])
-            self.image_range_start_optionmenu.set("-")
-            self.image_range_end_optionmenu.set("-")
+            log.warning(f"⚠ キャッシュに画像データがありません: {cache_key}")
+            self.image_range_picker.clear()
             self.found_images_label.configure(text="見つかった画像: 0個")
             self.status_label.configure(text="画像が見つかりませんでした。検索ボタンを押してください。", text_color="red")
-            current_image_ids = {} # グローバル変数をクリア
+            current_frames = None # グローバル変数をクリア
             
     def start_find_all_sources_thread(self):
-        self.is_searching = True # 検索中フラグを立てる
-        self.load_preset_button.configure(state="disabled") # プリセット適用ボタンを無効化
-        self.delete_preset_button.configure(state="disabled") # プリセット削除ボタンを無効化
-        threading.Thread(target=self._find_all_sources_async).start()
-
-    def _find_all_sources_async(self):
-        global current_image_ids
-        
-        self.status_label.configure(text="全シーン・グループの画像ソースを検索中...", text_color="orange")
-        self.update_idletasks()
-        
-        obs_client_local = AsyncOBS(self.obs_host_entry.get(), int(self.obs_port_entry.get()), self.obs_password_entry.get())
-        if not obs_client_local.connect():
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error("OBSに接続できませんでした。"))
-            return
-
-        all_scenes = obs_client_local.get_scene_list()
-        if not all_scenes:
-            obs_client_local.disconnect()
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.status_label.configure(text="⚠ シーンが見つかりませんでした。", text_color="red"))
-            return
-
-        total_found_count = 0
-        
-        try:
-            for scene_name in all_scenes:
-                groups = obs_client_local.get_group_list_in_scene(scene_name)
-                
-                for group_name in groups:
-                    found_ids_for_group = {}
-                    for i in range(1, MAX_IMAGE_COUNT + 1):
-                        source_name = f"{i}"
-                        source_id = obs_client_local.get_scene_item_id(group_name, source_name)
-                        if source_id is not None:
-                            found_ids_for_group[source_name] = source_id
-                            total_found_count += 1
-                    
-                    # 修正部分: 画像が見つからない場合もキャッシュに残す
-                    self.cache_image_ids[(scene_name, group_name)] = found_ids_for_group
-        except Exception as e:
-            print(f"検索中にエラーが発生しました: {e}")
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error(f"検索中にエラーが発生しました: {e}"))
-        finally:
-            obs_client_local.disconnect()
-            self.after(0, self.update_group_list_async)
-            self.after(0, self.on_search_complete, total_found_count)
+        self._start_discovery("全シーン・グループ")
 
     def start_find_sources_in_scene_thread(self):
-        self.is_searching = True # 検索中フラグを立てる
-        self.load_preset_button.configure(state="disabled") # プリセット適用ボタンを無効化
-        self.delete_preset_button.configure(state="disabled") # プリセット削除ボタンを無効化
-        threading.Thread(target=self._find_sources_in_scene_async).start()
-
-    def _find_sources_in_scene_async(self):
         selected_scene = self.scene_name_optionmenu.get()
         if selected_scene == "-":
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error("シーンを選択してください。"))
-            return
-            
-        self.status_label.configure(text=f"シーン '{selected_scene}' 内の画像ソースを検索中...", text_color="orange")
-        self.update_idletasks()
-        
-        obs_client_local = AsyncOBS(self.obs_host_entry.get(), int(self.obs_port_entry.get()), self.obs_password_entry.get())
-        if not obs_client_local.connect():
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error("OBSに接続できませんでした。"))
+            self.show_error("シーンを選択してください。")
             return
-        
-        total_found_count = 0
-        
-        try:
-            groups = obs_client_local.get_group_list_in_scene(selected_scene)
-            for group_name in groups:
-                found_ids_for_group = {}
-                for i in range(1, MAX_IMAGE_COUNT + 1):
-                    source_name = f"{i}.png"
-                    source_id = obs_client_local.get_scene_item_id(group_name, source_name)
-                    if source_id is not None:
-                        found_ids_for_group[source_name] = source_id
-                        total_found_count += 1
-                
-                self.cache_image_ids[(selected_scene, group_name)] = found_ids_for_group
-        except Exception as e:
-            print(f"検索中にエラーが発生しました: {e}")
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error(f"検索中にエラーが発生しました: {e}"))
-        finally:
-            obs_client_local.disconnect()
-            self.after(0, self.update_group_list_async)
-            self.after(0, self.on_search_complete, total_found_count)
+        self._start_discovery(f"シーン '{selected_scene}' 内", scene_name=selected_scene)
 
     def start_find_sources_in_group_thread(self):
-        self.is_searching = True # 検索中フラグを立てる
-        self.load_preset_button.configure(state="disabled") # プリセット適用ボタンを無効化
-        self.delete_preset_button.configure(state="disabled") # プリセット削除ボタンを無効化
-        threading.Thread(target=self._find_sources_in_group_async).start()
-
-    def _find_sources_in_group_async(self):
         selected_scene = self.scene_name_optionmenu.get()
         selected_group = self.group_name_optionmenu.get()
         if selected_scene == "-" or selected_group == "-":
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error("シーンとグループを選択してください。"))
+            self.show_error("シーンとグループを選択してください。")
             return
-            
-        self.status_label.configure(text=f"グループ '{selected_group}' 内の画像ソースを検索中...", text_color="orange")
-        self.update_idletasks()
-        
-        obs_client_local = AsyncOBS(self.obs_host_entry.get(), int(self.obs_port_entry.get()), self.obs_password_entry.get())
-        if not obs_client_local.connect():
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error("OBSに接続できませんでした。"))
+        self._start_discovery(f"グループ '{selected_group}' 内", scene_name=selected_scene, group_name=selected_group)
+
+    def _start_discovery(self, label, scene_name=None, group_name=None):
+        """画像ソースの検索ジョブを始める（実行中の検索があれば中止して置き換える）"""
+        if self.search_job is not None:
+            self.search_job.cancel()
+        naming = self.naming
+        namespace = self.name_namespace_entry.get().strip()
+        # 選択中のグループを最初に取得し、届いた時点で使えるようにする
+        self.search_job = DiscoveryJob(self._get_obs_connection_settings(), self._on_discovery_group, self._on_discovery_finish,
+                                       scene_name=scene_name, group_name=group_name,
+                                       priority=(self.scene_name_optionmenu.get(), self.group_name_optionmenu.get()),
+                                       count_items=lambda items: len(naming.resolve(items, namespace)))
+        self.search_label = label
+        self.search_selection_loaded = False
+        self.load_preset_button.configure(state="disabled") # プリセット適用ボタンを無効化
+        self.delete_preset_button.configure(state="disabled") # プリセット削除ボタンを無効化
+        self.cancel_search_button.configure(state="normal")
+        self.status_label.configure(text=f"{label}の画像ソースを検索中...", text_color="orange")
+        self.search_job.start()
+
+    def cancel_search(self):
+        if self.search_job is not None:
+            self.search_job.cancel()
+            self.status_label.configure(text="検索を中止しています...", text_color="orange")
+
+    def _on_discovery_group(self, job, scene_name, group_name, items):
+        # 検索ジョブのスレッドから呼ばれる。画像が見つからないグループもキャッシュに残す
+        self.cache_group_items[(scene_name, group_name)] = items
+        ui_bus.call("search_progress", self.on_search_progress, job)
+
+    def _on_discovery_finish(self, job):
+        ui_bus.call("search_complete", self.on_search_complete, job)
+
+    def on_search_progress(self, job):
+        if job is not self.search_job or job.cancelled.is_set():
             return
-            
-        found_ids_for_group = {}
-        try:
-            for i in range(1, MAX_IMAGE_COUNT + 1):
-                source_name = f"{i}.png"
-                source_id = obs_client_local.get_scene_item_id(selected_group, source_name)
-                if source_id is not None:
-                    found_ids_for_group[source_name] = source_id
-        except Exception as e:
-            print(f"検索中にエラーが発生しました: {e}")
-            self.after(0, self.on_search_complete, 0)
-            self.after(0, lambda: self.show_error(f"検索中にエラーが発生しました: {e}"))
-        finally:
-            obs_client_local.disconnect()
-            self.cache_image_ids[(selected_scene, selected_group)] = found_ids_for_group
-            self.after(0, self._update_image_range_on_group_change)
-            self.after(0, self.on_search_complete, len(found_ids_for_group))
+        # 選択中のグループの結果が届いたら、残りの検索を待たずに画像範囲を更新する（この時点で開始できる）
+        if not self.search_selection_loaded and job.is_finished(self.scene_name_optionmenu.get(), self.group_name_optionmenu.get()):
+            self.search_selection_loaded = True
+            self._update_image_range_on_group_change()
+        done, total, found = job.progress()
+        text = f"{self.search_label}の画像ソースを検索中...（グループ {done}/{total}{'+' if job.listing else ''}, 発見 {found}個）"
+        if self.search_selection_loaded and current_frames is not None:
+            text += "\n✅ 選択中のグループは使用できます"
+        self.status_label.configure(text=text, text_color="orange")
 
-    def on_search_complete(self, count):
-        self.is_searching = False # 検索中フラグをリセット
+    def on_search_complete(self, job):
+        if job is not self.search_job:
+            return # 新しい検索に置き換えられた
+        self.search_job = None
         self.load_preset_button.configure(state="normal") # プリセット適用ボタンを有効化
         self.delete_preset_button.configure(state="normal") # プリセット削除ボタンを有効化
+        self.cancel_search_button.configure(state="disabled")
+        done, total, count = job.progress()
+        if job.group_name is None and done > 0:
+            # 検索中に選んだグループはそのまま残す
+            self.update_group_list_async(group_name_to_set=self.group_name_optionmenu.get())
+        if job.error:
+            self.show_error(job.error)
 
-        if count > 0:
+        if job.error:
+            self.status_label.configure(text=f"❌ 検索を中止しました: {job.error}（グループ {done}/{total}, 発見 {count}個）", text_color="red")
+        elif job.cancelled.is_set():
+            self.status_label.configure(text=f"⏹ 検索を中止しました（グループ {done}/{total}, 発見 {count}個）", text_color="orange")
+        elif count > 0:
             self.status_label.configure(text=f"✅ {count}個の画像ソースが見つかりました。", text_color="green")
             self.found_images_label.configure(text=f"見つかった画像: {count}個")
             
             # 選択中のシーン・グループの画像リストを更新
             selected_scene = self.scene_name_optionmenu.get()
             selected_group = self.group_name_optionmenu.get()
-            cache_key = (selected_scene, selected_group)
-
-            global current_image_ids
-            if cache_key in self.cache_image_ids:
-                cached_data = self.cache_image_ids[cache_key]
-                current_image_ids = cached_data
-                image_indices = sorted([int(re.sub(r'[^0-9]', '', name)) for name in current_image_ids.keys()])
-                if image_indices:
-                    str_indices = [str(x) for x in image_indices]
-                    self.image_range_start_optionmenu.configure(values=str_indices)
-                    self.image_range_start_optionmenu.set(str_indices[0])
-                    self.image_range_end_optionmenu.configure(values=str_indices)
-                    self.image_range_end_optionmenu.set(str_indices[-1])
+
+            global current_frames
+            frames = self._group_frames(selected_scene, selected_group, self.name_namespace_entry.get().strip())
+            if frames is not None:
+                if frames != current_frames: # 検索の途中で反映済みなら、選び直した画像範囲をそのまま残す
+                    self.image_range_picker.set_indices(frames.ordinals)
+                current_frames = frames
             else:
-                current_image_ids = {}
-                self.image_range_start_optionmenu.configure(values=["-"])
-                self.image_range_end_optionmenu.configure(values=["-"])
+                current_frames = None
+                self.image_range_picker.clear()
                 self.status_label.configure(text="⚠ 選択されたグループに画像ソースがありません。", text_color="red")
 
         else:
             self.status_label.configure(text="⚠ 画像ソースが見つかりませんでした。ソース名とグループ名を確認してください。", text_color="red")
             self.found_images_label.configure(text="見つかった画像: 0個")
-            self.image_range_start_optionmenu.configure(values=["-"])
-            self.image_range_end_optionmenu.configure(values=["-"])
+            self.image_range_picker.clear()
         self.update_idletasks()
         self.clear_app_preset_status() # 変更
 
     def on_start(self):
-        global current_threshold_min, current_threshold_max, selected_mic_index, current_scene_name, current_group_name
-        
+        config = self._build_engine_config()
+        if config is None:
+            return
+        # 押された時刻を渡して、最初のコマを送るまでの時間をオーディオ側で測る
+        swap_engine_config(config.replace(requested_at=time.time()))
+            
+        self.start_button.configure(state="disabled")
+        self.stop_button.configure(state="normal")
+        # 修正: 再起動ボタンの状態変更を削除
+        self.status_label.configure(text="▶ 音量監視中...", text_color="blue")
+        isolated = bool(self.engine_process_checkbox.get())
+        if audio_engine_alive(isolated):
+            # 待機中（または動作中）のループは次のチャンクで新しい設定を読み、変わった部分だけを用意し直す
+            resume_audio_engine()
+        else:
+            start_audio_thread(self, isolated=isolated)
+
+    def _build_engine_config(self):
+        """画面の設定を検証してオーディオスレッド用の設定を作る（不正な場合はエラーを表示してNone）"""
         # 修正部分: 選択されたシーンとグループのキャッシュから画像IDを再ロードする
         selected_scene = self.scene_name_optionmenu.get()
         selected_group = self.group_name_optionmenu.get()
-        cache_key = (selected_scene, selected_group)
-        global current_image_ids
-        current_image_ids = self.cache_image_ids.get(cache_key, {})
+        global current_frames
+        current_frames = self._group_frames(selected_scene, selected_group, self.name_namespace_entry.get().strip())
 
-        if len(current_image_ids) == 0:
+        render_mode = self._get_render_mode()
+        sprite_columns = sprite_count = None
+        if render_mode == "spritesheet":
+            # スプライトシート方式では番号付き画像ソースの検索は不要
+            try:
+                sprite_columns = int(self.sprite_columns_entry.get()) if self.sprite_columns_entry.get().strip() else None
+                sprite_count = int(self.sprite_count_entry.get()) if self.sprite_count_entry.get().strip() else None
+            except ValueError:
+                self.show_error("スプライトシートの列数・コマ数には数値を入力してください。")
+                return None
+            if not self.sprite_source_entry.get().strip():
+                self.show_error("スプライトシートの画像ソース名を入力してください。")
+                return None
+        elif not current_frames:
             self.show_error("画像ソースが検出されていません。「検索」ボタンを押してください。")
-            return
+            return None
         
         mic_name = self.mic_optionmenu.get()
         mic_info = next((dev for dev in self.mic_devices if dev["name"] == mic_name), None)
         if not mic_info:
             self.show_error("マイクデバイスが選択されていません。")
-            return
+            return None
             
-        try:
-            start_index = int(self.image_range_start_optionmenu.get())
-            end_index = int(self.image_range_end_optionmenu.get())
-            if start_index > end_index:
-                self.show_error("画像範囲の開始番号は終了番号より小さく設定してください。")
-                return
-        except ValueError:
-            self.show_error("画像範囲が正しく選択されていません。")
-            return
+        if render_mode == "spritesheet" and not self.image_range_picker.indices:
+            # スプライトシート方式では画像検索をしていなくても全コマを使う
+            start_index, end_index = 0, sys.maxsize
+        else:
+            try:
+                start_index, end_index = self.image_range_picker.get_range()
+            except ValueError as e:
+                self.show_error(str(e))
+                return None
 
-        current_scene_name = self.scene_name_optionmenu.get()
-        current_group_name = self.group_name_optionmenu.get()
-        current_threshold_min = self.threshold_min_slider.get()
-        current_threshold_max = self.threshold_max_slider.get()
-        selected_mic_index = mic_info["index"]
+        threshold_min = self.threshold_min_slider.get()
+        threshold_max = self.threshold_max_slider.get()
 
-        if not current_scene_name or current_scene_name == "-" or not current_group_name or current_group_name == "-":
+        if not selected_scene or selected_scene == "-" or not selected_group or selected_group == "-":
             self.show_error("シーン名とグループ名を指定してください。")
-            return
+            return None
 
-        if current_threshold_min >= current_threshold_max:
+        if threshold_min >= threshold_max:
             self.show_error("音量閾値の下限は上限より小さく設定してください。")
-            return
-            
-        self.start_button.configure(state="disabled")
-        self.stop_button.configure(state="normal")
-        # 修正: 再起動ボタンの状態変更を削除
-        self.status_label.configure(text="▶ 音量監視中...", text_color="blue")
-        start_audio_thread(self)
+            return None
+
+        try:
+            mirror_obs = self._get_mirror_obs()
+        except ValueError as e:
+            self.show_error(f"同時に送るOBSの設定が正しくありません: {e}")
+            return None
+
+        try:
+            vowel_table = self._get_vowel_table_from_entries()
+        except ValueError:
+            self.show_error("母音テーブルには「2-4」や「1,3,5」の形式で画像番号を入力してください。")
+            return None
+
+        try:
+            mapping_points = parse_mapping_points(self.mapping_points_entry.get())
+            hysteresis = float(self.hysteresis_entry.get() or 0)
+            mapping_curve = self._get_mapping_curve()
+            if mapping_curve == "custom":
+                normalize_mapping_points(mapping_points)
+        except ValueError as e:
+            self.show_error(f"マッピング設定が正しくありません（カスタム点は「0.2:0.5, 0.6:0.9」の形式）: {e}")
+            return None
+        try:
+            attack_ms = max(0.0, float(self.attack_ms_entry.get() or 0))
+            release_ms = max(0.0, float(self.release_ms_entry.get() or 0))
+        except ValueError:
+            self.show_error("アタック・リリースの時間にはミリ秒の数値を入力してください。")
+            return None
+        try:
+            idle_after = max(0.0, float(self.idle_after_entry.get() or 0))
+        except ValueError:
+            self.show_error("省電力待機の秒数には数値を入力してください。")
+            return None
+
+        try:
+            input_channel = int(self.mic_channel_entry.get() or 1)
+            if input_channel < 1:
+                raise ValueError("チャンネルは1以上で指定してください")
+            channel_routes = parse_channel_routes(self.channel_routes_entry.get())
+        except ValueError as e:
+            self.show_error(f"チャンネルの設定が正しくありません（振り分けは「2:グループ名, 3:グループ名:1-10」の形式）: {e}")
+            return None
+        try:
+            animation_layers = parse_animation_layers(self.animation_layers_entry.get())
+        except ValueError as e:
+            self.show_error(f"レイヤーの設定が正しくありません（「まばたき:目@2-6, 待機:からだ@5-10」の形式）: {e}")
+            return None
+        if not self._resolve_group_entries(selected_scene, channel_routes, "振り分け先") or not self._resolve_group_entries(selected_scene, animation_layers, "レイヤー"):
+            return None
+        channel_count = max([input_channel] + [route["channel"] for route in channel_routes])
+        if channel_count > mic_info.get("channels", 1):
+            self.show_error(f"マイクデバイス '{mic_name}' の入力は {mic_info.get('channels', 1)} チャンネルまでです。")
+            return None
+
+        return EngineConfig(
+            obs_settings=self._get_obs_connection_settings(),
+            mirror_obs=mirror_obs,
+            live_only=bool(self.live_only_checkbox.get()),
+            scene_name=selected_scene,
+            group_name=selected_group,
+            frames=current_frames,
+            name_pattern=self.naming.pattern,
+            namespace=self.name_namespace_entry.get().strip(),
+            image_range=(start_index, end_index),
+            mic_device=device_key(mic_info),
+            threshold_min=threshold_min,
+            threshold_max=threshold_max,
+            selection_mode=self._get_selection_mode(),
+            vowel_table=vowel_table,
+            auto_calibration=bool(self.auto_calibration_checkbox.get()),
+            mapping_curve=mapping_curve,
+            mapping_points=mapping_points,
+            hysteresis=hysteresis,
+            level_detector=self._get_level_detector(),
+            attack_ms=attack_ms,
+            release_ms=release_ms,
+            render_mode=render_mode,
+            sprite_source=self.sprite_source_entry.get().strip() if render_mode == "spritesheet" else "",
+            sprite_columns=sprite_columns,
+            sprite_count=sprite_count,
+            idle_after=idle_after,
+            trace_enabled=bool(self.trace_checkbox.get()),
+            profile_enabled=bool(self.profile_checkbox.get()),
+            input_channel=input_channel,
+            channel_routes=channel_routes,
+            animation_layers=animation_layers,
+        )
+
+    def _resolve_group_entries(self, scene_name, entries, role):
+        """振り分け先・レイヤーのグループに、検索結果のキャッシュから画像IDを割り当てる（見つからなければエラーを表示してFalse）"""
+        for entry in entries:
+            frames = self._group_frames(scene_name, entry["group_name"], entry.get("namespace", ""))
+            if not frames:
+                self.show_error(f"{role}のグループ '{format_group_namespace(entry)}' の画像ソースが検出されていません。「検索」ボタンを押してください。")
+                return False
+            entry["frames"] = frames
+            entry["image_range"] = tuple(entry["image_range"]) if entry["image_range"] else (0, sys.maxsize)
+        return True
 
     def on_stop(self):
-        global obs_client
+        global obs_targets
         
-        stop_audio_thread()
+        if self.warm_standby_checkbox.get() and audio_engine_alive(engine_process is not None):
+            # マイクとOBSとの接続は閉じずに待機する（次の開始は送信を再開するだけで済む）
+            enter_audio_standby()
+            status_text = "■ 停止しました（待機中）"
+        else:
+            stop_audio_thread()
+            status_text = "■ 停止しました"
+        self.obs_target_metrics = []
         self.start_button.configure(state="normal")
         self.stop_button.configure(state="disabled")
         # 修正: 再起動ボタンの状態変更を削除
-        self.status_label.configure(text="■ 停止しました", text_color="green")
+        self.status_label.configure(text=status_text, text_color="green")
         
-        if obs_client:
-            obs_client.disconnect()
-            obs_client = None
+        if obs_targets and not audio_standby:
+            obs_targets.disconnect()
+            obs_targets = None
+
+    def on_engine_error(self):
+        """オーディオ側がエラーで終了したときは、待機せずにすべて閉じる"""
+        global obs_targets
+        stop_audio_thread()
+        self.obs_target_metrics = []
+        self.start_button.configure(state="normal")
+        self.stop_button.configure(state="disabled")
+        if obs_targets:
+            obs_targets.disconnect()
+            obs_targets = None
 
     def on_restart(self):
-        self.on_stop()
-        self.after(500, self.on_start) # 停止処理が完了するまで少し待つ
+        # 動いているループには新しい設定を渡すだけでよい（止めて待つ必要はない）
+        # スレッドと別プロセスを切り替えたときや、ループが動いていないときは on_start が起動し直す
+        self.on_start()
+
+    def on_toggle_warm_standby(self):
+        self.save_auto_load_settings()
+        if not self.warm_standby_checkbox.get() and audio_standby:
+            stop_audio_thread()
+            self.status_label.configure(text="■ 停止しました", text_color="green")
 
     def on_set_threshold_and_restart(self):
-        global current_threshold_min, current_threshold_max
         try:
             min_val = int(self.threshold_min_entry.get())
             max_val = int(self.threshold_max_entry.get())
             if min_val >= max_val:
                 self.show_error("音量閾値の下限は上限より小さく設定してください。")
                 return
-            current_threshold_min = min_val
-            current_threshold_max = max_val
-            
             self.threshold_min_slider.set(min_val)
             self.threshold_max_slider.set(max_val)
             self.update_threshold_markers()
@@ -1409,16 +4799,163 @@ class App(ctk.CTk):
         except ValueError:
             self.show_error("閾値には数値を入力してください。")
 
+    def on_toggle_auto_calibration(self):
+        update_engine_config(auto_calibration=bool(self.auto_calibration_checkbox.get()))
+        self.clear_app_preset_status()
+
+    def on_toggle_trace(self):
+        update_engine_config(trace_enabled=bool(self.trace_checkbox.get()))
+
+    def on_toggle_profile(self):
+        update_engine_config(profile_enabled=bool(self.profile_checkbox.get()))
+
+    def on_toggle_live_only(self):
+        update_engine_config(live_only=bool(self.live_only_checkbox.get()))
+        self.save_auto_load_settings()
+
+    def on_toggle_engine_process(self):
+        self.save_auto_load_settings()
+        if run_audio_thread:
+            self.on_restart() # スレッドとプロセスは動作中に切り替えられないので開始し直す
+        elif audio_standby:
+            stop_audio_thread() # 待機中のループは元の方式のままなので閉じる
+
+    def on_toggle_control_api(self):
+        if self.control_api_checkbox.get():
+            self.start_control_server()
+        elif self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+        self.save_auto_load_settings()
+
+    def start_control_server(self):
+        try:
+            port = int(self.control_port_entry.get().strip())
+            if not 1024 <= port <= 65535:
+                raise ValueError
+        except ValueError:
+            self.control_api_checkbox.deselect()
+            self.show_error("操作APIのポートには1024〜65535の数値を入力してください。")
+            return
+        server = ControlServer(self, port)
+        try:
+            server.start()
+        except OSError as e:
+            self.control_api_checkbox.deselect()
+            self.show_error(f"操作APIを開始できませんでした（ポート {port}）: {e}")
+            return
+        self.control_server = server
+        self._publish_control_status()
+
+    def _publish_control_status(self):
+        """操作APIが返す状態を作り直す（GUIスレッドで呼ぶ。サーバー側は辞書ごと入れ替わったものを読むだけ）"""
+        if self.control_server is None:
+            return
+        self.control_server.status = {
+            "running": run_audio_thread,
+            "engine_process": engine_process is not None,
+            "app_preset": self._get_applied_app_preset_name(),
+            "obs_preset": self._get_applied_obs_preset_name(),
+            "presets": self.app_presets.names(),
+            "threshold_min": int(self.threshold_min_slider.get()),
+            "threshold_max": int(self.threshold_max_slider.get()),
+            "rms": self.last_rms,
+            "metrics": dict(engine_metrics),
+            "obs_targets": self.obs_target_metrics,
+        }
+
+    def control_apply_preset(self, preset_name):
+        return self.apply_app_preset(preset_name)
+
+    def control_start(self):
+        if not run_audio_thread:
+            self.on_start()
+        return run_audio_thread
+
+    def control_stop(self):
+        if run_audio_thread:
+            self.on_stop()
+        return True
+
+    def control_show_thresholds(self, threshold_min, threshold_max):
+        """操作APIで変えた閾値を画面に反映する（動作中の設定はすでに差し替え済み）"""
+        self.threshold_min_slider.set(threshold_min)
+        self.threshold_max_slider.set(threshold_max)
+        self.update_volume_labels_from_slider()
+
+    def on_calibrate_now(self):
+        thresholds = level_calibrator.estimate()
+        if thresholds is None:
+            self.show_error("音量データが不足しています。▶ 開始 を押して数秒間話してから、もう一度お試しください。")
+            return
+        update_engine_config(threshold_min=thresholds[0], threshold_max=thresholds[1])
+        self.apply_calibrated_thresholds(*thresholds, announce=True)
+
+    def apply_calibrated_thresholds(self, threshold_min, threshold_max, announce=False):
+        """自動調整で求めた閾値をGUIに反映し、適用中のアプリ設定プリセットにも書き戻す"""
+        # 保存済みのプリセットを適用中の場合のみ書き戻す（未保存の変更を勝手に保存しない）
+        if "(保存済)" in self.app_current_preset_label.cget("text"):
+            self.calibration_save_preset = self._get_applied_app_preset_name()
+        # 別プロセスで自動調整した閾値はGUI側の設定にも反映する（次の設定変更で古い閾値を送り返さないように）
+        config = current_engine_config
+        if (config.threshold_min, config.threshold_max) != (threshold_min, threshold_max):
+            update_engine_config(threshold_min=threshold_min, threshold_max=threshold_max)
+
+        self.threshold_min_slider.set(threshold_min)
+        self.threshold_max_slider.set(threshold_max)
+        self.update_volume_labels_from_slider()
+        if announce:
+            self.status_label.configure(text=f"✅ 閾値を自動調整しました（{threshold_min}〜{threshold_max}）", text_color="green")
+
+        if self.calibration_save_preset is not None:
+            if self.calibration_save_job is not None:
+                self.after_cancel(self.calibration_save_job)
+            self.calibration_save_job = self.after(CALIBRATION_SAVE_DELAY_MS, self._save_calibrated_thresholds_to_preset)
+
+    def _save_calibrated_thresholds_to_preset(self):
+        preset_name = self.calibration_save_preset
+        self.calibration_save_job = None
+        self.calibration_save_preset = None
+        if preset_name is None or preset_name != self._get_applied_app_preset_name():
+            return
+
+        data = self.app_presets.get(preset_name)
+        try:
+            if data is None:
+                raise FileNotFoundError(self.app_presets.path(preset_name))
+            data["threshold_min"] = self.threshold_min_slider.get()
+            data["threshold_max"] = self.threshold_max_slider.get()
+            self.app_presets.save(preset_name, data)
+        except Exception as e:
+            log.warning(f"⚠ 自動調整した閾値をプリセットに保存できませんでした: {e}")
+            return
+        self.app_current_preset_label.configure(text=f"適用中: {preset_name} (保存済)")
+        self.app_preset_var.set(f"アプリ設定: {preset_name} (保存済)")
+
     def on_closing(self):
         global run_audio_thread
-        if run_audio_thread:
+        if self.control_server is not None:
+            self.control_server.stop()
+        if self.search_job is not None:
+            self.search_job.cancel()
+        if audio_loop_wanted():
             stop_audio_thread()
+        watchdog.stop()
+        log.stop()
         self.destroy()
 
     def update_volume_monitor(self):
+        watchdog.beat("gui")
         try:
-            while not audio_data_queue.empty():
-                rms = audio_data_queue.get_nowait()
+            levels = level_ring.read()
+            if engine_process is not None:
+                # 別プロセスで動かしているときは、手動の閾値調整に使う統計と動作状況をGUI側でも持つ
+                for rms in levels:
+                    level_calibrator.add(float(rms))
+                engine_metrics.update(level_ring.metrics())
+            if len(levels) > 0:
+                # 表示するのは最新の値だけでよい
+                rms = self.last_rms = float(levels[-1])
                 normalized_volume = min(1.0, rms / MAX_RMS_VALUE)
                 self.volume_progress.set(normalized_volume)
                 
@@ -1432,10 +4969,18 @@ class App(ctk.CTk):
                     progress_color = "green"
                 
                 self.volume_progress.configure(progress_color=progress_color)
-        except queue.Empty:
-            pass
         finally:
-            self.after(50, self.update_volume_monitor)
+            if run_audio_thread:
+                text = format_engine_metrics()
+                if self.obs_target_metrics:
+                    text += "\n" + format_obs_target_metrics(self.obs_target_metrics)
+                request_text = format_request_metrics(*current_engine_config.obs_settings[:2])
+                if request_text:
+                    text += "\n" + request_text
+                self.metrics_label.configure(text=text)
+            self._publish_control_status()
+            # 省電力待機中は再描画の頻度も下げる
+            self.after(IDLE_MONITOR_INTERVAL_MS if engine_metrics["idle"] else 50, self.update_volume_monitor)
 
     def _change_threshold_value(self, slider_obj, entry_obj, change_amount):
         """スライダーとエントリーの値を変更するヘルパーメソッド"""
@@ -1493,6 +5038,67 @@ class App(ctk.CTk):
         # テキストボックスを読み取り専用にする
         manual_textbox.configure(state="disabled")
 
+    def show_log_viewer(self):
+        """ログの履歴を表示するウィンドウを開く（開いている間は新しい記録を追加していく）"""
+        if self.log_window is not None and self.log_window.winfo_exists():
+            self.log_window.lift()
+            return
+        log_window = self.log_window = ctk.CTkToplevel(self)
+        log_window.title("ログ")
+        log_window.geometry("700x400")
+        log_window.after(10, log_window.lift)
+
+        option_frame = ctk.CTkFrame(log_window, fg_color="transparent")
+        option_frame.pack(fill="x", padx=10, pady=(10, 0))
+        ctk.CTkLabel(option_frame, text="表示するレベル:").pack(side="left", padx=(0, 5))
+        display_level_var = ctk.StringVar(value="INFO")
+        ctk.CTkOptionMenu(option_frame, values=list(LOG_LEVELS), variable=display_level_var, width=100,
+                          command=lambda _: reload()).pack(side="left")
+        ctk.CTkLabel(option_frame, text="ファイルに残すレベル:").pack(side="left", padx=(15, 5))
+        file_level_var = ctk.StringVar(value=LOG_LEVEL_NAMES[self.log_file.level])
+        ctk.CTkOptionMenu(option_frame, values=list(LOG_LEVELS), variable=file_level_var, width=100,
+                          command=self.on_log_file_level_change).pack(side="left")
+
+        log_textbox = ctk.CTkTextbox(log_window, wrap="none")
+        log_textbox.pack(fill="both", expand=True, padx=10, pady=10)
+        log_textbox.configure(state="disabled")
+        last_seq = -1
+
+        def append(records):
+            if not records:
+                return
+            log_textbox.configure(state="normal")
+            log_textbox.insert("end", "".join(format_log_record(record) + "\n" for record in records))
+            log_textbox.configure(state="disabled")
+            log_textbox.see("end")
+
+        def reload():
+            nonlocal last_seq
+            last_seq = -1
+            log_textbox.configure(state="normal")
+            log_textbox.delete("1.0", "end")
+            log_textbox.configure(state="disabled")
+            refresh(schedule=False)
+
+        def refresh(schedule=True):
+            nonlocal last_seq
+            if not log_window.winfo_exists():
+                return
+            # 表示しないレベルの記録も読んだことにする（次回から新しいものだけを見る）
+            records = log.recent(last_seq)
+            if records:
+                min_level = LOG_LEVELS[display_level_var.get()]
+                append([record for record in records if record[2] >= min_level])
+                last_seq = records[-1][0]
+            if schedule:
+                log_window.after(LOG_VIEWER_INTERVAL_MS, refresh)
+
+        refresh()
+
+    def on_log_file_level_change(self, level_name):
+        self.log_file.level = LOG_LEVELS[level_name]
+        self.save_auto_load_settings()
+
 if __name__ == "__main__":
     app = App()
     app.mainloop()
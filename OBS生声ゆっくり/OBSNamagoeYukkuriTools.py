@@ -0,0 +1,1030 @@
+"""OBS生声ゆっくり 補助ツール
+
+使い方:
+    python OBSNamagoeYukkuriTools.py vowel-bench [--clips-dir DIR] [--write-clips] [--speakers N] [--check]
+    python OBSNamagoeYukkuriTools.py spritesheet 画像フォルダ [-o 出力.png] [--columns N]
+    python OBSNamagoeYukkuriTools.py replay [トレースファイル] [--preset プリセット.json] [--set 項目=値 ...] [--check]
+    python OBSNamagoeYukkuriTools.py analysis-bench [--channels N] [--chunks N] [--check]
+    python OBSNamagoeYukkuriTools.py soak [--cycles N] [--speed N] [--check]
+    python OBSNamagoeYukkuriTools.py start-bench [--rounds N] [--reset-frames N] [--check]
+"""
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import math
+import os
+import re
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import wave
+
+import numpy as np
+
+import OBSNamagoeYukkuriScript as yukkuri
+
+
+# ====== 母音判定ベンチマーク ======
+# 合成クリップのフォルマント（F1, F2, F3）[Hz]。日本語5母音の話者グループ別の代表的な測定値を丸めたもので、
+# 判定側の VOWEL_FORMANTS（成人男性の1組だけ）とは別に、女性・子どもの高いフォルマントも含めて用意する。
+VOWEL_BENCH_FORMANTS = {
+    "男性": {"a": (750, 1180, 2600), "i": (280, 2200, 3000), "u": (330, 1300, 2300), "e": (480, 1850, 2500), "o": (480, 820, 2500)},
+    "女性": {"a": (950, 1500, 2900), "i": (330, 2750, 3300), "u": (380, 1600, 2800), "e": (560, 2300, 2950), "o": (560, 950, 2900)},
+    "子ども": {"a": (1100, 1700, 3300), "i": (380, 3100, 3700), "u": (430, 1800, 3200), "e": (650, 2600, 3500), "o": (650, 1100, 3300)},
+}
+VOWEL_BENCH_F0 = {"男性": (95.0, 150.0), "女性": (175.0, 250.0), "子ども": (225.0, 300.0)} # 話者ごとの声の高さの範囲[Hz]
+VOWEL_SPEAKER_SPREAD = 0.06 # 話者ごとの声道の長さの違い（フォルマント全体の倍率の標準偏差）
+VOWEL_TOKEN_SPREAD = 0.05 # 同じ話者でも発声ごとに変わるフォルマントのばらつき（標準偏差, 割合）
+VOWEL_BANDWIDTHS = (80.0, 100.0, 150.0) # 合成に使うフォルマント帯域幅[Hz]
+VOWEL_CLIP_SECONDS = 0.5
+VOWEL_BENCH_SEGMENT = 6 # 話すときのように、話者ごとのクリップをこのチャンク数（約140ms）ずつに区切って混ぜて判定する
+VOWEL_MIN_ACCURACY = 0.9 # --check で求める全体の正解率
+VOWEL_MIN_VOWEL_ACCURACY = 0.75 # --check で求める母音ごとの正解率
+
+def synthesize_vowel(formants, f0, seconds=VOWEL_CLIP_SECONDS, rate=yukkuri.RATE, amplitude=8000, rng=None):
+    """インパルス列を共振器（formants の各周波数）の縦続接続に通して、母音波形（int16）を合成する"""
+    rng = rng if rng is not None else np.random.default_rng(0)
+    n = int(seconds * rate)
+    source = np.zeros(n)
+    t = 0.0
+    while t < n:
+        source[int(t)] = 1.0
+        t += rate / (f0 * (1.0 + 0.02 * rng.standard_normal())) # わずかな揺らぎを加える
+    signal = source
+    for freq, bandwidth in zip(formants, VOWEL_BANDWIDTHS):
+        r = np.exp(-np.pi * bandwidth / rate)
+        c1 = 2 * r * np.cos(2 * np.pi * freq / rate)
+        c2 = -r * r
+        out = np.zeros(n)
+        y1 = y2 = 0.0
+        for i in range(n):
+            y = signal[i] + c1 * y1 + c2 * y2
+            out[i] = y
+            y2, y1 = y1, y
+        signal = out
+    signal += 0.01 * np.abs(signal).max() * rng.standard_normal(n)
+    signal *= amplitude / np.abs(signal).max()
+    return signal.astype(np.int16)
+
+def synthesize_speakers(speakers, seed=0):
+    """話者グループを順に回して speakers 人ぶんの5母音を合成し、(母音, 波形, サンプリング周波数, 話者) のリストを返す
+
+    話者ごとに声の高さと声道の長さ（フォルマント全体の倍率）を変え、発声ごとにもフォルマントを少しずらす。
+    """
+    rng = np.random.default_rng(seed)
+    groups = list(VOWEL_BENCH_FORMANTS)
+    clips = []
+    for number in range(speakers):
+        group = groups[number % len(groups)]
+        f0 = rng.uniform(*VOWEL_BENCH_F0[group])
+        scale = np.exp(VOWEL_SPEAKER_SPREAD * rng.standard_normal())
+        speaker = f"{group}{number // len(groups) + 1:02d}"
+        for vowel in yukkuri.VOWEL_KEYS:
+            formants = np.array(VOWEL_BENCH_FORMANTS[group][vowel]) * scale * np.exp(VOWEL_TOKEN_SPREAD * rng.standard_normal(3))
+            clips.append((vowel, synthesize_vowel(np.sort(formants), f0, rng=rng), yukkuri.RATE, speaker))
+    return clips
+
+def write_wav(path, samples, rate=yukkuri.RATE):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+def read_wav(path):
+    with wave.open(path, "rb") as f:
+        if f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise ValueError(f"モノラル16bitのWAVのみ対応しています: {path}")
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16), f.getframerate()
+
+def load_labeled_clips(clips_dir):
+    """"<母音>.wav" / "<母音>_任意.wav" という名前のクリップを読み込む（"_" のあとを話者名として扱う）"""
+    clips = []
+    for file_name in sorted(os.listdir(clips_dir)):
+        label, _, speaker = file_name[:-len(".wav")].partition("_")
+        if file_name.endswith(".wav") and label in yukkuri.VOWEL_KEYS:
+            samples, rate = read_wav(os.path.join(clips_dir, file_name))
+            clips.append((label, samples, rate, speaker or "-"))
+    return clips
+
+def run_vowel_bench(args):
+    if os.path.isdir(args.clips_dir) and not args.write_clips:
+        clips = load_labeled_clips(args.clips_dir)
+        print(f"クリップ: {args.clips_dir}（{len(clips)}個）")
+    else:
+        clips = synthesize_speakers(args.speakers)
+        print(f"クリップ: 合成（日本語5母音のフォルマント, {args.speakers}人 × 5母音, 話者ごとのばらつきあり）")
+        if args.write_clips:
+            os.makedirs(args.clips_dir, exist_ok=True)
+            for vowel, samples, rate, speaker in clips:
+                write_wav(os.path.join(args.clips_dir, f"{vowel}_{speaker}.wav"), samples, rate)
+            print(f"✅ ラベル付きクリップを書き出しました: {args.clips_dir}")
+    if not clips:
+        print("❌ クリップが見つかりませんでした。")
+        return 1
+
+    # 話者ごとに、クリップを VOWEL_BENCH_SEGMENT チャンクずつに区切って混ぜる（話者の倍率の推定は話者ごとに始める）
+    rng = np.random.default_rng(0)
+    speakers = collections.defaultdict(list)
+    for label, samples, rate, speaker in clips:
+        chunks = [samples[start:start + yukkuri.CHUNK] for start in range(0, samples.size - yukkuri.CHUNK + 1, yukkuri.CHUNK)]
+        for i in range(0, len(chunks), VOWEL_BENCH_SEGMENT):
+            speakers[speaker].append((label, rate, chunks[i:i + VOWEL_BENCH_SEGMENT]))
+
+    # 正解率: チャンクごとに判定し、母音ごと・誤りの内訳を数える
+    results = {vowel: collections.Counter() for vowel in yukkuri.VOWEL_KEYS}
+    groups = collections.defaultdict(lambda: [0, 0]) # 話者名から番号を除いたもの → [正解, チャンク数]
+    timed = []
+    for speaker, segments in speakers.items():
+        classifier = yukkuri.VowelClassifier()
+        group = groups[speaker.rstrip("0123456789_-")]
+        for i in rng.permutation(len(segments)):
+            label, rate, chunks = segments[i]
+            for chunk in chunks:
+                timed.append((chunk, rate))
+                vowel = classifier.classify(chunk, rate)
+                results[label][vowel] += 1
+                group[0] += vowel == label
+                group[1] += 1
+    print("正解率（チャンクごと）:")
+    total = correct = 0
+    failed = []
+    for vowel, counts in results.items():
+        count = sum(counts.values())
+        if not count:
+            continue
+        total += count
+        correct += counts[vowel]
+        errors = ", ".join(f"{yukkuri.VOWEL_LABELS.get(guess, '判定不能')} {n}" for guess, n in counts.most_common() if guess != vowel)
+        print(f"  {yukkuri.VOWEL_LABELS[vowel]}: {counts[vowel]}/{count} ({counts[vowel] / count:.0%})" + (f" 誤り: {errors}" if errors else ""))
+        if counts[vowel] / count < VOWEL_MIN_VOWEL_ACCURACY:
+            failed.append(f"「{yukkuri.VOWEL_LABELS[vowel]}」の正解率 {counts[vowel] / count:.0%}（{VOWEL_MIN_VOWEL_ACCURACY:.0%} 未満）")
+    accuracy = correct / max(total, 1)
+    print(f"  全体: {correct}/{total} ({accuracy:.1%})")
+    if len(groups) > 1:
+        print("  話者ごと: " + ", ".join(f"{name} {hits / count:.0%}" for name, (hits, count) in groups.items()))
+    if accuracy < VOWEL_MIN_ACCURACY:
+        failed.append(f"全体の正解率 {accuracy:.1%}（{VOWEL_MIN_ACCURACY:.0%} 未満）")
+
+    # 処理時間: 正解率とは別に、同じチャンクを判定し直して測る
+    classifier = yukkuri.VowelClassifier()
+    timings = np.zeros(len(timed))
+    for i, (chunk, rate) in enumerate(timed):
+        t0 = time.perf_counter()
+        classifier.classify(chunk, rate)
+        timings[i] = time.perf_counter() - t0
+    timings *= 1000
+    chunk_ms = yukkuri.CHUNK / yukkuri.RATE * 1000
+    print(f"処理時間/チャンク: 平均 {timings.mean():.3f}ms, 99%点 {np.percentile(timings, 99):.3f}ms（チャンク周期 {chunk_ms:.1f}ms, {len(timed)}チャンク）")
+
+    if failed:
+        print("⚠ " + ", ".join(failed))
+        return 1 if args.check else 0
+    print(f"✅ 正解率は基準（全体 {VOWEL_MIN_ACCURACY:.0%}, 母音ごと {VOWEL_MIN_VOWEL_ACCURACY:.0%}）を満たしています")
+    return 0
+
+
+# ====== スプライトシート作成 ======
+SPRITE_IMAGE_PATTERN = re.compile(r"^(\d+)\.(png|jpe?g|bmp|gif|webp)$", re.IGNORECASE)
+OBS_MAX_TEXTURE_SIZE = 16384 # OBSで扱えるテクスチャの最大辺
+
+def run_spritesheet(args):
+    """番号付き画像（1.png, 2.png, ...）を1枚のスプライトシートと情報ファイル（.json）にまとめる"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("❌ スプライトシートの作成には Pillow が必要です。「pip install pillow」でインストールしてください。")
+        return 1
+
+    numbered = []
+    for file_name in os.listdir(args.image_dir):
+        match = SPRITE_IMAGE_PATTERN.match(file_name)
+        if match:
+            numbered.append((int(match.group(1)), file_name))
+    if not numbered:
+        print(f"❌ 番号付きの画像が見つかりませんでした: {args.image_dir}")
+        return 1
+    numbered.sort()
+
+    images = [Image.open(os.path.join(args.image_dir, file_name)).convert("RGBA") for _, file_name in numbered]
+    frame_width = max(image.width for image in images)
+    frame_height = max(image.height for image in images)
+    columns = args.columns or math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    if max(columns * frame_width, rows * frame_height) > OBS_MAX_TEXTURE_SIZE:
+        print(f"⚠ シートの大きさ（{columns * frame_width}x{rows * frame_height}）がOBSの上限 {OBS_MAX_TEXTURE_SIZE} を超えています。--columns で調整してください。")
+
+    sheet = Image.new("RGBA", (columns * frame_width, rows * frame_height), (0, 0, 0, 0))
+    for cell, image in enumerate(images):
+        sheet.paste(image, ((cell % columns) * frame_width, (cell // columns) * frame_height))
+        image.close()
+
+    output = args.output or os.path.join(args.image_dir, "spritesheet.png")
+    sheet.save(output)
+    metadata = {
+        "columns": columns,
+        "rows": rows,
+        "frame_width": frame_width,
+        "frame_height": frame_height,
+        "frames": [ordinal for ordinal, _ in numbered],
+    }
+    metadata_path = os.path.splitext(output)[0] + yukkuri.SPRITE_METADATA_SUFFIX
+    with open(metadata_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=4)
+    print(f"✅ {len(images)}コマのスプライトシートを作成しました: {output}（{columns}列 x {rows}行, 1コマ {frame_width}x{frame_height}）")
+    print(f"✅ 情報ファイル: {metadata_path}（シート画像と同じフォルダに置いたままにしてください）")
+    return 0
+
+
+# ====== トレースの再生 ======
+class MockOBS:
+    """OBSの代わりに要求の数だけを数えるモック（トレースの再生用）"""
+    def __init__(self):
+        self.requests = 0
+
+    def set_visible(self, scene_name, item_id, visible):
+        self.requests += 1
+
+    def set_scene_item_transform(self, scene_name, item_id, transform):
+        self.requests += 1
+
+def parse_config_overrides(preset_path, assignments):
+    """--preset のアプリ設定プリセットと --set 項目=値 から、再生時に上書きする設定を作る"""
+    overrides = {}
+    if preset_path:
+        with open(preset_path, "r") as f:
+            preset = json.load(f)
+        overrides.update({key: preset[key] for key in yukkuri.TRACE_CONFIG_KEYS if key in preset})
+    for assignment in assignments:
+        key, _, value = assignment.partition("=")
+        if key not in yukkuri.TRACE_CONFIG_KEYS:
+            raise ValueError(f"上書きできない項目です: {key}（{', '.join(yukkuri.TRACE_CONFIG_KEYS)}）")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+def recorded_frames(records):
+    """記録時に各チャンクの後で表示していたコマ（最初に切り替えを記録するまでは-1）"""
+    frames = np.empty(len(records), dtype=np.int32)
+    current = -1
+    for i, (index, flags) in enumerate(zip(records["index"].tolist(), records["flags"].tolist())):
+        if flags & yukkuri.TRACE_FLAG_SHOWN:
+            current = index
+        frames[i] = current
+    return frames
+
+def replay_trace(info, records, overrides=None):
+    """記録した音量を設定の履歴どおりに FrameSelector とモックのOBSへ流す
+
+    (各チャンクの後に表示しているコマ, コマの切り替え回数, OBSへの要求数) を返す。
+    """
+    obs = MockOBS()
+    switches = 0
+    configs = sorted(info["configs"], key=lambda entry: entry["seq"])
+    next_config = 0
+    selector = renderer = None
+    frames = np.full(len(records), -1, dtype=np.int32)
+    times = (records["t"] + info["start_time"]).tolist()
+    for i, (now, rms, vowel, flags) in enumerate(zip(times, records["rms"].tolist(), records["vowel"].tolist(), records["flags"].tolist())):
+        seq = info["first_seq"] + i
+        while next_config < len(configs) and configs[next_config]["seq"] <= seq:
+            entry = configs[next_config]
+            next_config += 1
+            config = yukkuri.EngineConfig(**dict(entry["config"], **(overrides or {})))
+            if selector is None or entry["ordinals"] != selector.ordinals:
+                selector = yukkuri.FrameSelector(config, entry["ordinals"])
+                renderer = yukkuri.VisibilityRenderer(obs, "replay", list(range(len(entry["ordinals"]))), entry["ordinals"])
+                renderer.reset()
+            else:
+                selector.reconfigure(config)
+        if selector is None:
+            continue # 設定の履歴が残っていない古いチャンク
+        if flags & yukkuri.TRACE_FLAG_IDLE:
+            frames[i] = selector.prev_index
+            continue
+        index = selector.choose(rms, yukkuri.VOWEL_KEYS[vowel] if vowel >= 0 else None)
+        prev_index = selector.prev_index
+        if selector.commit(index, now):
+            renderer.show(index, prev_index)
+            switches += 1
+        frames[i] = selector.prev_index
+    return frames, switches, obs.requests
+
+def find_latest_trace():
+    if not os.path.isdir(yukkuri.TRACE_FOLDER):
+        return None
+    traces = sorted(f for f in os.listdir(yukkuri.TRACE_FOLDER) if f.endswith(yukkuri.TRACE_SUFFIX))
+    return os.path.join(yukkuri.TRACE_FOLDER, traces[-1]) if traces else None
+
+def run_replay(args):
+    trace_path = args.trace or find_latest_trace()
+    if not trace_path:
+        print(f"❌ トレースファイルが見つかりませんでした（{yukkuri.TRACE_FOLDER} フォルダ）。")
+        return 1
+    try:
+        info, records = yukkuri.read_trace(trace_path)
+        overrides = parse_config_overrides(args.preset, args.set)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    if len(records) == 0 or not info["configs"]:
+        print("❌ トレースに記録がありません。")
+        return 1
+
+    t0 = time.perf_counter()
+    frames, switches, request_count = replay_trace(info, records, overrides)
+    elapsed = time.perf_counter() - t0
+
+    recorded = recorded_frames(records)
+    compared = recorded >= 0
+    mismatches = np.flatnonzero(compared & (frames != recorded))
+    shown = (records["flags"] & yukkuri.TRACE_FLAG_SHOWN) != 0
+    duration = float(records["t"][-1] - records["t"][0]) + yukkuri.CHUNK / yukkuri.RATE
+
+    print(f"トレース: {trace_path}（{len(records)}チャンク, {duration:.1f}秒, 設定の差し替え {len(info['configs']) - 1}回）")
+    if info["first_seq"]:
+        print(f"⚠ リングが一周しているため、最初の {info['first_seq']} チャンクは残っていません。")
+    if overrides:
+        print(f"上書きした設定: {json.dumps(overrides, ensure_ascii=False)}")
+    print(f"コマの切り替え: 記録 {int(shown.sum())}回 / 再生 {switches}回（再生時のOBSへの要求 {request_count}回）")
+    if shown.any():
+        request_ms = records["request_ms"][shown]
+        print(f"送信スレッドに預ける時間: 平均 {request_ms.mean():.2f}ms, 99%点 {np.percentile(request_ms, 99):.2f}ms, 最大 {request_ms.max():.2f}ms")
+    sent = (records["flags"] & yukkuri.TRACE_FLAG_SENT) != 0
+    if sent.any():
+        for label, values in (("OBSへの送信を待った時間", records["wait_ms"][sent]), ("OBSへのバッチ要求の送信時間", records["send_ms"][sent])):
+            print(f"{label}: 平均 {values.mean():.2f}ms, 99%点 {np.percentile(values, 99):.2f}ms, 最大 {values.max():.2f}ms（{int(sent.sum())}回）")
+    rtt_ms = records["rtt_ms"][records["rtt_ms"] > 0]
+    if len(rtt_ms):
+        print(f"OBSとの往復時間: 中央値 {np.median(rtt_ms):.2f}ms, 最大 {rtt_ms.max():.2f}ms")
+    print(f"解析時間/チャンク: 99%点 {np.percentile(records['analysis_ms'], 99):.3f}ms")
+    print(f"再生時間: {elapsed * 1000:.0f}ms（実時間の {duration / max(elapsed, 1e-9):.0f}倍速）")
+
+    if len(mismatches):
+        first = mismatches[0]
+        print(f"⚠ 表示コマの不一致: {len(mismatches)}/{int(compared.sum())}チャンク（最初は {records['t'][first]:.3f}秒, 記録 {recorded[first]} / 再生 {frames[first]}）")
+    else:
+        print(f"✅ 表示コマは記録と一致しました（{int(compared.sum())}チャンク）")
+    return 1 if args.check and len(mismatches) else 0
+
+
+# ====== 音量解析のベンチマーク ======
+ANALYSIS_BENCH_WARMUP = 1000 # 計測前に捨てるチャンク数（作業用配列の確保やキャッシュを済ませる）
+ANALYSIS_TRANSIENT_LIMIT = 4096 # --check で許す1チャンク内の一時確保[バイト]（配列のビューなど小さなオブジェクトの分。1チャンク分の配列は1チャンネルでも8KB）
+ONSET_THRESHOLDS = (100, 1200) # 口の開き方を比べるときの閾値（下限, 上限）
+
+def measure_analysis(analyze, chunks, count):
+    """count チャンク分 analyze を呼び、1チャンクあたりの処理時間[µs]の配列と、メモリの増加量・1チャンク内の一時確保の最大量を返す
+
+    確保した配列はチャンクの終わりに解放されるので、全体の増加量では作業用配列の再利用の有無は分からない。
+    チャンクごとに tracemalloc のピークを測り直し、1回の解析の間に一時的に確保した量の最大を見る。
+    """
+    for i in range(ANALYSIS_BENCH_WARMUP):
+        analyze(chunks[i % len(chunks)])
+
+    times = np.zeros(count)
+    for i in range(count):
+        t0 = time.perf_counter()
+        analyze(chunks[i % len(chunks)])
+        times[i] = time.perf_counter() - t0
+
+    transient = 0
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        for i in range(count):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            analyze(chunks[i % len(chunks)])
+            _, peak = tracemalloc.get_traced_memory()
+            transient = max(transient, peak - before)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times * 1e6, after - start, transient
+
+def synthesize_syllables(seconds, rng, rate=yukkuri.RATE, amplitude=1500.0):
+    """無音をはさんで、長さと音量がばらばらの音節（減衰する雑音）が続く波形と、各音節の開始サンプルを返す"""
+    n = int(seconds * rate)
+    signal = rng.normal(0.0, 20.0, n)
+    onsets = []
+    position = int(rng.uniform(0.05, 0.2) * rate)
+    while position < n:
+        length = int(rng.uniform(0.08, 0.25) * rate)
+        end = min(n, position + length)
+        decay = np.exp(-np.arange(end - position) / (length / 2.0))
+        signal[position:end] += rng.normal(0.0, amplitude * rng.uniform(0.6, 1.4), end - position) * decay
+        onsets.append(position)
+        position = end + int(rng.uniform(0.08, 0.3) * rate)
+    return np.clip(signal, -32768, 32767).astype(np.int16), onsets
+
+def mouth_response(analyzer, signal, onsets, threshold_min, threshold_max, n_images=8):
+    """チャンクごとに音量をコマに変換し、音節の開始から口が半分以上開くまでの遅れ[ms]の配列と、
+    コマの切り替え回数・開く／閉じるの向きが反転した回数（ばたつき）を返す"""
+    mapper = yukkuri.LevelMapper(threshold_min, threshold_max, n_images)
+    chunk = yukkuri.CHUNK
+    indices = []
+    prev_index = 0
+    for start in range(0, len(signal) - chunk + 1, chunk):
+        prev_index = mapper.index(float(analyzer.measure(signal[start:start + chunk].reshape(-1, 1))[0]), prev_index)
+        indices.append(prev_index)
+    indices = np.array(indices)
+    shown_at = (np.arange(len(indices)) + 1) * chunk # コマが届くのはチャンクを読み終えた時点
+    delays = []
+    for i, onset in enumerate(onsets):
+        first = int(np.searchsorted(shown_at, onset))
+        last = int(np.searchsorted(shown_at, onsets[i + 1])) if i + 1 < len(onsets) else len(indices)
+        if first >= last or indices[first:last].max() == 0:
+            continue
+        opened = first + int(np.argmax(indices[first:last] >= indices[first:last].max() / 2))
+        delays.append((shown_at[opened] - onset) / yukkuri.RATE * 1000)
+    steps = np.diff(indices)
+    steps = steps[steps != 0]
+    reversals = int(np.sum(np.diff(np.sign(steps)) != 0))
+    return np.array(delays), len(steps), reversals
+
+def run_analysis_bench(args):
+    channels = args.channels
+    rng = np.random.default_rng(0)
+    # 録音データの代わりに、チャンネルごとに音量の違う雑音を使う
+    chunks = [(rng.normal(0.0, 1000.0, (yukkuri.CHUNK, channels)) * np.arange(1, channels + 1)).astype(np.int16).tobytes() for _ in range(16)]
+    ring = yukkuri.LevelRing(bytearray(yukkuri.LevelRing.size()))
+    analyzer = yukkuri.LevelAnalyzer(channels)
+    envelope = yukkuri.EnvelopeAnalyzer(channels)
+
+    def analyze_previous(raw):
+        frames = yukkuri.split_channels(np.frombuffer(raw, dtype=np.int16), channels)
+        ring.publish(float(yukkuri.channel_levels(frames)[0]))
+
+    def analyze_preallocated(raw):
+        frames = yukkuri.split_channels(np.frombuffer(raw, dtype=np.int16), channels)
+        ring.publish(float(analyzer.measure(frames)[0]))
+
+    def analyze_envelope(raw):
+        frames = yukkuri.split_channels(np.frombuffer(raw, dtype=np.int16), channels)
+        ring.publish(float(envelope.measure(frames)[0]))
+
+    for raw in chunks:
+        frames = yukkuri.split_channels(np.frombuffer(raw, dtype=np.int16), channels)
+        if not np.allclose(analyzer.measure(frames), yukkuri.channel_levels(frames)):
+            print("❌ 作業用配列を使った計算結果が channel_levels と一致しません。")
+            return 1
+        # 時定数0の包絡線は、チャンクの最後のブロックのRMSそのものになる
+        last_block = frames[-yukkuri.ENVELOPE_BLOCK:].astype(np.float64)
+        if not np.allclose(yukkuri.EnvelopeAnalyzer(channels, 0, 0).measure(frames), np.sqrt((last_block ** 2).mean(axis=0))):
+            print("❌ 包絡線の計算結果がブロックごとのRMSと一致しません。")
+            return 1
+
+    print(f"解析: {channels}チャンネル × {yukkuri.CHUNK}サンプル/チャンク, {args.chunks}チャンク")
+    transients = []
+    for label, analyze in (("チャンクごとに確保", analyze_previous), ("作業用配列を再利用", analyze_preallocated), ("包絡線", analyze_envelope)):
+        times, growth, transient = measure_analysis(analyze, chunks, args.chunks)
+        transients.append(transient)
+        print(f"{label}: 平均 {times.mean():.1f}µs, 99%点 {np.percentile(times, 99):.1f}µs / "
+              f"メモリ増加 {growth}バイト, 1チャンク内の一時確保 最大 {transient}バイト")
+
+    # 合成した音節で、口が開くまでの遅れとコマの切り替え回数を比べる
+    signal, onsets = synthesize_syllables(30.0, rng)
+    print(f"音節: {len(onsets)}個（30秒）, 閾値 {ONSET_THRESHOLDS[0]}〜{ONSET_THRESHOLDS[1]}")
+    switches = []
+    for label, detector in (("チャンク平均", yukkuri.LevelAnalyzer(1)), (f"包絡線（アタック {yukkuri.DEFAULT_ATTACK_MS:g}ms, リリース {yukkuri.DEFAULT_RELEASE_MS:g}ms）", yukkuri.EnvelopeAnalyzer(1))):
+        delays, flips, reversals = mouth_response(detector, signal, onsets, *ONSET_THRESHOLDS)
+        print(f"{label}: 口が半分開くまで 平均 {delays.mean():.1f}ms, 最大 {delays.max():.1f}ms（{len(delays)}/{len(onsets)}音節） / "
+              f"コマの切り替え {flips}回（向きの反転 {reversals}回）")
+        switches.append(flips)
+
+    failed = False
+    if switches[1] > switches[0]:
+        print(f"⚠ 包絡線のコマの切り替え（{switches[1]}回）がチャンク平均（{switches[0]}回）より多くなりました")
+        failed = True
+    else:
+        print(f"✅ 包絡線のコマの切り替え（{switches[1]}回）はチャンク平均（{switches[0]}回）以下でした")
+    # チャンクごとに確保する従来の解析は、この確認に引っかからなければならない（引っかからなければ計測がおかしい）
+    if transients[0] <= ANALYSIS_TRANSIENT_LIMIT:
+        print(f"❌ チャンクごとに確保する解析の一時確保（{transients[0]}バイト）が許容量 {ANALYSIS_TRANSIENT_LIMIT}バイト以下で、確認になっていません")
+        failed = True
+    transient = max(transients[1:])
+    if transient > ANALYSIS_TRANSIENT_LIMIT:
+        print(f"⚠ 作業用配列を再利用する解析で、1チャンク内に {transient}バイト確保しました（許容 {ANALYSIS_TRANSIENT_LIMIT}バイト）")
+        failed = True
+    else:
+        print(f"✅ 作業用配列を再利用する解析は、1チャンク内の一時確保が最大 {transient}バイトで、許容 {ANALYSIS_TRANSIENT_LIMIT}バイト以下でした（チャンクごとに確保する解析は {transients[0]}バイト）")
+    return 1 if failed and args.check else 0
+
+
+# ====== 長時間動作の試験（リークの検出） ======
+SOAK_WARMUP_CYCLES = 20 # 基準を測る前に回すサイクル数（初回だけ確保されるものを除く）
+SOAK_SAMPLES = 10 # 途中で資源を測る回数
+SOAK_SETTLE_TIMEOUT = 3.0 # 止めたスレッドや接続が片付くのを待つ最大時間（秒）
+SOAK_CHUNKS_PER_RUN = 5 # 1回の開始で読み取るチャンク数
+SOAK_RSS_LIMIT_MB = 16.0 # --check で許すメモリ（RSS）の増加量
+SOAK_SCENE = "ソーク試験"
+SOAK_GROUP = "口パク"
+SOAK_FRAMES = 10
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class MockObsServer:
+    """obs-websocket（v5）の代わりに、ローカルのポートで要求に答えるモックのサーバー
+
+    接続ごとにスレッドで応答し、開いている接続の数を数える（アプリ側がソケットを閉じ忘れると減らない）。
+    シーン SOAK_SCENE にグループ SOAK_GROUP があり、その中に 1〜frames の画像ソースがある状態を返す。
+    画像を表示する要求を含むバッチ要求が届いた時刻を shown_at に残す（口パクの送信間隔の計測用）。
+    """
+    def __init__(self, frames=SOAK_FRAMES):
+        self.frames = frames
+        self.shown_at = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        while self.running:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _read_exact(self, conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("切断されました")
+            data += chunk
+        return data
+
+    def _read_frame(self, conn):
+        first, second = self._read_exact(conn, 2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self._read_exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._read_exact(conn, 8))[0]
+        mask = self._read_exact(conn, 4) if second & 0x80 else b"\0\0\0\0"
+        payload = bytearray(self._read_exact(conn, length))
+        for i in range(length):
+            payload[i] ^= mask[i % 4]
+        return first & 0x0F, bytes(payload)
+
+    def _send_frame(self, conn, opcode, payload):
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([126]) + struct.pack(">H", len(payload))
+        else:
+            header += bytes([127]) + struct.pack(">Q", len(payload))
+        conn.sendall(header + payload)
+
+    def _send(self, conn, op, data):
+        self._send_frame(conn, 0x1, json.dumps({"op": op, "d": data}).encode("utf-8"))
+
+    def _response(self, request_type, data):
+        items = [{"sourceName": str(i), "sceneItemId": 100 + i, "sourceType": "OBS_SOURCE_TYPE_INPUT"} for i in range(1, self.frames + 1)]
+        if request_type == "GetSceneList":
+            return True, {"scenes": [{"sceneName": SOAK_SCENE}], "currentProgramSceneName": SOAK_SCENE}
+        if request_type == "GetSceneItemList":
+            found = data.get("sceneName") == SOAK_SCENE
+            return found, {"sceneItems": [{"sourceName": SOAK_GROUP, "sceneItemId": 1, "isGroup": True, "sourceType": "OBS_SOURCE_TYPE_SCENE"}] if found else []}
+        if request_type == "GetGroupSceneItemList":
+            found = data.get("sceneName") == SOAK_GROUP
+            return found, {"sceneItems": items if found else []}
+        if request_type == "GetSceneItemId":
+            ids = {item["sourceName"]: item["sceneItemId"] for item in items}
+            return data.get("sourceName") in ids, {"sceneItemId": ids.get(data.get("sourceName"))}
+        if request_type == "GetCurrentProgramScene":
+            return True, {"currentProgramSceneName": SOAK_SCENE}
+        if request_type == "GetCurrentPreviewScene":
+            return False, {} # スタジオモードではない
+        if request_type == "GetVersion":
+            return True, {"obsVersion": "30.0.0", "obsWebSocketVersion": "5.0.0"}
+        return True, {}
+
+    def _serve(self, conn):
+        try:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    return
+                request += chunk
+            key = re.search(rb"Sec-WebSocket-Key:\s*(\S+)", request, re.IGNORECASE).group(1)
+            accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID.encode()).digest()).decode()
+            conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+            self._send(conn, 0, {"obsWebSocketVersion": "5.0.0", "rpcVersion": 1})
+            while True:
+                opcode, payload = self._read_frame(conn)
+                if opcode == 0x8: # 切断
+                    self._send_frame(conn, 0x8, payload[:2])
+                    return
+                if opcode == 0x9:
+                    self._send_frame(conn, 0xA, payload)
+                    continue
+                message = json.loads(payload)
+                d = message.get("d", {})
+                if message.get("op") == 1:
+                    self._send(conn, 2, {"negotiatedRpcVersion": 1})
+                elif message.get("op") == 6:
+                    with self.lock:
+                        self.requests += 1
+                    ok, data = self._response(d["requestType"], d.get("requestData") or {})
+                    self._send(conn, 7, {"requestType": d["requestType"], "requestId": d["requestId"],
+                                         "requestStatus": {"result": ok, "code": 100 if ok else 600}, "responseData": data})
+                elif message.get("op") == 8:
+                    batch = d.get("requests", [])
+                    with self.lock:
+                        self.requests += len(batch)
+                        if any((request.get("requestData") or {}).get("sceneItemEnabled") for request in batch):
+                            self.shown_at.append(time.time())
+                    self._send(conn, 9, {"requestId": d["requestId"], "results": []})
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            conn.close()
+            with self.lock:
+                self.connections -= 1
+
+    def close(self):
+        self.running = False
+        self.listener.close()
+
+class FakeAudioDevice:
+    """pyaudio.PyAudio の代わりに、1つの入力デバイスから合成した音声を返す（開いているハンドル・ストリームを数える）"""
+    NAME = "ソーク試験マイク"
+    HOST_API = "ソーク試験"
+    CHANNELS = 2
+    lock = threading.Lock()
+    open_handles = 0
+    open_streams = 0
+    reads = 0
+    speed = 20.0 # 実時間の何倍の速さで読み取るか
+
+    def __init__(self):
+        with FakeAudioDevice.lock:
+            FakeAudioDevice.open_handles += 1
+        self.terminated = False
+
+    def get_host_api_info_by_index(self, index):
+        return {"name": self.HOST_API, "deviceCount": 1}
+
+    def get_device_info_by_host_api_device_index(self, host_api, index):
+        return {"name": self.NAME, "maxInputChannels": self.CHANNELS, "index": 0}
+
+    def open(self, **options):
+        return FakeAudioStream(options["channels"], options["frames_per_buffer"])
+
+    def terminate(self):
+        if not self.terminated:
+            self.terminated = True
+            with FakeAudioDevice.lock:
+                FakeAudioDevice.open_handles -= 1
+
+class FakeAudioStream:
+    def __init__(self, channels, frames_per_buffer):
+        with FakeAudioDevice.lock:
+            FakeAudioDevice.open_streams += 1
+        rng = np.random.default_rng(0)
+        # 小さい音と大きい音を交互に返して、コマの切り替えも起こす
+        self.chunks = [(rng.normal(0.0, level, (frames_per_buffer, channels))).astype(np.int16).tobytes() for level in (50.0, 4000.0)]
+        self.active = True
+        self.closed = False
+        self.count = 0
+
+    def read(self, frames, exception_on_overflow=True):
+        time.sleep(frames / yukkuri.RATE / FakeAudioDevice.speed)
+        with FakeAudioDevice.lock:
+            FakeAudioDevice.reads += 1
+        self.count += 1
+        return self.chunks[self.count // 3 % 2]
+
+    def is_active(self):
+        return self.active
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            with FakeAudioDevice.lock:
+                FakeAudioDevice.open_streams -= 1
+
+def process_resources():
+    """(ファイル記述子・ハンドル数, ソケット数, RSS[MB])。計測できないものはNone"""
+    if os.path.isdir("/proc/self/fd"):
+        fds = sockets = 0
+        for fd in os.listdir("/proc/self/fd"):
+            try:
+                target = os.readlink(f"/proc/self/fd/{fd}")
+            except OSError:
+                continue # 一覧に使った記述子はもう閉じている
+            fds += 1
+            sockets += target.startswith("socket:")
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        return fds, sockets, rss
+    try:
+        import psutil
+    except ImportError:
+        return None, None, None
+    process = psutil.Process()
+    fds = process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+    connections = getattr(process, "net_connections", None) or process.connections
+    return fds, len(connections(kind="inet")), process.memory_info().rss / 1024 / 1024
+
+def sample_resources(server, baseline=None):
+    """資源の数を測る。baseline があれば、止めたものが片付いて基準以下になるまで少し待つ"""
+    deadline = time.time() + SOAK_SETTLE_TIMEOUT
+    while True:
+        fds, sockets, rss = process_resources()
+        sample = {"threads": threading.active_count(), "fds": fds, "sockets": sockets, "rss_mb": rss,
+                  "obs_connections": server.connections, "audio_handles": FakeAudioDevice.open_handles,
+                  "audio_streams": FakeAudioDevice.open_streams}
+        settled = baseline is None or all(sample[key] is None or sample[key] <= baseline[key] for key in SOAK_COUNTED)
+        if settled or time.time() >= deadline:
+            return sample
+        time.sleep(0.05)
+
+# 増えてはいけない数（RSS は SOAK_RSS_LIMIT_MB までの増加を許す）
+SOAK_COUNTED = ("threads", "fds", "sockets", "obs_connections", "audio_handles", "audio_streams")
+SOAK_LABELS = {"threads": "スレッド", "fds": "ファイル記述子", "sockets": "ソケット", "rss_mb": "RSS[MB]",
+               "obs_connections": "OBSへの接続", "audio_handles": "PyAudio", "audio_streams": "ストリーム"}
+
+def wait_for_reads(count):
+    target = FakeAudioDevice.reads + count
+    deadline = time.time() + SOAK_SETTLE_TIMEOUT
+    while FakeAudioDevice.reads < target and time.time() < deadline:
+        time.sleep(0.001)
+
+def soak_cycle(i, server, configs, presets):
+    """開始・停止、開始し直し、待機からの開始、プリセットの切り替え、画像検索、リストの更新を1回ずつ行う"""
+    app = yukkuri._AppMethodNames() # GUIへの更新要求はメソッド名のまま ui_bus にたまる（同じキーは上書き）
+    obs_settings = ("127.0.0.1", str(server.port), "")
+
+    yukkuri.swap_engine_config(configs[0])
+    yukkuri.start_audio_thread(app)
+    wait_for_reads(SOAK_CHUNKS_PER_RUN)
+    yukkuri.start_audio_thread(app) # 動作中に開始し直す
+    wait_for_reads(SOAK_CHUNKS_PER_RUN)
+
+    # プリセットの保存・読み込みと、動作中の設定の差し替え（2回目は同時に送るOBSも増やす）
+    presets.save("ソーク", {"threshold_min": 100 + i % 50})
+    presets.refresh()
+    presets.get("ソーク")
+    for config in configs[1:]:
+        yukkuri.swap_engine_config(config)
+        wait_for_reads(SOAK_CHUNKS_PER_RUN)
+    # 停止して待機し、待機中のループから開始し直す
+    yukkuri.enter_audio_standby()
+    wait_for_reads(SOAK_CHUNKS_PER_RUN)
+    yukkuri.swap_engine_config(configs[0])
+    yukkuri.resume_audio_engine()
+    wait_for_reads(SOAK_CHUNKS_PER_RUN)
+    yukkuri.stop_audio_thread()
+
+    # 画像検索（ジョブ）とシーン・グループリストの更新
+    finished = threading.Event()
+    job = yukkuri.DiscoveryJob(obs_settings, lambda job, scene_name, group_name, items: None, lambda job: finished.set())
+    job.start()
+    finished.wait(SOAK_SETTLE_TIMEOUT)
+    client = yukkuri.AsyncOBS(obs_settings[0], int(obs_settings[1]), obs_settings[2])
+    if client.connect():
+        for scene_name in client.get_scene_list():
+            client.get_group_list_in_scene(scene_name)
+        client.disconnect()
+    yukkuri.ui_bus.drain()
+
+def format_resources(sample):
+    return ", ".join(f"{SOAK_LABELS[key]} {value:.1f}" if isinstance(value, float) else f"{SOAK_LABELS[key]} {value}"
+                     for key, value in sample.items() if value is not None)
+
+def mock_engine_config(server, speed):
+    """モックのOBSと仮のマイクを使う設定を作る（yukkuri.pyaudio は呼び出し側で差し替えておく）"""
+    FakeAudioDevice.speed = speed
+    obs_settings = ("127.0.0.1", str(server.port), "")
+    # 要求の予算も読み取りの速さに合わせて広げる（予算で待たされて試験が遅くならないように）
+    yukkuri.request_schedulers[yukkuri.request_budget_key(*obs_settings[:2])] = yukkuri.RequestScheduler(rate=yukkuri.OBS_REQUEST_BUDGET * speed)
+    return yukkuri.EngineConfig(
+        obs_settings=obs_settings, scene_name=SOAK_SCENE, group_name=SOAK_GROUP,
+        frames=yukkuri.FrameTable(tuple(range(1, server.frames + 1)), tuple(range(101, server.frames + 101))),
+        mic_device=(FakeAudioDevice.NAME, FakeAudioDevice.HOST_API), threshold_min=200, threshold_max=3000, idle_after=0)
+
+def run_soak(args):
+    server = MockObsServer()
+    original_pyaudio = yukkuri.pyaudio
+    yukkuri.pyaudio = types.SimpleNamespace(PyAudio=FakeAudioDevice, paInt16=original_pyaudio.paInt16)
+    obs_settings = ("127.0.0.1", str(server.port), "")
+    base = mock_engine_config(server, args.speed)
+    configs = [base, base.replace(threshold_min=400, hysteresis=0.2), base.replace(mirror_obs=(("ミラー", obs_settings),))]
+    failed = []
+    with tempfile.TemporaryDirectory() as preset_folder:
+        presets = yukkuri.PresetStore(preset_folder)
+        try:
+            t0 = time.perf_counter()
+            for i in range(SOAK_WARMUP_CYCLES):
+                soak_cycle(i, server, configs, presets)
+            baseline = sample_resources(server)
+            print(f"基準（{SOAK_WARMUP_CYCLES}サイクル後）: {format_resources(baseline)}")
+            interval = max(1, args.cycles // SOAK_SAMPLES)
+            for i in range(1, args.cycles + 1):
+                soak_cycle(i, server, configs, presets)
+                if i % interval == 0 or i == args.cycles:
+                    sample = sample_resources(server, baseline)
+                    print(f"{i}/{args.cycles}サイクル: {format_resources(sample)}")
+            elapsed = time.perf_counter() - t0
+        finally:
+            yukkuri.stop_audio_thread()
+            yukkuri.pyaudio = original_pyaudio
+            server.close()
+
+    for key in SOAK_COUNTED:
+        if sample[key] is not None and sample[key] > baseline[key]:
+            failed.append(f"{SOAK_LABELS[key]} {baseline[key]} → {sample[key]}")
+    if sample["rss_mb"] is not None and sample["rss_mb"] - baseline["rss_mb"] > SOAK_RSS_LIMIT_MB:
+        failed.append(f"RSS {baseline['rss_mb']:.1f}MB → {sample['rss_mb']:.1f}MB（許容 +{SOAK_RSS_LIMIT_MB:g}MB）")
+    if baseline["fds"] is None:
+        print("⚠ この環境ではファイル記述子・ソケット・RSSを計測できません（psutil をインストールすると計測します）。")
+    print(f"{args.cycles}サイクル（読み取り {FakeAudioDevice.reads}チャンク, OBSへの要求 {server.requests}件）: {elapsed:.1f}秒")
+
+    if failed:
+        print(f"⚠ 資源が増え続けています: {', '.join(failed)}")
+        return 1 if args.check else 0
+    print("✅ スレッド・ファイル記述子・ソケット・PyAudioのハンドルは増えていません")
+    return 0
+
+
+# ====== 開始までの時間の計測 ======
+START_BENCH_TIMEOUT = 5.0 # 1回の開始で最初のコマを待つ最大時間（秒）
+START_BENCH_LIMIT_CHUNKS = 2 # --check で待機からの開始に許す時間（チャンク数。読み取り待ちの1チャンク＋余裕）
+START_BENCH_RESET_WINDOW = 1.5 # 画像が多いグループで起動したあと、口パクの送信間隔を見る時間（秒）
+START_BENCH_RESET_LIMIT_MS = 250.0 # その間に許す送信間隔（仮のマイクは約70msごとにコマが変わる）
+
+def timed_start(start):
+    """start() で開始し、オーディオ側が測った「開始から最初のコマまで」の時間[ms]を返す（届かなければNone）"""
+    yukkuri.engine_metrics["start_latency_ms"] = 0.0
+    start()
+    deadline = time.time() + START_BENCH_TIMEOUT
+    while not yukkuri.engine_metrics["start_latency_ms"] and time.time() < deadline:
+        time.sleep(0.001)
+    return yukkuri.engine_metrics["start_latency_ms"] or None
+
+def frame_gaps_after_reset(frames):
+    """画像が frames 個あるグループで起動から開始し、最初のコマがモックのOBSに届くまでの時間[ms]と、
+    そのあと START_BENCH_RESET_WINDOW 秒の間でコマの届く間隔の最大[ms]を返す（届かなければNone）
+
+    要求の予算は実際の値（OBS_REQUEST_BUDGET）のままにして、起動時に全画像を非表示にする要求が
+    予算を超えても、続く口パクの要求が待たされないことを確かめる。
+    仮のマイクは大きい音と小さい音をチャンクごとに交互に返すので、チャンク平均ならコマも毎チャンク切り替わり、
+    間隔が空けば送信が待たされたことになる。包絡線ではリリースの間は口が開いたままでコマが変わらず、
+    送る要求が無いだけの間隔も数えてしまうので、ここではチャンク平均で測る。
+    """
+    server = MockObsServer(frames)
+    base = mock_engine_config(server, 1.0).replace(level_detector="rms")
+    yukkuri.request_schedulers[yukkuri.request_budget_key(*base.obs_settings[:2])] = yukkuri.RequestScheduler()
+    try:
+        clicked = time.time()
+        yukkuri.swap_engine_config(base.replace(requested_at=clicked))
+        yukkuri.start_audio_thread(yukkuri._AppMethodNames())
+        deadline = clicked + START_BENCH_TIMEOUT
+        while not server.shown_at and time.time() < deadline:
+            time.sleep(0.001)
+        if not server.shown_at:
+            return None, None
+        window_end = server.shown_at[0] + START_BENCH_RESET_WINDOW
+        time.sleep(max(0.0, window_end - time.time()))
+        with server.lock:
+            shown_at = [t for t in server.shown_at if t <= window_end] + [window_end]
+        return (shown_at[0] - clicked) * 1000, float(np.diff(shown_at).max()) * 1000
+    finally:
+        yukkuri.stop_audio_thread()
+        yukkuri.ui_bus.drain()
+        server.close()
+
+def run_start_bench(args):
+    server = MockObsServer()
+    original_pyaudio = yukkuri.pyaudio
+    yukkuri.pyaudio = types.SimpleNamespace(PyAudio=FakeAudioDevice, paInt16=original_pyaudio.paInt16)
+    base = mock_engine_config(server, 1.0) # マイクは実時間で読み取る
+    app = yukkuri._AppMethodNames()
+    results = {"起動から": [], "待機から": []}
+
+    def cold_start():
+        yukkuri.swap_engine_config(base.replace(requested_at=time.time()))
+        yukkuri.start_audio_thread(app)
+
+    def warm_start():
+        yukkuri.swap_engine_config(base.replace(requested_at=time.time()))
+        yukkuri.resume_audio_engine()
+
+    try:
+        for _ in range(args.rounds):
+            yukkuri.stop_audio_thread()
+            results["起動から"].append(timed_start(cold_start))
+            yukkuri.enter_audio_standby()
+            wait_for_reads(SOAK_CHUNKS_PER_RUN)
+            results["待機から"].append(timed_start(warm_start))
+            yukkuri.ui_bus.drain()
+    finally:
+        yukkuri.stop_audio_thread()
+        yukkuri.pyaudio = original_pyaudio
+        server.close()
+
+    chunk_ms = yukkuri.CHUNK / yukkuri.RATE * 1000
+    print(f"開始から最初のコマまで（{args.rounds}回, 1チャンク = {chunk_ms:.1f}ms）")
+    for label, values in results.items():
+        measured = np.array([v for v in values if v is not None])
+        if len(measured) < len(values):
+            print(f"⚠ {label}: {len(values) - len(measured)}回は最初のコマが届きませんでした")
+            return 1
+        print(f"{label}: 平均 {measured.mean():.1f}ms, 95%点 {np.percentile(measured, 95):.1f}ms, 最大 {measured.max():.1f}ms")
+    print("（仮のマイクはすぐに開け、モックのOBSも同じPCにあるので、起動からの時間は実際の環境より短く出ます）")
+    failed = False
+    worst = max(results["待機から"])
+    if worst > START_BENCH_LIMIT_CHUNKS * chunk_ms:
+        print(f"⚠ 待機からの開始に {worst:.1f}ms かかりました（許容 {START_BENCH_LIMIT_CHUNKS}チャンク = {START_BENCH_LIMIT_CHUNKS * chunk_ms:.1f}ms）")
+        failed = True
+    else:
+        print(f"✅ 待機からの開始は {START_BENCH_LIMIT_CHUNKS}チャンク以内に最初のコマを送りました")
+
+    yukkuri.pyaudio = types.SimpleNamespace(PyAudio=FakeAudioDevice, paInt16=original_pyaudio.paInt16)
+    try:
+        first_ms, gap_ms = frame_gaps_after_reset(args.reset_frames)
+    finally:
+        yukkuri.pyaudio = original_pyaudio
+    label = f"画像{args.reset_frames}個のグループ（予算 毎秒{yukkuri.OBS_REQUEST_BUDGET}件）"
+    if first_ms is None:
+        print(f"⚠ {label}: コマがOBSに届きませんでした")
+        failed = True
+    elif gap_ms > START_BENCH_RESET_LIMIT_MS:
+        print(f"⚠ {label}: 最初のコマまで {first_ms:.0f}ms, そのあとコマの届く間隔が最大 {gap_ms:.0f}ms 空きました（許容 {START_BENCH_RESET_LIMIT_MS:.0f}ms）")
+        failed = True
+    else:
+        print(f"✅ {label}: 最初のコマまで {first_ms:.0f}ms, そのあとコマの届く間隔は最大 {gap_ms:.0f}ms")
+    return 1 if failed and args.check else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OBS生声ゆっくり 補助ツール")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    vowel_parser = subparsers.add_parser("vowel-bench", help="母音判定の正解率と処理時間を計測する")
+    vowel_parser.add_argument("--clips-dir", default="vowel_clips", help="ラベル付きクリップ（a.wav, i_01.wav など）のフォルダ。無ければ合成クリップで計測する")
+    vowel_parser.add_argument("--write-clips", action="store_true", help="合成したラベル付きクリップを --clips-dir に書き出す")
+    vowel_parser.add_argument("--speakers", type=int, default=30, help="合成する話者の数（男性・女性・子どもを順に, 既定: 30）")
+    vowel_parser.add_argument("--check", action="store_true", help="正解率が基準に届かなければ終了コード1を返す")
+    vowel_parser.set_defaults(func=run_vowel_bench)
+
+    sprite_parser = subparsers.add_parser("spritesheet", help="番号付き画像からスプライトシートを作成する")
+    sprite_parser.add_argument("image_dir", help="1.png, 2.png, ... が入ったフォルダ")
+    sprite_parser.add_argument("-o", "--output", help="出力するシート画像のパス（既定: 画像フォルダ/spritesheet.png）")
+    sprite_parser.add_argument("--columns", type=int, help="列数（既定: コマ数の平方根）")
+    sprite_parser.set_defaults(func=run_spritesheet)
+
+    replay_parser = subparsers.add_parser("replay", help="記録したトレースをモックのOBSに対して再生し、記録と比較する")
+    replay_parser.add_argument("trace", nargs="?", help=f"トレースファイル（既定: {yukkuri.TRACE_FOLDER} フォルダの最新）")
+    replay_parser.add_argument("--preset", help="このアプリ設定プリセットの閾値・マッピング設定で再生する")
+    replay_parser.add_argument("--set", action="append", default=[], metavar="項目=値", help="設定を上書きして再生する（例: --set hysteresis=0.2）")
+    replay_parser.add_argument("--check", action="store_true", help="表示コマが記録と一致しなければ終了コード1を返す")
+    replay_parser.set_defaults(func=run_replay)
+
+    analysis_parser = subparsers.add_parser("analysis-bench", help="音量解析の処理時間と、チャンクごとのメモリ確保を計測する")
+    analysis_parser.add_argument("--channels", type=int, default=2, help="入力チャンネル数（既定: 2）")
+    analysis_parser.add_argument("--chunks", type=int, default=20000, help="計測するチャンク数（既定: 20000）")
+    analysis_parser.add_argument("--check", action="store_true", help="解析で1チャンクごとに配列を確保しているか、包絡線のコマの切り替えがチャンク平均より多ければ終了コード1を返す")
+    analysis_parser.set_defaults(func=run_analysis_bench)
+
+    soak_parser = subparsers.add_parser("soak", help="モックのOBSと仮のマイクで開始・停止・検索などを繰り返し、資源のリークを調べる")
+    soak_parser.add_argument("--cycles", type=int, default=2000, help="繰り返すサイクル数（既定: 2000）")
+    soak_parser.add_argument("--speed", type=float, default=20.0, help="仮のマイクを実時間の何倍で読み取るか（既定: 20）")
+    soak_parser.add_argument("--check", action="store_true", help="資源が増えていれば終了コード1を返す")
+    soak_parser.set_defaults(func=run_soak)
+
+    start_parser = subparsers.add_parser("start-bench", help="モックのOBSと仮のマイクで、起動からと待機からの開始にかかる時間を比べる")
+    start_parser.add_argument("--rounds", type=int, default=20, help="それぞれの開始を繰り返す回数（既定: 20）")
+    start_parser.add_argument("--reset-frames", type=int, default=1000, help="起動時に全画像を非表示にする試験での画像の数（既定: 1000）")
+    start_parser.add_argument("--check", action="store_true", help="待機からの開始が2チャンクを超えたか、画像の多いグループで最初のコマが遅れたら終了コード1を返す")
+    start_parser.set_defaults(func=run_start_bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())